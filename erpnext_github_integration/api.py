@@ -1,6 +1,6 @@
 import frappe
 from frappe import _
-from .github_api import has_role
+from .github_api import has_role, get_github_token
 
 def validate_repository(doc, method):
     """Validation function for Repository doctype"""
@@ -155,119 +155,43 @@ def bulk_import_github_data(repo_full_name, import_type, force_update=False):
     if not has_role('GitHub Admin'):
         frappe.throw(_('Only GitHub Admins can perform bulk import'))
     
-    settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    token = get_github_token(repo_full_name)
     if not token:
         frappe.throw(_('GitHub Personal Access Token not configured'))
     
-    from .github_client import github_request
+    from . import bulk_writer
+    from .github_client import iter_github_pages
     results = {'imported': 0, 'updated': 0, 'skipped': 0, 'errors': 0}
     
     try:
         if import_type == 'issues':
-            # Import all issues (including closed ones)
-            issues = github_request('GET', f'/repos/{repo_full_name}/issues', token, 
-                                  params={'state': 'all', 'per_page': 100})
-            
-            for issue in issues or []:
-                if issue.get('pull_request'):  # Skip pull requests
-                    continue
-                
-                try:
-                    existing = frappe.db.exists('Repository Issue', {
-                        'repository': repo_full_name,
-                        'issue_number': issue.get('number')
-                    })
-                    
-                    if existing and not force_update:
-                        results['skipped'] += 1
-                        continue
-                    
-                    if existing:
-                        # Update existing
-                        doc = frappe.get_doc('Repository Issue', existing)
-                        doc.title = issue.get('title')
-                        doc.body = issue.get('body') or ''
-                        doc.state = issue.get('state')
-                        doc.labels = ','.join([l.get('name') for l in issue.get('labels', [])])
-                        doc.updated_at = issue.get('updated_at')
-                        doc.save(ignore_permissions=True)
-                        results['updated'] += 1
-                    else:
-                        # Create new
-                        doc = frappe.get_doc({
-                            'doctype': 'Repository Issue',
-                            'repository': repo_full_name,
-                            'issue_number': issue.get('number'),
-                            'title': issue.get('title'),
-                            'body': issue.get('body') or '',
-                            'state': issue.get('state'),
-                            'labels': ','.join([l.get('name') for l in issue.get('labels', [])]),
-                            'url': issue.get('html_url'),
-                            'github_id': str(issue.get('id', '')),
-                            'created_at': issue.get('created_at'),
-                            'updated_at': issue.get('updated_at')
-                        })
-                        doc.insert(ignore_permissions=True)
-                        results['imported'] += 1
-                
-                except Exception as e:
-                    frappe.log_error(f"Error importing issue {issue.get('number')}: {str(e)}")
-                    results['errors'] += 1
-        
+            # Import all issues (including closed ones), streamed page by page
+            pages = iter_github_pages(f'/repos/{repo_full_name}/issues', token,
+                                      params={'state': 'all', 'per_page': 100})
+            write = bulk_writer.upsert_issues
         elif import_type == 'pull_requests':
-            # Import all pull requests
-            pulls = github_request('GET', f'/repos/{repo_full_name}/pulls', token,
-                                 params={'state': 'all', 'per_page': 100})
-            
-            for pr in pulls or []:
-                try:
-                    existing = frappe.db.exists('Repository Pull Request', {
-                        'repository': repo_full_name,
-                        'pr_number': pr.get('number')
-                    })
-                    
-                    if existing and not force_update:
-                        results['skipped'] += 1
-                        continue
-                    
-                    if existing:
-                        # Update existing
-                        doc = frappe.get_doc('Repository Pull Request', existing)
-                        doc.title = pr.get('title')
-                        doc.body = pr.get('body') or ''
-                        doc.state = pr.get('state')
-                        doc.head_branch = pr.get('head', {}).get('ref')
-                        doc.base_branch = pr.get('base', {}).get('ref')
-                        doc.author = pr.get('user', {}).get('login')
-                        doc.mergeable_state = pr.get('mergeable_state')
-                        doc.updated_at = pr.get('updated_at')
-                        doc.save(ignore_permissions=True)
-                        results['updated'] += 1
-                    else:
-                        # Create new
-                        doc = frappe.get_doc({
-                            'doctype': 'Repository Pull Request',
-                            'repository': repo_full_name,
-                            'pr_number': pr.get('number'),
-                            'title': pr.get('title'),
-                            'body': pr.get('body') or '',
-                            'state': pr.get('state'),
-                            'head_branch': pr.get('head', {}).get('ref'),
-                            'base_branch': pr.get('base', {}).get('ref'),
-                            'author': pr.get('user', {}).get('login'),
-                            'mergeable_state': pr.get('mergeable_state'),
-                            'github_id': str(pr.get('id', '')),
-                            'url': pr.get('html_url'),
-                            'created_at': pr.get('created_at'),
-                            'updated_at': pr.get('updated_at')
-                        })
-                        doc.insert(ignore_permissions=True)
-                        results['imported'] += 1
-                
-                except Exception as e:
-                    frappe.log_error(f"Error importing PR {pr.get('number')}: {str(e)}")
-                    results['errors'] += 1
+            # Import all pull requests, streamed page by page
+            pages = iter_github_pages(f'/repos/{repo_full_name}/pulls', token,
+                                      params={'state': 'all', 'per_page': 100})
+            write = bulk_writer.upsert_pull_requests
+        else:
+            pages = []
+        
+        # Set-based writes committed in batches; existing rows are only touched with force_update
+        gh_to_erp = {}
+        update_existing = bool(frappe.utils.sbool(force_update))
+        writer = bulk_writer.ChunkedWriter(
+            lambda records: write(repo_full_name, records, gh_to_erp, update_existing=update_existing),
+            title=f'GitHub Bulk Import: {repo_full_name} {import_type}',
+        )
+        for page in pages:
+            writer.add(page)
+        writer.flush()
+        results['imported'] = writer.counts['inserted']
+        results['updated'] = writer.counts['updated']
+        results['skipped'] = writer.counts['unchanged']
+        results['errors'] = writer.stats['errors']
+        results['chunks'] = writer.stats
     
     except Exception as e:
         frappe.throw(_('Bulk import failed: {0}').format(str(e)))
@@ -278,15 +202,13 @@ def get_github_user_info(github_username):
     if not github_username:
         return None
     
-    settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    token = get_github_token()
     if not token:
         return None
     
     try:
-        from .github_client import github_request
-        user_info = github_request('GET', f'/users/{github_username}', token)
-        return user_info
+        from . import github_cache
+        return github_cache.get_user_profile(github_username, token)
     except Exception:
         return None
 
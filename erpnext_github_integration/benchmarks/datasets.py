@@ -0,0 +1,188 @@
+import hashlib, random
+from datetime import datetime, timedelta, timezone
+
+# Synthetic GitHub data for the stand-in server.
+#
+# Everything is generated in the REST shapes GitHub returns (issues list
+# pull requests too, as on GitHub), deterministically from ``seed`` so two
+# runs of a benchmark compare like with like.
+
+WORDS = (
+    "sync api cache page token branch merge review deploy fix build crash "
+    "timeout error slow refactor test docs release memory query index webhook "
+    "login user project task report export import queue worker retry limit"
+).split()
+
+LABELS = ('bug', 'enhancement', 'documentation', 'question', 'performance', 'security', 'wontfix')
+
+START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+def _iso(dt):
+    return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def _sha(*parts):
+    return hashlib.sha1('|'.join(str(p) for p in parts).encode()).hexdigest()
+
+def _sentence(rnd, words):
+    return ' '.join(rnd.choice(WORDS) for _ in range(words)).capitalize()
+
+def generate_dataset(repo_full='bench-org/bench-repo', issues=50000, pulls=5000, branches=1000,
+                     members=100, commits_per_branch=1, seed=42):
+    """Build a repository with ``issues`` issues, ``pulls`` pull requests,
+    ``branches`` branches and ``members`` collaborators.
+
+    Returns a dict with ``repo``, ``branches``, ``commits`` (by SHA),
+    ``collaborators``, ``users`` (by login), ``issues`` (pull requests
+    included, with a ``pull_request`` key) and ``pulls``.
+    """
+    rnd = random.Random(seed)
+    owner, name = repo_full.split('/', 1)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    span = int((now - START).total_seconds())
+
+    logins = [f"dev{i:04d}" for i in range(max(members, 1))]
+    users = {
+        login: {
+            'login': login,
+            'id': 1000 + i,
+            'node_id': f"U_{1000 + i}",
+            'type': 'User',
+            'name': f"Developer {i}",
+            'email': f"{login}@example.com" if i % 3 else None,
+            'company': None,
+            'blog': '',
+            'location': rnd.choice(('Pune', 'Berlin', 'Austin', None)),
+            'bio': None,
+            'avatar_url': f"https://avatars.example.com/u/{1000 + i}",
+            'html_url': f"https://github.com/{login}",
+        }
+        for i, login in enumerate(logins)
+    }
+    collaborators = [
+        {
+            'login': login,
+            'id': users[login]['id'],
+            'type': 'User',
+            'permissions': {'admin': i < 3, 'push': True, 'pull': True},
+        }
+        for i, login in enumerate(logins[:members])
+    ]
+
+    commits, branch_list = {}, []
+    for b in range(branches):
+        branch_name = 'main' if b == 0 else f"feature/{rnd.choice(WORDS)}-{b}"
+        sha = None
+        for c in range(max(commits_per_branch, 1)):
+            sha = _sha(repo_full, branch_name, c)
+            author = rnd.choice(logins)
+            date = _iso(START + timedelta(seconds=rnd.randrange(span)))
+            commits[sha] = {
+                'sha': sha,
+                'commit': {
+                    'message': _sentence(rnd, 6),
+                    'author': {'name': users[author]['name'], 'email': users[author]['email'], 'date': date},
+                    'committer': {'name': users[author]['name'], 'email': users[author]['email'], 'date': date},
+                },
+                'author': {'login': author, 'id': users[author]['id']},
+                'html_url': f"https://github.com/{repo_full}/commit/{sha}",
+            }
+        branch_list.append({'name': branch_name, 'commit': {'sha': sha}, 'protected': b == 0})
+
+    # Issues and pull requests share one number sequence
+    total = issues + pulls
+    pr_every = (total / pulls) if pulls else None
+    issue_list, pull_list = [], []
+    next_pr = pr_every or 0
+    for number in range(1, total + 1):
+        created = START + timedelta(seconds=int(span * number / (total + 1)))
+        updated = created + timedelta(seconds=rnd.randrange(max(1, int((now - created).total_seconds()))))
+        closed = rnd.random() < 0.7
+        author = rnd.choice(logins)
+        common = {
+            'id': 5_000_000 + number,
+            'node_id': f"I_{number}",
+            'number': number,
+            'title': _sentence(rnd, 7),
+            'body': '\n\n'.join(_sentence(rnd, 25) for _ in range(2)),
+            'state': 'closed' if closed else 'open',
+            'user': {'login': author, 'id': users[author]['id']},
+            'created_at': _iso(created),
+            'updated_at': _iso(updated),
+            'closed_at': _iso(updated) if closed else None,
+        }
+        if pulls and number >= next_pr and len(pull_list) < pulls:
+            next_pr += pr_every
+            head = rnd.choice(branch_list)['name']
+            pr = dict(
+                common,
+                html_url=f"https://github.com/{repo_full}/pull/{number}",
+                head={'ref': head, 'sha': _sha(head, number)},
+                base={'ref': 'main', 'sha': branch_list[0]['commit']['sha']},
+                requested_reviewers=[
+                    {'login': login, 'id': users[login]['id']}
+                    for login in rnd.sample(logins, min(len(logins), rnd.randrange(3)))
+                ],
+                merged_at=_iso(updated) if closed and rnd.random() < 0.8 else None,
+                draft=False,
+            )
+            pull_list.append(pr)
+            issue_list.append(dict(
+                common,
+                html_url=pr['html_url'],
+                labels=[],
+                assignees=[],
+                pull_request={'url': f"https://api.github.com/repos/{repo_full}/pulls/{number}"},
+            ))
+        else:
+            issue_list.append(dict(
+                common,
+                html_url=f"https://github.com/{repo_full}/issues/{number}",
+                labels=[{'name': label} for label in rnd.sample(LABELS, rnd.randrange(3))],
+                assignees=[
+                    {'login': login, 'id': users[login]['id']}
+                    for login in rnd.sample(logins, min(len(logins), rnd.randrange(3)))
+                ],
+            ))
+
+    return {
+        'repo': {
+            'id': int(_sha(repo_full)[:8], 16),
+            'name': name,
+            'full_name': repo_full,
+            'owner': {'login': owner},
+            'private': True,
+            'default_branch': 'main',
+            'html_url': f"https://github.com/{repo_full}",
+            'updated_at': _iso(now),
+        },
+        'branches': branch_list,
+        'commits': commits,
+        'collaborators': collaborators,
+        'users': users,
+        'issues': issue_list,
+        'pulls': pull_list,
+        'version': 0,
+    }
+
+def touch(dataset, issues=0, pulls=0, seed=7):
+    """Edit ``issues`` issues and ``pulls`` pull requests "now", as an incremental
+    sync would find them. Returns the numbers that changed."""
+    rnd = random.Random(seed + dataset['version'])
+    now = _iso(datetime.now(timezone.utc).replace(microsecond=0))
+    changed = []
+
+    plain = [i for i in dataset['issues'] if not i.get('pull_request')]
+    for issue in rnd.sample(plain, min(issues, len(plain))):
+        issue['title'] = _sentence(rnd, 7)
+        issue['updated_at'] = now
+        changed.append(issue['number'])
+
+    by_number = {i['number']: i for i in dataset['issues']}
+    for pr in rnd.sample(dataset['pulls'], min(pulls, len(dataset['pulls']))):
+        pr['title'] = _sentence(rnd, 7)
+        pr['updated_at'] = now
+        by_number[pr['number']].update(title=pr['title'], updated_at=now)
+        changed.append(pr['number'])
+
+    dataset['version'] += 1
+    return changed
@@ -0,0 +1,383 @@
+import argparse, hashlib, json, random, re, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# Local stand-in for the GitHub API, serving a dataset from datasets.py.
+#
+# It answers the REST endpoints github_client uses (and the GraphQL queries
+# of github_graphql) with GitHub's pagination Link headers, per-token
+# X-RateLimit-* headers, ETags / 304s, and optional injected latency and
+# errors. Point a site at it with ``github_api_url`` in site config, or use
+# it in-process from run.py. It has no Frappe dependency, so it can also be
+# started on its own:
+#
+#     python -m erpnext_github_integration.benchmarks.fake_github --issues 50000 --port 8765
+
+DEFAULT_PER_PAGE = 30
+MAX_PER_PAGE = 100
+RATE_WINDOW = 3600
+
+_REPO_RE = re.compile(r'^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)(?P<rest>/.*)?$')
+
+
+class FakeGitHub:
+    """Threaded HTTP server over ``dataset``.
+
+    ``latency_ms``/``jitter_ms`` delay every response, ``error_rate`` turns
+    that share of requests into ``error_status`` responses (only for paths
+    containing one of ``error_paths``, if given) and ``rate_limit`` is the
+    hourly budget of each token.
+    """
+
+    def __init__(self, dataset, latency_ms=0, jitter_ms=0, error_rate=0.0, error_status=502,
+                 error_paths=None, rate_limit=1_000_000, host='127.0.0.1', port=0, seed=0):
+        self.dataset = dataset
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.error_paths = tuple(error_paths or ())
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.budgets = {}
+        self.views = {}
+        self.reset_stats()
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.fake = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fake-github', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_stats(self):
+        with getattr(self, 'lock', threading.Lock()):
+            self.stats = {'requests': 0, 'not_modified': 0, 'errors': 0, 'bytes': 0, 'endpoints': {}}
+
+    def snapshot_stats(self):
+        with self.lock:
+            return json.loads(json.dumps(self.stats))
+
+    def _count(self, endpoint, status, size):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['bytes'] += size
+            self.stats['endpoints'][endpoint] = self.stats['endpoints'].get(endpoint, 0) + 1
+            if status == 304:
+                self.stats['not_modified'] += 1
+            elif status >= 400:
+                self.stats['errors'] += 1
+
+    def _take(self, token, resource, charge):
+        """Return ``(remaining, reset, limit)`` for ``token`` after charging the request"""
+        now = int(time.time())
+        with self.lock:
+            remaining, reset = self.budgets.get((token, resource), (self.rate_limit, now + RATE_WINDOW))
+            if reset <= now:
+                remaining, reset = self.rate_limit, now + RATE_WINDOW
+            if charge and remaining > 0:
+                remaining -= 1
+            self.budgets[(token, resource)] = (remaining, reset)
+            return remaining, reset, self.rate_limit
+
+    def _inject_error(self, path):
+        if not self.error_rate:
+            return False
+        if self.error_paths and not any(p in path for p in self.error_paths):
+            return False
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def view(self, kind, state='all', sort='created', direction='desc', since=None, prs=True):
+        """Filtered and sorted list, memoized per dataset version"""
+        key = (self.dataset['version'], kind, state, sort, direction, since, prs)
+        with self.lock:
+            cached = self.views.get(key)
+        if cached is not None:
+            return cached
+        items = self.dataset[kind]
+        if not prs:
+            items = [i for i in items if not i.get('pull_request')]
+        if state in ('open', 'closed'):
+            items = [i for i in items if i['state'] == state]
+        if since:
+            items = [i for i in items if i['updated_at'] >= since]
+        field = 'updated_at' if sort == 'updated' else 'created_at'
+        items = sorted(items, key=lambda i: (i[field], i['number']), reverse=(direction == 'desc'))
+        with self.lock:
+            if len(self.views) > 32:
+                self.views.clear()
+            self.views[key] = items
+        return items
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    # Dispatch
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def _handle(self, method):
+        fake = self.fake
+        parts = urlsplit(self.path)
+        path = parts.path.rstrip('/') or '/'
+        query = dict(parse_qsl(parts.query))
+        token = (self.headers.get('Authorization') or '').split(' ', 1)[-1]
+        resource = 'graphql' if path == '/graphql' else 'search' if path.startswith('/search/') else 'core'
+        # Always drain the body so the keep-alive connection stays usable
+        length = int(self.headers.get('Content-Length') or 0)
+        raw_body = self.rfile.read(length) if length else b''
+
+        delay = fake.latency_ms + (fake.random.uniform(0, fake.jitter_ms) if fake.jitter_ms else 0)
+        if delay:
+            time.sleep(delay / 1000.0)
+
+        if fake._inject_error(path):
+            return self._send(path, fake.error_status, {'message': 'Injected failure'}, token, resource)
+
+        remaining, _reset, _limit = fake._take(token, resource, charge=False)
+        if remaining <= 0:
+            return self._send(path, 403, {'message': 'API rate limit exceeded for user.'}, token, resource)
+
+        try:
+            if method == 'POST' and path == '/graphql':
+                return self._send(path, 200, self._graphql(json.loads(raw_body or b'{}')), token, resource)
+            if method != 'GET':
+                return self._send(path, 201, {}, token, resource)
+            status, body, items = self._route(path, query)
+        except LookupError:
+            status, body, items = 404, {'message': 'Not Found'}, False
+
+        if items is not False:
+            return self._send_page(path, query, items, token, resource)
+        return self._send(path, status, body, token, resource)
+
+    def _route(self, path, query):
+        """Return ``(status, body, items)``; ``items`` is a list to paginate, else False"""
+        data = self.fake.dataset
+        if path == '/user':
+            return 200, next(iter(data['users'].values())), False
+        if path.startswith('/users/'):
+            return 200, data['users'][path.split('/')[2]], False
+        if path in ('/user/repos',) or re.match(r'^/orgs/[^/]+/repos$', path):
+            return 200, None, [data['repo']]
+        if path == '/rate_limit':
+            return 200, {'resources': {}}, False
+
+        match = _REPO_RE.match(path)
+        if not match or f"{match['owner']}/{match['repo']}" != data['repo']['full_name']:
+            raise LookupError(path)
+        rest = match['rest'] or ''
+        if rest == '':
+            return 200, data['repo'], False
+        if rest == '/branches':
+            return 200, None, data['branches']
+        if rest == '/collaborators':
+            return 200, None, data['collaborators']
+        if rest.startswith('/commits/'):
+            return 200, data['commits'][rest.split('/')[2]], False
+        if rest == '/commits':
+            return 200, None, list(data['commits'].values())
+        if rest == '/issues':
+            return 200, None, self.fake.view(
+                'issues', query.get('state', 'open'), query.get('sort', 'created'),
+                query.get('direction', 'desc'), query.get('since'),
+            )
+        if rest == '/pulls':
+            sort = query.get('sort', 'created')
+            return 200, None, self.fake.view(
+                'pulls', query.get('state', 'open'), sort,
+                query.get('direction', 'desc' if sort == 'created' else 'asc'),
+            )
+        if rest.startswith('/hooks'):
+            return 200, None, []
+        raise LookupError(path)
+
+    # GraphQL: only the queries github_graphql sends, told apart by their connection
+
+    def _graphql(self, request):
+        data = self.fake.dataset
+        query = request.get('query') or ''
+        variables = request.get('variables') or {}
+        first = int(variables.get('first') or 100)
+        offset = int(variables.get('after') or 0)
+
+        def connection(items, build, key='nodes'):
+            page = items[offset:offset + first]
+            end = offset + len(page)
+            return {
+                key: [build(item) for item in page],
+                'pageInfo': {'hasNextPage': end < len(items), 'endCursor': str(end)},
+            }
+
+        if 'connection: refs' in query:
+            repository = {'connection': connection(data['branches'], lambda b: {
+                'name': b['name'],
+                'branchProtectionRule': {'id': 'BPR_1'} if b['protected'] else None,
+                'target': {
+                    'oid': b['commit']['sha'],
+                    'committedDate': data['commits'][b['commit']['sha']]['commit']['committer']['date'],
+                    'author': {
+                        'date': data['commits'][b['commit']['sha']]['commit']['author']['date'],
+                        'name': data['commits'][b['commit']['sha']]['commit']['author']['name'],
+                        'user': {'login': data['commits'][b['commit']['sha']]['author']['login']},
+                    },
+                },
+            })}
+        elif 'connection: collaborators' in query:
+            repository = {'connection': connection(data['collaborators'], lambda c: {
+                'permission': 'ADMIN' if c['permissions']['admin'] else 'WRITE',
+                'node': {
+                    'login': c['login'],
+                    'databaseId': c['id'],
+                    'email': data['users'][c['login']]['email'] or '',
+                },
+            }, key='edges')}
+        elif 'connection: issues' in query:
+            items = self.fake.view('issues', sort='updated', direction='asc', since=variables.get('since'), prs=False)
+            repository = {'connection': connection(items, lambda i: {
+                'databaseId': i['id'], 'number': i['number'], 'title': i['title'], 'body': i['body'],
+                'state': i['state'].upper(), 'url': i['html_url'],
+                'createdAt': i['created_at'], 'updatedAt': i['updated_at'],
+                'assignees': {'nodes': [{'login': a['login']} for a in i['assignees']]},
+                'labels': {'nodes': [{'name': label['name']} for label in i['labels']]},
+            })}
+        elif 'connection: pullRequests' in query:
+            direction = 'desc' if 'direction: DESC' in query else 'asc'
+            items = self.fake.view('pulls', sort='updated', direction=direction)
+            repository = {'connection': connection(items, lambda p: {
+                'databaseId': p['id'], 'number': p['number'], 'title': p['title'], 'body': p['body'],
+                'state': 'MERGED' if p.get('merged_at') else p['state'].upper(), 'url': p['html_url'],
+                'createdAt': p['created_at'], 'updatedAt': p['updated_at'],
+                'headRefName': p['head']['ref'], 'baseRefName': p['base']['ref'],
+                'author': {'login': p['user']['login']},
+                'reviewRequests': {'nodes': [
+                    {'requestedReviewer': {'login': r['login']}} for r in p['requested_reviewers']
+                ]},
+            })}
+        else:
+            repository = {
+                'databaseId': data['repo']['id'],
+                'isPrivate': data['repo']['private'],
+                'defaultBranchRef': {'name': data['repo']['default_branch']},
+            }
+        return {'data': {'repository': repository}}
+
+    # Responses
+
+    def _send_page(self, path, query, items, token, resource):
+        per_page = min(int(query.get('per_page') or DEFAULT_PER_PAGE), MAX_PER_PAGE)
+        page = max(int(query.get('page') or 1), 1)
+        last = max(1, -(-len(items) // per_page))
+        body = items[(page - 1) * per_page:page * per_page]
+
+        base = f"http://{self.headers.get('Host')}{path}"
+        def page_url(n):
+            return f"{base}?{urlencode(dict(query, page=n))}"
+        links = []
+        if page < last:
+            links += [f'<{page_url(page + 1)}>; rel="next"', f'<{page_url(last)}>; rel="last"']
+        if page > 1:
+            links += [f'<{page_url(1)}>; rel="first"', f'<{page_url(page - 1)}>; rel="prev"']
+        return self._send(path, 200, body, token, resource, link=', '.join(links) or None)
+
+    def _send(self, path, status, body, token, resource, link=None):
+        payload = json.dumps(body).encode()
+        etag = f'W/"{hashlib.sha1(payload).hexdigest()}"'
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            # Conditional hits are free, as on GitHub
+            status, payload = 304, b''
+        remaining, reset, limit = self.fake._take(token, resource, charge=status != 304)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('X-RateLimit-Limit', str(limit))
+        self.send_header('X-RateLimit-Remaining', str(remaining))
+        self.send_header('X-RateLimit-Reset', str(reset))
+        self.send_header('X-RateLimit-Resource', resource)
+        if status in (200, 304):
+            self.send_header('ETag', etag)
+        if link:
+            self.send_header('Link', link)
+        if status in (429, 503) or (status == 403 and remaining > 0):
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        if payload:
+            self.wfile.write(payload)
+        self.fake._count(_endpoint(path), status, len(payload))
+
+
+def _endpoint(path):
+    parts = [p for p in path.split('/') if p]
+    if parts[:1] == ['repos'] and len(parts) >= 3:
+        parts[1:3] = ['{owner}', '{repo}']
+    elif parts[:1] == ['users'] and len(parts) >= 2:
+        parts[1] = '{login}'
+    return '/' + '/'.join('{id}' if p.isdigit() or len(p) == 40 else p for p in parts)
+
+
+def main():
+    from .datasets import generate_dataset
+
+    parser = argparse.ArgumentParser(description='Serve a synthetic repository over a GitHub-like API')
+    parser.add_argument('--repo', default='bench-org/bench-repo')
+    parser.add_argument('--issues', type=int, default=50000)
+    parser.add_argument('--pulls', type=int, default=5000)
+    parser.add_argument('--branches', type=int, default=1000)
+    parser.add_argument('--members', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=5000)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    dataset = generate_dataset(args.repo, args.issues, args.pulls, args.branches, args.members)
+    fake = FakeGitHub(
+        dataset, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        rate_limit=args.rate_limit, host=args.host, port=args.port,
+    )
+    print(f"Serving {args.repo} on {fake.url} (set github_api_url to this in site config)")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
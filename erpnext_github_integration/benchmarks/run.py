@@ -0,0 +1,191 @@
+import hashlib, hmac, json, time, tracemalloc
+import frappe
+from .datasets import generate_dataset, touch
+from .fake_github import FakeGitHub
+
+# Sync benchmarks against the local GitHub stand-in.
+#
+#     bench --site <site> execute erpnext_github_integration.benchmarks.run.run \
+#         --kwargs "{'issues': 50000, 'pulls': 5000, 'branches': 1000}"
+#
+# Every scenario reports wall time, GitHub requests (and 304s), DB queries
+# and peak Python memory. Use a scratch site: the benchmark repository is
+# written to the database (and removed again unless cleanup=0).
+
+BENCH_REPO = 'bench-org/bench-repo'
+BENCH_TOKEN = 'bench-token'
+
+def _use_token(token, organizations):
+    # Pin the per-request credential pool to the benchmark token, so
+    # GitHub Settings is never read or changed
+    frappe.local.github_token_pool = {
+        organization: (time.time() + 10 ** 9, [token]) for organization in organizations
+    }
+
+def _db_questions():
+    if frappe.db.db_type != 'mariadb':
+        return None
+    rows = frappe.db.sql("SHOW SESSION STATUS LIKE 'Questions'")
+    return int(rows[0][1]) if rows else None
+
+def _measure(name, fn, fake, trace_memory=True):
+    fake.reset_stats()
+    frappe.db.commit()
+    questions = _db_questions()
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    error = None
+    try:
+        result = fn()
+        frappe.db.commit()
+    except Exception as e:
+        frappe.db.rollback()
+        result, error = None, f"{type(e).__name__}: {e}"
+    wall = time.perf_counter() - started
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    after = _db_questions()
+    stats = fake.snapshot_stats()
+    return {
+        'scenario': name,
+        'wall_s': round(wall, 3),
+        'github_requests': stats['requests'],
+        'not_modified': stats['not_modified'],
+        'github_errors': stats['errors'],
+        'kb_transferred': round(stats['bytes'] / 1024, 1),
+        # The two SHOW STATUS statements themselves are not counted
+        'db_queries': (after - questions - 1) if questions is not None and after is not None else None,
+        'peak_memory_mb': round(peak / (1024 * 1024), 1) if peak is not None else None,
+        'endpoints': stats['endpoints'],
+        'result': result,
+        'error': error,
+    }
+
+def _webhook_request(event, payload, secret):
+    from werkzeug.test import EnvironBuilder
+    from werkzeug.wrappers import Request
+
+    body = json.dumps(payload).encode()
+    headers = {'X-GitHub-Event': event, 'Content-Type': 'application/json'}
+    if secret:
+        headers['X-Hub-Signature-256'] = 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return Request(EnvironBuilder(method='POST', data=body, headers=headers).get_environ())
+
+def _replay_webhooks(dataset, count):
+    """Send ``count`` issue "edited" deliveries through the webhook endpoint"""
+    from erpnext_github_integration import webhooks
+
+    secret = (
+        frappe.get_single('GitHub Settings').get_password('webhook_secret', raise_exception=False)
+        or frappe.conf.get('github_webhook_secret')
+    )
+    issues = [i for i in dataset['issues'] if not i.get('pull_request')][:count]
+    previous = getattr(frappe.local, 'request', None)
+    try:
+        for issue in issues:
+            payload = {'action': 'edited', 'issue': issue, 'repository': dataset['repo']}
+            frappe.local.request = _webhook_request('issues', payload, secret)
+            webhooks.github_webhook()
+    finally:
+        frappe.local.request = previous
+    return {'deliveries': len(issues)}
+
+def cleanup(repo_full=BENCH_REPO):
+    """Remove everything a benchmark run wrote for ``repo_full``"""
+    for child, parent in (
+        ('Repository Issue Assignee', 'Repository Issue'),
+        ('Repository PR Reviewer', 'Repository Pull Request'),
+    ):
+        frappe.db.sql(
+            f"""delete from `tab{child}` where parent in
+                (select name from `tab{parent}` where repository = %s)""",
+            repo_full,
+        )
+    frappe.db.delete('Repository Issue', {'repository': repo_full})
+    frappe.db.delete('Repository Pull Request', {'repository': repo_full})
+    frappe.db.delete('Repository Sync State', {'repository': repo_full})
+    sync_logs = frappe.get_all('Sync Log', filters={'repo_full_name': repo_full}, pluck='name')
+    if sync_logs:
+        frappe.db.delete('Sync Log Phase', {'parent': ('in', sync_logs)})
+        frappe.db.delete('Sync Log', {'name': ('in', sync_logs)})
+    if frappe.db.exists('Repository', repo_full):
+        frappe.delete_doc('Repository', repo_full, force=True, ignore_permissions=True)
+    frappe.db.commit()
+
+def run(issues=2000, pulls=200, branches=100, members=20, incremental_changes=50, webhooks=100,
+        latency_ms=0, jitter_ms=0, error_rate=0.0, graphql=0, trace_memory=1, keep_data=0):
+    """Run the sync benchmarks and return one result row per scenario.
+
+    Scenarios: bulk import of issues and pull requests, full ``sync_repo``,
+    incremental ``sync_repo`` after ``incremental_changes`` edits, a no-change
+    resync, and ``webhooks`` issue deliveries through ``github_webhook``.
+    """
+    from erpnext_github_integration import api, github_api
+
+    frappe.set_user('Administrator')
+    dataset = generate_dataset(BENCH_REPO, int(issues), int(pulls), int(branches), int(members))
+    organization = BENCH_REPO.split('/')[0]
+    trace_memory = bool(int(trace_memory))
+
+    conf = frappe.local.conf
+    previous_url = conf.get('github_api_url')
+    previous_graphql = frappe.db.get_single_value('GitHub Settings', 'use_graphql_sync')
+    results = []
+
+    with FakeGitHub(dataset, latency_ms=float(latency_ms), jitter_ms=float(jitter_ms),
+                    error_rate=float(error_rate)) as fake:
+        conf['github_api_url'] = fake.url
+        _use_token(BENCH_TOKEN, (None, organization))
+        frappe.db.set_single_value('GitHub Settings', 'use_graphql_sync', int(graphql))
+        try:
+            cleanup()
+            results.append(_measure(
+                'bulk_import_issues',
+                lambda: api.bulk_import_github_data(BENCH_REPO, 'issues'), fake, trace_memory,
+            ))
+            results.append(_measure(
+                'bulk_import_pull_requests',
+                lambda: api.bulk_import_github_data(BENCH_REPO, 'pull_requests'), fake, trace_memory,
+            ))
+            cleanup()
+            results.append(_measure(
+                'full_sync', lambda: github_api.sync_repo(BENCH_REPO), fake, trace_memory,
+            ))
+
+            changes = int(incremental_changes)
+            touch(dataset, issues=changes, pulls=max(1, changes // 10))
+            # GitHub's "since" has second resolution
+            time.sleep(1)
+            results.append(_measure(
+                'incremental_sync', lambda: github_api.sync_repo(BENCH_REPO), fake, trace_memory,
+            ))
+            results.append(_measure(
+                'noop_sync', lambda: github_api.sync_repo(BENCH_REPO), fake, trace_memory,
+            ))
+            results.append(_measure(
+                'webhooks', lambda: _replay_webhooks(dataset, int(webhooks)), fake, trace_memory,
+            ))
+        finally:
+            if previous_url is None:
+                conf.pop('github_api_url', None)
+            else:
+                conf['github_api_url'] = previous_url
+            frappe.local.github_token_pool = None
+            frappe.db.set_single_value('GitHub Settings', 'use_graphql_sync', previous_graphql)
+            if not int(keep_data):
+                cleanup()
+            frappe.db.commit()
+
+    _print_report(results)
+    return results
+
+def _print_report(results):
+    columns = ('scenario', 'wall_s', 'github_requests', 'not_modified', 'db_queries', 'peak_memory_mb', 'error')
+    rows = [[str(r.get(c) if r.get(c) is not None else '-') for c in columns] for r in results]
+    widths = [max(len(c), *(len(row[i]) for row in rows)) for i, c in enumerate(columns)]
+    print('  '.join(c.ljust(w) for c, w in zip(columns, widths, strict=True)))
+    for row in rows:
+        print('  '.join(v.ljust(w) for v, w in zip(row, widths, strict=True)))
@@ -0,0 +1,412 @@
+import hashlib, json, re, time
+import frappe
+
+# Set-based writes of Repository Issue and Repository Pull Request.
+#
+# Records are written in chunks. Each record is compared with an index of
+# the stored rows (number -> name, updated_at, sync_hash, where sync_hash
+# covers the synced values and the assignees/reviewers): unchanged and stale
+# records are skipped without a write. New rows go in with one multi-row
+# INSERT, changed rows with one multi-row upsert on ``name``, and child rows
+# are replaced only for the parents whose list changed (one DELETE plus one
+# INSERT). The INSERT is an upsert as well: names follow the doctypes'
+# ``format:`` autoname, so a row a webhook added after the index was loaded
+# is overwritten (children included) instead of failing the chunk. Document controllers are not run; neither doctype has any logic
+# of its own.
+#
+# The branch and member tables of a Repository are reconciled the same way:
+# rows are matched on branch name / GitHub login and only new, changed and
+# vanished rows are written, without loading or saving the Repository.
+
+CHUNK_SIZE = 500
+DEFAULT_COMMIT_BATCH_SIZE = 500
+
+ISSUE = frappe._dict(
+    doctype='Repository Issue',
+    number_field='issue_number',
+    fields=('repository', 'issue_number', 'title', 'body', 'state', 'labels',
+            'url', 'github_id', 'created_at', 'updated_at'),
+    child_doctype='Repository Issue Assignee',
+    child_field='assignees_table',
+    child_link='issue',
+)
+
+PULL_REQUEST = frappe._dict(
+    doctype='Repository Pull Request',
+    number_field='pr_number',
+    fields=('repository', 'pr_number', 'title', 'body', 'state', 'head_branch', 'base_branch',
+            'author', 'mergeable_state', 'url', 'github_id', 'created_at', 'updated_at'),
+    child_doctype='Repository PR Reviewer',
+    child_field='reviewers_table',
+    child_link='pull_request',
+)
+
+BRANCH = frappe._dict(
+    doctype='Repository Branch',
+    parentfield='branches_table',
+    key='branch_name',
+    fields=('repo_full_name', 'branch_name', 'commit_sha', 'protected', 'last_updated'),
+)
+
+MEMBER = frappe._dict(
+    doctype='Repository Member',
+    parentfield='members_table',
+    key='github_username',
+    fields=('repo_full_name', 'github_username', 'github_id', 'role', 'email'),
+)
+
+def issue_row(repo_full, issue):
+    """Repository Issue values for a REST-shaped GitHub issue"""
+    from .github_api import convert_github_datetime
+
+    return {
+        'repository': repo_full,
+        'issue_number': issue.get('number'),
+        'title': (issue.get('title') or '')[:140],
+        'body': issue.get('body') or '',
+        'state': issue.get('state'),
+        'labels': ','.join(lab.get('name') or '' for lab in issue.get('labels') or []),
+        'url': issue.get('html_url'),
+        'github_id': str(issue.get('id', '')),
+        'created_at': convert_github_datetime(issue.get('created_at')),
+        'updated_at': convert_github_datetime(issue.get('updated_at')),
+    }
+
+def pull_request_row(repo_full, pr):
+    """Repository Pull Request values for a REST-shaped GitHub pull request"""
+    from .github_api import convert_github_datetime
+
+    return {
+        'repository': repo_full,
+        'pr_number': pr.get('number'),
+        'title': (pr.get('title') or '')[:140],
+        'body': pr.get('body') or '',
+        'state': pr.get('state'),
+        'head_branch': (pr.get('head') or {}).get('ref'),
+        'base_branch': (pr.get('base') or {}).get('ref'),
+        'author': (pr.get('user') or {}).get('login'),
+        'mergeable_state': pr.get('mergeable_state'),
+        'url': pr.get('html_url'),
+        'github_id': str(pr.get('id', '')),
+        'created_at': convert_github_datetime(pr.get('created_at')),
+        'updated_at': convert_github_datetime(pr.get('updated_at')),
+    }
+
+def resolve_erp_users(github_logins, gh_to_erp):
+    """Add the ERP users of any GitHub logins not looked up yet to ``gh_to_erp``.
+
+    Logins without a linked User map to None: assignee and reviewer rows
+    link to User, so those logins are left out of them.
+    """
+    missing = list({login for login in github_logins if login and login not in gh_to_erp})
+    if not missing:
+        return gh_to_erp
+    users = frappe.get_all(
+        'User',
+        filters={'github_username': ['in', missing]},
+        fields=['name', 'github_username']
+    )
+    gh_to_erp.update({u['github_username']: u['name'] for u in users})
+    for login in missing:
+        gh_to_erp.setdefault(login, None)
+    return gh_to_erp
+
+def _erp_users(people, gh_to_erp):
+    # In GitHub's order, without logins that have no User
+    return [gh_to_erp[p['login']] for p in people or [] if p.get('login') and gh_to_erp.get(p['login'])]
+
+def load_index(spec, repo_full, numbers=None):
+    """``{number: (name, updated_at, sync_hash)}`` of the stored rows of ``repo_full``, in one query"""
+    filters = {'repository': repo_full}
+    if numbers is not None:
+        filters[spec.number_field] = ['in', list(numbers)]
+    rows = frappe.get_all(
+        spec.doctype, filters=filters,
+        fields=[spec.number_field, 'name', 'updated_at', 'sync_hash'], as_list=True,
+    )
+    return {number: (name, _normalise(updated_at), sync_hash) for number, name, updated_at, sync_hash in rows}
+
+def upsert_issues(repo_full, issues, gh_to_erp=None, update_existing=True, index=None):
+    """Write GitHub issues (pull requests in the list are ignored).
+
+    Returns ``{'inserted', 'updated', 'unchanged'}``. With
+    ``update_existing=False`` rows that already exist are left alone and
+    counted as unchanged. ``index`` (see ``load_index``) saves the lookup of
+    stored rows when a caller writes many pages of one repository; it is
+    updated with the rows written once the whole call succeeded.
+    """
+    gh_to_erp = {} if gh_to_erp is None else gh_to_erp
+    issues = [issue for issue in issues if not issue.get('pull_request')]
+    resolve_erp_users([a.get('login') for i in issues for a in i.get('assignees') or []], gh_to_erp)
+    records = [(issue_row(repo_full, i), _erp_users(i.get('assignees'), gh_to_erp)) for i in issues]
+    return _upsert(ISSUE, repo_full, records, update_existing, index)
+
+def upsert_pull_requests(repo_full, pulls, gh_to_erp=None, update_existing=True, index=None):
+    """Write GitHub pull requests; returns ``{'inserted', 'updated', 'unchanged'}``"""
+    gh_to_erp = {} if gh_to_erp is None else gh_to_erp
+    resolve_erp_users([r.get('login') for pr in pulls for r in pr.get('requested_reviewers') or []], gh_to_erp)
+    records = [(pull_request_row(repo_full, pr), _erp_users(pr.get('requested_reviewers'), gh_to_erp)) for pr in pulls]
+    return _upsert(PULL_REQUEST, repo_full, records, update_existing, index)
+
+def _upsert(spec, repo_full, records, update_existing, index):
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    # The last copy of a number wins, as it would with one write per record
+    by_number = {row[spec.number_field]: (row, users) for row, users in records if row.get(spec.number_field)}
+    numbers = list(by_number)
+    # A failure in a later chunk rolls the earlier ones back as well (the
+    # caller's savepoint), so the index only learns about them at the end
+    indexed = {}
+    for start in range(0, len(numbers), CHUNK_SIZE):
+        chunk = {n: by_number[n] for n in numbers[start:start + CHUNK_SIZE]}
+        chunk_index = index if index is not None else load_index(spec, repo_full, chunk)
+        for key, value in _write_chunk(spec, chunk, update_existing, chunk_index, indexed).items():
+            counts[key] += value
+    if index is not None:
+        index.update(indexed)
+    return counts
+
+def _write_chunk(spec, chunk, update_existing, index, indexed):
+    # ``indexed`` collects the index entries of the rows written
+    now = frappe.utils.now()
+    user = frappe.session.user if getattr(frappe.local, 'session', None) else 'Administrator'
+    fields = (*spec.fields, 'sync_hash')
+    inserts, updates, children, pending = [], [], [], {}
+    written = {}
+    unchanged = 0
+    for number, (row, users) in chunk.items():
+        row['sync_hash'] = _hash(spec, row, users)
+        current = index.get(number)
+        if not current:
+            name = _autoname(spec.doctype, row)
+            inserts.append((name, now, now, user, user, 0, 0, *(row.get(f) for f in fields)))
+            children.extend(_child_values(spec, name, users, now, user))
+            written[number] = (name, _normalise(row.get('updated_at')), row['sync_hash'])
+            continue
+        name, updated_at, sync_hash = current
+        # Skip rows that are identical, and older copies of rows (a late
+        # webhook delivery or sync page) that were updated since
+        stale = updated_at and row.get('updated_at') and row['updated_at'] < updated_at
+        if not update_existing or sync_hash == row['sync_hash'] or stale:
+            unchanged += 1
+            continue
+        updates.append((name, now, user, *(row.get(f) for f in fields)))
+        pending[name] = users
+        written[number] = (name, _normalise(row.get('updated_at')), row['sync_hash'])
+
+    # Assignees/reviewers are only rewritten where the list itself changed;
+    # new parents may have some already if a webhook inserted them meanwhile
+    replaced = [values[0] for values in inserts]
+    if pending:
+        current_users = {}
+        for parent, erp_user in frappe.get_all(
+            spec.child_doctype,
+            filters={'parenttype': spec.doctype, 'parent': ['in', list(pending)]},
+            fields=['parent', 'user'],
+            order_by='idx asc',
+            as_list=True,
+        ):
+            current_users.setdefault(parent, []).append(erp_user)
+        for name, users in pending.items():
+            if users != current_users.get(name, []):
+                replaced.append(name)
+                children.extend(_child_values(spec, name, users, now, user))
+
+    if inserts:
+        _bulk_upsert(
+            spec.doctype,
+            ('name', 'creation', 'modified', 'owner', 'modified_by', 'docstatus', 'idx', *fields),
+            inserts,
+            update_fields=('modified', 'modified_by', *fields),
+        )
+    if updates:
+        _bulk_upsert(spec.doctype, ('name', 'modified', 'modified_by', *fields), updates)
+    if replaced:
+        frappe.db.delete(spec.child_doctype, {'parenttype': spec.doctype, 'parent': ['in', replaced]})
+    if children:
+        frappe.db.bulk_insert(
+            spec.child_doctype,
+            ('name', 'creation', 'modified', 'owner', 'modified_by', 'docstatus',
+             'parent', 'parenttype', 'parentfield', 'idx', 'user', spec.child_link),
+            children,
+        )
+    indexed.update(written)
+    return {'inserted': len(inserts), 'updated': len(updates), 'unchanged': unchanged}
+
+def get_commit_batch_size():
+    value = frappe.db.get_single_value('GitHub Settings', 'sync_commit_batch_size')
+    return max(1, frappe.utils.cint(value) or DEFAULT_COMMIT_BATCH_SIZE)
+
+class ChunkedWriter:
+    """Write records in transactions of ``batch_size`` (GitHub Settings >
+    Sync Commit Batch Size) records.
+
+    ``write(records)`` returns counts like ``upsert_issues``. Records are
+    buffered until a batch is full; the batch is then written, the last
+    ``checkpoint`` given to ``add`` is called, and the transaction is
+    committed. A batch that fails is rolled back and written again one
+    record at a time, so a bad record only costs itself: it is logged and
+    counted in ``stats['errors']``.
+
+    Checkpoints are watermarks, so once a record has been skipped no later
+    checkpoint is called: the progress stays before it and the next sync
+    fetches it again. ``failed_since`` is the oldest ``updated_at`` among
+    the skipped records, for callers that save a watermark themselves.
+    """
+
+    def __init__(self, write, batch_size=None, title='GitHub Sync'):
+        self.write = write
+        self.batch_size = batch_size or get_commit_batch_size()
+        self.title = title
+        self.pending, self.checkpoint = [], None
+        self.failed_since = None
+        self.counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        self.stats = {'chunks': 0, 'failed_chunks': 0, 'records': 0, 'errors': 0, 'seconds': 0.0, 'max_seconds': 0.0}
+
+    def add(self, records, checkpoint=None):
+        """Buffer ``records``; ``checkpoint`` saves the progress they complete"""
+        self.pending.extend(records)
+        self.checkpoint = checkpoint or self.checkpoint
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write and commit whatever is buffered"""
+        if not self.pending and not self.checkpoint:
+            return
+        records, checkpoint = self.pending, self.checkpoint
+        self.pending, self.checkpoint = [], None
+        started = time.monotonic()
+        if records:
+            frappe.db.savepoint('github_chunk')
+            try:
+                self._add_counts(self.write(records))
+            except Exception:
+                frappe.db.rollback(save_point='github_chunk')
+                self.stats['failed_chunks'] += 1
+                self._write_one_by_one(records)
+        if checkpoint and not self.stats['errors']:
+            checkpoint()
+        frappe.db.commit()
+        elapsed = time.monotonic() - started
+        self.stats['chunks'] += 1
+        self.stats['records'] += len(records)
+        self.stats['seconds'] = round(self.stats['seconds'] + elapsed, 3)
+        self.stats['max_seconds'] = round(max(self.stats['max_seconds'], elapsed), 3)
+
+    def _write_one_by_one(self, records):
+        for record in records:
+            frappe.db.savepoint('github_record')
+            try:
+                self._add_counts(self.write([record]))
+            except Exception:
+                frappe.db.rollback(save_point='github_record')
+                self.stats['errors'] += 1
+                updated_at = record.get('updated_at')
+                if updated_at and (not self.failed_since or updated_at < self.failed_since):
+                    self.failed_since = updated_at
+                frappe.log_error(
+                    f"Record {record.get('number')}: {frappe.get_traceback()}", f'{self.title}: record skipped'
+                )
+
+    def _add_counts(self, counts):
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+
+def reconcile_table(spec, repository, rows, delete_missing=True):
+    """Make the ``spec`` child rows of Repository ``repository`` match ``rows``.
+
+    Rows are matched on ``spec.key``; a row may carry only some fields, the
+    others keep their stored values. Stored rows missing from ``rows`` are
+    deleted unless ``delete_missing`` is off. Returns
+    ``{'inserted', 'updated', 'deleted', 'unchanged'}``.
+    """
+    filters = {'parent': repository, 'parenttype': 'Repository', 'parentfield': spec.parentfield}
+    stored, duplicates = {}, []
+    max_idx = 0
+    for current in frappe.get_all(spec.doctype, filters=filters, fields=['name', 'idx', *spec.fields],
+                                  order_by='idx asc'):
+        max_idx = max(max_idx, current.idx or 0)
+        if current.get(spec.key) in stored:
+            duplicates.append(current.name)
+        else:
+            stored[current.get(spec.key)] = current
+
+    now = frappe.utils.now()
+    user = frappe.session.user if getattr(frappe.local, 'session', None) else 'Administrator'
+    inserts, updates, seen = [], [], set()
+    unchanged = 0
+    for row in rows:
+        key = row.get(spec.key)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        current = stored.get(key)
+        if not current:
+            max_idx += 1
+            values = {f: row.get(f) for f in spec.fields}
+            name = _autoname(spec.doctype, values)
+            inserts.append((name, now, now, user, user, 0, repository, 'Repository', spec.parentfield, max_idx,
+                            *(values[f] for f in spec.fields)))
+        elif any(_normalise(row[f]) != _normalise(current.get(f)) for f in spec.fields if f in row):
+            values = {f: row[f] if f in row else current.get(f) for f in spec.fields}
+            updates.append((current.name, now, user, *(values[f] for f in spec.fields)))
+        else:
+            unchanged += 1
+
+    deleted = duplicates + ([current.name for key, current in stored.items() if key not in seen] if delete_missing else [])
+    if deleted:
+        frappe.db.delete(spec.doctype, {'name': ['in', deleted]})
+    if updates:
+        _bulk_upsert(spec.doctype, ('name', 'modified', 'modified_by', *spec.fields), updates)
+    if inserts:
+        frappe.db.bulk_insert(
+            spec.doctype,
+            ('name', 'creation', 'modified', 'owner', 'modified_by', 'docstatus',
+             'parent', 'parenttype', 'parentfield', 'idx', *spec.fields),
+            inserts,
+        )
+    return {'inserted': len(inserts), 'updated': len(updates), 'deleted': len(deleted), 'unchanged': unchanged}
+
+def _child_values(spec, parent, users, now, user):
+    return [
+        (frappe.generate_hash(length=10), now, now, user, user, 0,
+         parent, spec.doctype, spec.child_field, idx, erp_user, parent)
+        for idx, erp_user in enumerate(users, 1)
+    ]
+
+def _bulk_upsert(doctype, fields, values, update_fields=None):
+    """Write rows in one statement; rows whose ``name`` (the first field) exists get
+    ``update_fields`` (default: all the others) overwritten"""
+    columns = ', '.join(f'`{f}`' for f in fields)
+    placeholders = ', '.join(['(' + ', '.join(['%s'] * len(fields)) + ')'] * len(values))
+    update_fields = update_fields or fields[1:]
+    if frappe.db.db_type == 'postgres':
+        assignments = ', '.join(f'`{f}` = excluded.`{f}`' for f in update_fields)
+        conflict = f'on conflict (`name`) do update set {assignments}'
+    else:
+        assignments = ', '.join(f'`{f}` = values(`{f}`)' for f in update_fields)
+        conflict = f'on duplicate key update {assignments}'
+    frappe.db.sql(
+        f'insert into `tab{doctype}` ({columns}) values {placeholders} {conflict}',
+        tuple(v for row in values for v in row),
+    )
+
+def _autoname(doctype, row):
+    """Name a new row the way its ``format:`` autoname would"""
+    autoname = frappe.get_meta(doctype).autoname or ''
+    if not autoname.startswith('format:'):
+        return frappe.generate_hash(length=10)
+    return re.sub(r'\{(\w+)\}', lambda m: str(row.get(m.group(1)) or ''), autoname[len('format:'):])
+
+def _hash(spec, row, users):
+    values = [_normalise(row.get(f)) for f in spec.fields]
+    return hashlib.sha1(json.dumps([values, users]).encode()).hexdigest()
+
+def _normalise(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return str(int(value))
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return str(value)
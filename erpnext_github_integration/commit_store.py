@@ -0,0 +1,109 @@
+import frappe
+from .github_client import github_request
+
+# Permanent commit metadata store (Repository Commit, named by SHA).
+#
+# A commit's author and dates never change, so once we know a SHA
+# we never ask GitHub about it again. Push webhooks fill the store in bulk
+# from their ``commits`` arrays, and branch sync only calls
+# /repos/{repo}/commits/{sha} for heads it has never seen.
+
+FIELDS = ('sha', 'repository', 'author_login', 'author_name', 'author_date', 'committer_date', 'source')
+NULL_SHA = '0' * 40
+
+def from_api(repo_full, commit):
+    """Record from a REST ``/repos/{repo}/commits/{sha}`` payload"""
+    git = commit.get('commit') or {}
+    return {
+        'sha': commit.get('sha'),
+        'repository': repo_full,
+        'author_login': (commit.get('author') or {}).get('login'),
+        'author_name': (git.get('author') or {}).get('name'),
+        'author_date': (git.get('author') or {}).get('date'),
+        'committer_date': (git.get('committer') or {}).get('date'),
+        'source': 'API',
+    }
+
+def from_push(repo_full, commit):
+    """Record from one entry of a push webhook's ``commits`` array"""
+    author = commit.get('author') or {}
+    return {
+        'sha': commit.get('id'),
+        'repository': repo_full,
+        'author_login': author.get('username'),
+        'author_name': author.get('name'),
+        # Push payloads carry a single timestamp per commit
+        'author_date': commit.get('timestamp'),
+        'committer_date': commit.get('timestamp'),
+        'source': 'Push Webhook',
+    }
+
+def from_graphql(repo_full, target):
+    """Record from a GraphQL ``Commit`` target (``oid``, ``author``, ``committedDate``)"""
+    author = target.get('author') or {}
+    return {
+        'sha': target.get('oid'),
+        'repository': repo_full,
+        'author_login': (author.get('user') or {}).get('login'),
+        'author_name': author.get('name'),
+        'author_date': author.get('date'),
+        'committer_date': target.get('committedDate'),
+        'source': 'GraphQL',
+    }
+
+def get_commits(shas):
+    """Return ``{sha: record}`` for the SHAs already in the store; dates are GitHub (UTC ISO) strings"""
+    from .github_api import convert_to_github_datetime
+
+    shas = list({sha for sha in shas if sha and sha != NULL_SHA})
+    if not shas:
+        return {}
+    rows = frappe.get_all('Repository Commit', filters={'name': ['in', shas]}, fields=list(FIELDS))
+    for row in rows:
+        row['author_date'] = convert_to_github_datetime(row.get('author_date'))
+        row['committer_date'] = convert_to_github_datetime(row.get('committer_date'))
+    return {row['sha']: row for row in rows}
+
+def store_commits(records):
+    """Insert the records whose SHA is not stored yet, in one statement"""
+    from .github_api import convert_github_datetime
+
+    records = {r['sha']: r for r in records if r.get('sha') and r['sha'] != NULL_SHA}
+    if not records:
+        return 0
+    known = set(frappe.get_all('Repository Commit', filters={'name': ['in', list(records)]}, pluck='name'))
+    now = frappe.utils.now()
+    user = frappe.session.user if getattr(frappe.local, 'session', None) else 'Administrator'
+    values = [
+        (
+            sha, now, now, user, user, 0,
+            sha, r.get('repository'), r.get('author_login'), (r.get('author_name') or '')[:140],
+            convert_github_datetime(r.get('author_date')),
+            convert_github_datetime(r.get('committer_date')),
+            r.get('source'),
+        )
+        for sha, r in records.items() if sha not in known
+    ]
+    if values:
+        frappe.db.bulk_insert(
+            'Repository Commit',
+            ('name', 'creation', 'modified', 'owner', 'modified_by', 'docstatus', *FIELDS),
+            values,
+            ignore_duplicates=True,
+        )
+    return len(values)
+
+def get_commit_dates(repo_full, shas, token):
+    """Author date (GitHub ISO string) of each SHA; only unknown SHAs are fetched from GitHub"""
+    known = get_commits(shas)
+    fetched = []
+    for sha in {sha for sha in shas if sha and sha != NULL_SHA} - set(known):
+        commit = github_request('GET', f'/repos/{repo_full}/commits/{sha}', token)
+        if isinstance(commit, dict):
+            fetched.append(from_api(repo_full, commit))
+        else:
+            frappe.logger().warning(f"Unexpected commit response for {repo_full}, SHA {sha}: {commit}")
+    store_commits(fetched)
+    dates = {sha: record.get('author_date') for sha, record in known.items()}
+    dates.update({record['sha']: record.get('author_date') for record in fetched})
+    return dates
@@ -5,6 +5,7 @@ frappe.ui.form.on("GitHub Settings", {
     refresh(frm) {
         // Update on form refresh
         update_auth_fields_visibility(frm);
+        render_api_metrics(frm);
         // Test Connection button
         frm.add_custom_button(__('Test Connection'), function() {
             if (!frm.doc.personal_access_token) {
@@ -197,6 +198,9 @@ frappe.ui.form.on("GitHub Settings", {
                     callback: function(r) {
                         if (r.message && r.message.status === 'queued') {
                             frappe.msgprint(__('Repository sync queued — watch the progress dialog.'));
+                        } else if (r.message && r.message.status === 'running') {
+                            frappe.msgprint(__('A repository sync is already running ({0} of {1} done) — watch the progress dialog.',
+                                [r.message.done, r.message.total]));
                         } else {
                             frappe.msgprint(__('Repository sync started.'));
                         }
@@ -497,6 +501,70 @@ frappe.ui.form.on("GitHub Settings", {
     }
 });
 
+function render_api_metrics(frm) {
+    const $wrapper = frm.fields_dict.api_metrics_html && frm.fields_dict.api_metrics_html.$wrapper;
+    if (!$wrapper) return;
+
+    frappe.call({
+        method: 'erpnext_github_integration.github_api.get_api_metrics',
+        callback: function(r) {
+            const metrics = r.message || {};
+            const fmt = (v) => (v === null || v === undefined) ? '-' : v;
+            const endpoints = (metrics.endpoints || []).map(m => `
+                <tr>
+                    <td><code>${frappe.utils.escape_html(m.method + ' ' + m.endpoint)}</code></td>
+                    <td class="text-right">${m.requests}</td>
+                    <td class="text-right">${m.errors}</td>
+                    <td class="text-right">${fmt(m.p50_ms)}</td>
+                    <td class="text-right">${fmt(m.p95_ms)}</td>
+                    <td class="text-right">${fmt(m.p99_ms)}</td>
+                    <td class="text-right">${fmt(m.avg_pages)}</td>
+                    <td class="text-right">${format_number(m.bytes / 1024, null, 0)}</td>
+                </tr>`).join('');
+            const rate_limits = (metrics.rate_limits || []).map(g => `
+                <tr>
+                    <td><code>${g.fingerprint}</code></td>
+                    <td>${g.resource}</td>
+                    <td class="text-right">${g.remaining} / ${g.limit}</td>
+                    <td>${g.reset ? frappe.datetime.comment_when(new Date(g.reset * 1000)) : '-'}</td>
+                </tr>`).join('');
+
+            $wrapper.html(`
+                <div class="mb-2">
+                    <button class="btn btn-xs btn-default refresh-api-metrics">${__('Refresh')}</button>
+                    <button class="btn btn-xs btn-default reset-api-metrics">${__('Reset')}</button>
+                </div>
+                <table class="table table-bordered table-condensed">
+                    <thead><tr>
+                        <th>${__('Endpoint')}</th><th>${__('Requests')}</th><th>${__('Errors')}</th>
+                        <th>p50 ms</th><th>p95 ms</th><th>p99 ms</th>
+                        <th>${__('Pages / Call')}</th><th>KB</th>
+                    </tr></thead>
+                    <tbody>${endpoints || `<tr><td colspan="8" class="text-muted">${__('No requests recorded yet')}</td></tr>`}</tbody>
+                </table>
+                <table class="table table-bordered table-condensed">
+                    <thead><tr>
+                        <th>${__('Credential')}</th><th>${__('Resource')}</th>
+                        <th>${__('Remaining')}</th><th>${__('Resets')}</th>
+                    </tr></thead>
+                    <tbody>${rate_limits || `<tr><td colspan="4" class="text-muted">${__('No rate limit reported yet')}</td></tr>`}</tbody>
+                </table>
+            `);
+            $wrapper.find('.refresh-api-metrics').on('click', () => render_api_metrics(frm));
+            $wrapper.find('.reset-api-metrics').on('click', () => {
+                frappe.call({
+                    method: 'erpnext_github_integration.github_api.get_api_metrics',
+                    args: { reset: 1 },
+                    callback: () => render_api_metrics(frm)
+                });
+            });
+        },
+        error: function() {
+            $wrapper.empty();
+        }
+    });
+}
+
 function update_auth_fields_visibility(frm) {
     // Default to PAT if not set
     const auth_type = frm.doc.auth_type || 'Personal Access Token';
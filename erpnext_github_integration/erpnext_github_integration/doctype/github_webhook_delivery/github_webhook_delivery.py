@@ -0,0 +1,16 @@
+# Copyright (c) 2026, Yanky and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class GitHubWebhookDelivery(Document):
+	@staticmethod
+	def clear_old_logs(days=7):
+		# Called by Log Settings; deliveries still waiting are kept
+		cutoff = frappe.utils.add_days(frappe.utils.now_datetime(), -days)
+		frappe.db.delete(
+			"GitHub Webhook Delivery",
+			{"creation": ("<", cutoff), "status": ("in", ("Processed", "Coalesced", "Ignored", "Failed"))},
+		)
@@ -0,0 +1,60 @@
+# Copyright (c) 2026, Yanky and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from erpnext_github_integration import webhook_dedupe, webhook_inbox
+
+
+class TestGitHubWebhookDelivery(FrappeTestCase):
+	def setUp(self):
+		self.delivery_id = frappe.generate_hash(length=16)
+		self.addCleanup(webhook_dedupe.forget, self.delivery_id)
+
+	def tearDown(self):
+		frappe.db.delete(webhook_inbox.DOCTYPE, {'delivery_id': self.delivery_id})
+		frappe.db.commit()
+
+	def _delivery(self, attempts):
+		doc = frappe.get_doc({
+			'doctype': webhook_inbox.DOCTYPE,
+			'event': 'issues',
+			'action': 'opened',
+			'repo_full_name': 'octo/hello',
+			'delivery_id': self.delivery_id,
+			'status': 'Processing',
+			'attempts': attempts,
+			'received_at': frappe.utils.now_datetime(),
+			'payload': frappe.as_json({'action': 'opened', 'issue': {'number': 1}}),
+		}).insert(ignore_permissions=True)
+		return frappe._dict(doc.as_dict())
+
+	def _process_failing(self, row):
+		with patch('erpnext_github_integration.webhooks._process_github_webhook', side_effect=RuntimeError('boom')), \
+				patch.object(webhook_inbox.frappe.db, 'exists', return_value=True):
+			return webhook_inbox._process(row)
+
+	def test_failed_apply_accepts_redelivery(self):
+		self.assertTrue(webhook_dedupe.claim(self.delivery_id))
+		row = self._delivery(attempts=webhook_inbox.MAX_ATTEMPTS)
+
+		self.assertEqual(self._process_failing(row), 'Failed')
+
+		self.assertEqual(frappe.db.get_value(webhook_inbox.DOCTYPE, row.name, 'status'), 'Failed')
+		self.assertFalse(webhook_dedupe.seen(self.delivery_id))
+		self.assertTrue(webhook_dedupe.claim(self.delivery_id))
+
+	def test_failed_attempt_is_retried(self):
+		self.assertTrue(webhook_dedupe.claim(self.delivery_id))
+		row = self._delivery(attempts=1)
+
+		self.assertEqual(self._process_failing(row), 'Queued')
+
+		status, retry_at = frappe.db.get_value(webhook_inbox.DOCTYPE, row.name, ['status', 'retry_at'])
+		self.assertEqual(status, 'Queued')
+		self.assertGreater(retry_at, frappe.utils.now_datetime())
+		# Released as well: a redelivery in the meantime is not dropped
+		self.assertTrue(webhook_dedupe.claim(self.delivery_id))
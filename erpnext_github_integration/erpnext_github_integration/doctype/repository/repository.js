@@ -10,7 +10,10 @@ frappe.ui.form.on("Repository", {
                     method: 'erpnext_github_integration.github_api.sync_repo',
                     args: {repository: frm.doc.full_name},
                     callback: function(r) {
-                        if (r.message) {
+                        if (r.message && r.message.lock && r.message.lock.timed_out) {
+                            // Another sync of this repository is still running
+                            frappe.msgprint(r.message.message);
+                        } else if (r.message) {
                             frappe.msgprint(__('Sync completed: {0} branches, {1} issues, {2} PRs, {3} members', 
                                 [r.message.branches, r.message.issues, r.message.pulls, r.message.members]));
                             frm.reload_doc();
@@ -0,0 +1,8 @@
+// Copyright (c) 2026, Yanky and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Repository Commit", {
+// 	refresh(frm) {
+
+// 	},
+// });
@@ -0,0 +1,17 @@
+# Copyright (c) 2026, Yanky and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class SyncLog(Document):
+	@staticmethod
+	def clear_old_logs(days=30):
+		# Called by Log Settings (see default_log_clearing_doctypes in hooks.py)
+		cutoff = frappe.utils.add_days(frappe.utils.now_datetime(), -days)
+		names = frappe.get_all("Sync Log", filters={"creation": ("<", cutoff)}, pluck="name")
+		for start in range(0, len(names), 1000):
+			chunk = names[start : start + 1000]
+			frappe.db.delete("Sync Log Phase", {"parent": ("in", chunk), "parenttype": "Sync Log"})
+			frappe.db.delete("Sync Log", {"name": ("in", chunk)})
@@ -0,0 +1,41 @@
+// Copyright (c) 2026, Yanky and contributors
+// For license information, please see license.txt
+
+frappe.query_reports["Sync Performance"] = {
+	filters: [
+		{
+			fieldname: "view",
+			label: __("View"),
+			fieldtype: "Select",
+			options: "Repositories\nPhases\nOver Time",
+			default: "Repositories",
+			reqd: 1,
+		},
+		{
+			fieldname: "from_date",
+			label: __("From Date"),
+			fieldtype: "Date",
+			default: frappe.datetime.add_months(frappe.datetime.get_today(), -1),
+			reqd: 1,
+		},
+		{
+			fieldname: "to_date",
+			label: __("To Date"),
+			fieldtype: "Date",
+			default: frappe.datetime.get_today(),
+			reqd: 1,
+		},
+		{
+			fieldname: "repository",
+			label: __("Repository"),
+			fieldtype: "Link",
+			options: "Repository",
+		},
+		{
+			fieldname: "status",
+			label: __("Status"),
+			fieldtype: "Select",
+			options: "\nCompleted\nPaused\nFailed",
+		},
+	],
+};
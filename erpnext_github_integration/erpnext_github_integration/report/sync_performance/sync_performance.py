@@ -0,0 +1,178 @@
+# Copyright (c) 2026, Yanky and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+
+
+def execute(filters=None):
+	filters = frappe._dict(filters or {})
+	view = filters.get("view") or "Repositories"
+	if view == "Phases":
+		return _phases(filters)
+	if view == "Over Time":
+		return _over_time(filters)
+	return _repositories(filters)
+
+
+def _conditions(filters):
+	conditions = ["log.started_at >= %(from_date)s", "log.started_at < %(to_date)s"]
+	values = {
+		"from_date": filters.get("from_date") or frappe.utils.add_months(frappe.utils.today(), -1),
+		# Inclusive end date
+		"to_date": frappe.utils.add_days(filters.get("to_date") or frappe.utils.today(), 1),
+	}
+	if filters.get("repository"):
+		conditions.append("log.repository = %(repository)s")
+		values["repository"] = filters.repository
+	if filters.get("status"):
+		conditions.append("log.status = %(status)s")
+		values["status"] = filters.status
+	return " and ".join(conditions), values
+
+
+def _repositories(filters):
+	"""Slowest repositories first, with the phase they spend most time in"""
+	conditions, values = _conditions(filters)
+	rows = frappe.db.sql(
+		f"""select log.repository, count(*) as syncs, sum(log.status = 'Failed') as failed,
+				avg(log.duration) as avg_duration, max(log.duration) as max_duration,
+				sum(log.duration) as total_duration, avg(log.requests) as avg_requests,
+				avg(log.queries) as avg_queries, sum(log.rows_inserted + log.rows_updated) as rows_written,
+				sum(log.rows_skipped) as rows_skipped, max(log.peak_rss_mb) as peak_rss_mb
+			from `tabSync Log` log
+			where {conditions}
+			group by log.repository
+			order by max_duration desc""",
+		values,
+		as_dict=True,
+	)
+	slowest = {}
+	for repository, phase, seconds in frappe.db.sql(
+		f"""select log.repository, phase.phase, sum(phase.seconds)
+			from `tabSync Log Phase` phase
+			join `tabSync Log` log on log.name = phase.parent and phase.parenttype = 'Sync Log'
+			where {conditions}
+			group by log.repository, phase.phase""",
+		values,
+	):
+		if seconds > slowest.get(repository, (None, -1))[1]:
+			slowest[repository] = (phase, seconds)
+	for row in rows:
+		row.slowest_phase = slowest.get(row.repository, (None, 0))[0]
+
+	columns = [
+		{"label": _("Repository"), "fieldname": "repository", "fieldtype": "Link", "options": "Repository", "width": 220},
+		{"label": _("Syncs"), "fieldname": "syncs", "fieldtype": "Int", "width": 70},
+		{"label": _("Failed"), "fieldname": "failed", "fieldtype": "Int", "width": 70},
+		{"label": _("Avg (s)"), "fieldname": "avg_duration", "fieldtype": "Float", "precision": 2, "width": 90},
+		{"label": _("Max (s)"), "fieldname": "max_duration", "fieldtype": "Float", "precision": 2, "width": 90},
+		{"label": _("Total (s)"), "fieldname": "total_duration", "fieldtype": "Float", "precision": 1, "width": 90},
+		{"label": _("Slowest Phase"), "fieldname": "slowest_phase", "fieldtype": "Data", "width": 150},
+		{"label": _("Avg Requests"), "fieldname": "avg_requests", "fieldtype": "Float", "precision": 1, "width": 110},
+		{"label": _("Avg Queries"), "fieldname": "avg_queries", "fieldtype": "Float", "precision": 1, "width": 110},
+		{"label": _("Rows Written"), "fieldname": "rows_written", "fieldtype": "Int", "width": 110},
+		{"label": _("Rows Skipped"), "fieldname": "rows_skipped", "fieldtype": "Int", "width": 110},
+		{"label": _("Peak RSS (MB)"), "fieldname": "peak_rss_mb", "fieldtype": "Float", "precision": 1, "width": 110},
+	]
+	chart = {
+		"data": {
+			"labels": [row.repository for row in rows[:20]],
+			"datasets": [{"name": _("Max (s)"), "values": [row.max_duration for row in rows[:20]]}],
+		},
+		"type": "bar",
+	}
+	return columns, rows, None, chart
+
+
+def _phases(filters):
+	"""Where the time goes: phases by total time"""
+	conditions, values = _conditions(filters)
+	rows = frappe.db.sql(
+		f"""select phase.phase, count(distinct log.name) as syncs, sum(phase.seconds) as total_seconds,
+				avg(phase.seconds) as avg_seconds, max(phase.seconds) as max_seconds, sum(phase.calls) as calls,
+				sum(phase.requests) as requests, sum(phase.queries) as queries, max(phase.peak_rss_mb) as peak_rss_mb
+			from `tabSync Log Phase` phase
+			join `tabSync Log` log on log.name = phase.parent and phase.parenttype = 'Sync Log'
+			where {conditions}
+			group by phase.phase
+			order by total_seconds desc""",
+		values,
+		as_dict=True,
+	)
+	total = sum(row.total_seconds or 0 for row in rows) or 1
+	for row in rows:
+		row.share = 100.0 * (row.total_seconds or 0) / total
+
+	columns = [
+		{"label": _("Phase"), "fieldname": "phase", "fieldtype": "Data", "width": 170},
+		{"label": _("Syncs"), "fieldname": "syncs", "fieldtype": "Int", "width": 70},
+		{"label": _("Total (s)"), "fieldname": "total_seconds", "fieldtype": "Float", "precision": 1, "width": 100},
+		{"label": _("Share (%)"), "fieldname": "share", "fieldtype": "Percent", "width": 90},
+		{"label": _("Avg (s)"), "fieldname": "avg_seconds", "fieldtype": "Float", "precision": 3, "width": 90},
+		{"label": _("Max (s)"), "fieldname": "max_seconds", "fieldtype": "Float", "precision": 3, "width": 90},
+		{"label": _("Calls"), "fieldname": "calls", "fieldtype": "Int", "width": 90},
+		{"label": _("GitHub Requests"), "fieldname": "requests", "fieldtype": "Int", "width": 120},
+		{"label": _("DB Queries"), "fieldname": "queries", "fieldtype": "Int", "width": 100},
+		{"label": _("Peak RSS (MB)"), "fieldname": "peak_rss_mb", "fieldtype": "Float", "precision": 1, "width": 110},
+	]
+	chart = {
+		"data": {
+			"labels": [row.phase for row in rows],
+			"datasets": [{"name": _("Total (s)"), "values": [row.total_seconds for row in rows]}],
+		},
+		"type": "bar",
+	}
+	return columns, rows, None, chart
+
+
+def _over_time(filters):
+	"""One row per day: sync durations and the seconds spent in each phase"""
+	conditions, values = _conditions(filters)
+	rows = frappe.db.sql(
+		f"""select date(log.started_at) as date, count(*) as syncs, avg(log.duration) as avg_duration,
+				max(log.duration) as max_duration, sum(log.requests) as requests, sum(log.queries) as queries
+			from `tabSync Log` log
+			where {conditions}
+			group by date(log.started_at)
+			order by date""",
+		values,
+		as_dict=True,
+	)
+	by_date = {str(row.date): row for row in rows}
+	phases = {}
+	for date, phase, seconds in frappe.db.sql(
+		f"""select date(log.started_at), phase.phase, sum(phase.seconds)
+			from `tabSync Log Phase` phase
+			join `tabSync Log` log on log.name = phase.parent and phase.parenttype = 'Sync Log'
+			where {conditions}
+			group by date(log.started_at), phase.phase""",
+		values,
+	):
+		fieldname = phases.setdefault(phase, "phase_" + frappe.scrub(phase))
+		by_date[str(date)][fieldname] = seconds
+	# Busiest phases first
+	ordered = sorted(phases, key=lambda p: sum(row.get(phases[p]) or 0 for row in rows), reverse=True)
+
+	columns = [
+		{"label": _("Date"), "fieldname": "date", "fieldtype": "Date", "width": 100},
+		{"label": _("Syncs"), "fieldname": "syncs", "fieldtype": "Int", "width": 70},
+		{"label": _("Avg (s)"), "fieldname": "avg_duration", "fieldtype": "Float", "precision": 2, "width": 90},
+		{"label": _("Max (s)"), "fieldname": "max_duration", "fieldtype": "Float", "precision": 2, "width": 90},
+		{"label": _("GitHub Requests"), "fieldname": "requests", "fieldtype": "Int", "width": 120},
+		{"label": _("DB Queries"), "fieldname": "queries", "fieldtype": "Int", "width": 100},
+	] + [
+		{"label": _("{0} (s)").format(phase), "fieldname": phases[phase], "fieldtype": "Float", "precision": 1, "width": 120}
+		for phase in ordered
+	]
+	chart = {
+		"data": {
+			"labels": [str(row.date) for row in rows],
+			"datasets": [
+				{"name": phase, "values": [row.get(phases[phase]) or 0 for row in rows]} for phase in ordered
+			],
+		},
+		"type": "bar",
+		"barOptions": {"stacked": 1},
+	}
+	return columns, rows, None, chart
@@ -4,7 +4,8 @@ import datetime
 from datetime import datetime, timedelta
 from dateutil import parser
 import pytz
-from .github_client import github_request
+from .github_client import github_request, iter_github_items, iter_github_pages
+from . import bulk_writer, commit_store, github_cache, github_graphql, github_metrics, retry_policy, sync_lock, sync_profile, sync_queue, sync_scheduler, sync_state, token_pool, webhook_inbox
 from frappe.desk.form.assign_to import add, clear
 import time
 
@@ -18,6 +19,7 @@ def has_role(role):
         return role in frappe.get_roles()
     
 # Helper function to convert GitHub datetime to MySQL format
+@sync_profile.timed('Date Conversion')
 def convert_github_datetime(dt_string):
     if not dt_string:
         return None
@@ -48,6 +50,7 @@ import pytz
 import frappe
 
 # Helper function to convert MySQL (IST) datetime to GitHub UTC ISO
+@sync_profile.timed('Date Conversion')
 def convert_to_github_datetime(local_dt):
     if not local_dt:
         return None
@@ -77,6 +80,15 @@ def convert_to_github_datetime(local_dt):
 # if not has_role('GitHub Admin'):
 #     frappe.throw("Permission required")
 
+def get_github_token(repo_or_org=None):
+    """Token from the credential pool with the most rate limit budget left.
+
+    ``repo_or_org`` may be ``owner/repo`` or an organization name; credentials
+    restricted to another organization are never returned.
+    """
+    organization = (repo_or_org or '').split('/')[0] or None
+    return token_pool.get_token(organization)
+
 def _require_github_admin():
     if not has_role('GitHub Admin'):
         frappe.throw(_('Only users with the GitHub Admin role can perform this action.'))
@@ -98,8 +110,7 @@ def _can_sync_repo(repo_full_name):
 @frappe.whitelist()
 def test_connection():
     """Test GitHub API connection"""
-    settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    token = token_pool.primary_token()
     if not token:
         return {'success': False, 'error': 'GitHub Personal Access Token not configured'}
     
@@ -115,8 +126,7 @@ def test_connection():
 @frappe.whitelist()
 def get_github_username_by_email(email):
     """Fetch GitHub username from GitHub API using email"""
-    settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    token = get_github_token()
     
     if not token:
         return {'success': False, 'error': 'GitHub Personal Access Token not configured'}
@@ -145,25 +155,24 @@ def get_github_username_by_email(email):
 def fetch_all_repositories(organization=None):
     """Fetch all repositories from GitHub and create/update them in ERPNext"""
     try:
-        settings = frappe.get_single('GitHub Settings')
-        token = settings.get_password('personal_access_token')
+        # /user/repos lists the repositories of whoever the token belongs to
+        token = get_github_token(organization) if organization else token_pool.primary_token()
         
         if not token:
             frappe.throw('GitHub Personal Access Token not configured')
         
-        # Get repositories from GitHub
+        # Stream repositories from GitHub page by page
         if organization:
-            repos = github_request('GET', f'/orgs/{organization}/repos', token, params={'per_page': 100})
+            repos = iter_github_items(f'/orgs/{organization}/repos', token, params={'per_page': 100})
         else:
-            repos = github_request('GET', '/user/repos', token, params={'per_page': 100, 'affiliation': 'owner'})
-        
-        if not repos:
-            return {'success': False, 'message': 'No repositories found'}
+            repos = iter_github_items('/user/repos', token, params={'per_page': 100, 'affiliation': 'owner'})
         
+        fetched_count = 0
         created_count = 0
         updated_count = 0
         
         for repo in repos:
+            fetched_count += 1
             # Check if repository already exists
             repo_name = repo.get('full_name')
             existing_repo = frappe.db.exists('Repository', {'full_name': repo_name})
@@ -196,9 +205,12 @@ def fetch_all_repositories(organization=None):
                 created_count += 1
                 frappe.logger().info(f"Created repository: {repo_name}")
         
+        if not fetched_count:
+            return {'success': False, 'message': 'No repositories found'}
+        
         return {
             'success': True,
-            'message': f'Successfully fetched {len(repos)} repositories. Created: {created_count}, Updated: {updated_count}'
+            'message': f'Successfully fetched {fetched_count} repositories. Created: {created_count}, Updated: {updated_count}'
         }
         
     except Exception as e:
@@ -217,14 +229,67 @@ def get_sync_statistics():
     }
     return stats
 
+@frappe.whitelist()
+def get_api_cache_statistics(reset=False):
+    """Get ETag cache counters (how many GitHub GETs were answered with 304) and user profile cache counters"""
+    _require_github_admin()
+    stats = github_cache.get_etag_stats()
+    stats['user_profiles'] = github_cache.get_user_profile_stats()
+    if frappe.utils.cint(reset):
+        github_cache.reset_etag_stats()
+        github_cache.reset_user_profile_stats()
+    return stats
+
+@frappe.whitelist()
+def get_api_health(reset=False):
+    """Get retry counters and the circuit breaker state of failing GitHub endpoints"""
+    _require_github_admin()
+    health = {
+        'retries': retry_policy.get_retry_stats(),
+        'circuits': retry_policy.get_circuit_status(),
+    }
+    if frappe.utils.cint(reset):
+        retry_policy.reset_retry_stats()
+    return health
+
+@frappe.whitelist()
+def get_api_metrics(reset=False):
+    """Get latency percentiles, status codes, bytes and pages per GitHub endpoint template,
+    plus the last reported rate limit of every credential"""
+    _require_github_admin()
+    metrics = {
+        'endpoints': github_metrics.get_endpoint_metrics(),
+        'rate_limits': github_metrics.get_rate_limit_gauges(),
+    }
+    if frappe.utils.cint(reset):
+        github_metrics.reset_metrics()
+    return metrics
+
+@frappe.whitelist()
+def get_sync_schedule():
+    """Scheduled sync ranking: heat, interval, staleness and priority per repository"""
+    _require_github_admin()
+    return sync_scheduler.get_schedule()
+
+@frappe.whitelist()
+def get_webhook_inbox_status():
+    """Webhook inbox depth, oldest queued delivery and processing lag of the last hour"""
+    _require_github_admin()
+    return webhook_inbox.get_status()
+
+@frappe.whitelist()
+def get_token_pool_status():
+    """Get the rate limit budget of every credential in the pool"""
+    _require_github_admin()
+    return token_pool.get_pool_status()
+
 @frappe.whitelist()
 def can_user_sync_repo(repo_full_name):
     return {'can_sync': _can_sync_repo(repo_full_name)}
 
 @frappe.whitelist()
 def list_repositories(organization=None):
-    settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    token = get_github_token(organization) if organization else token_pool.primary_token()
     if not token:
         frappe.throw(_('GitHub Personal Access Token not configured in GitHub Settings'))
     if organization:
@@ -235,8 +300,7 @@ def list_repositories(organization=None):
 
 @frappe.whitelist()
 def list_branches(repo_full_name, per_page=100):
-    settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    token = get_github_token(repo_full_name)
     if not token:
         frappe.throw(_('GitHub Personal Access Token not configured in GitHub Settings'))
     path = f"/repos/{repo_full_name}/branches"
@@ -244,8 +308,7 @@ def list_branches(repo_full_name, per_page=100):
 
 @frappe.whitelist()
 def list_teams(org_name, per_page=100):
-    settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    token = get_github_token(org_name)
     if not token:
         frappe.throw(_('GitHub Personal Access Token not configured in GitHub Settings'))
     path = f"/orgs/{org_name}/teams"
@@ -253,8 +316,7 @@ def list_teams(org_name, per_page=100):
 
 @frappe.whitelist()
 def list_repo_members(repo_full_name, per_page=100):
-    settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    token = get_github_token(repo_full_name)
     if not token:
         frappe.throw(_('GitHub Personal Access Token not configured in GitHub Settings'))
     try:
@@ -265,8 +327,7 @@ def list_repo_members(repo_full_name, per_page=100):
 
 @frappe.whitelist()
 def assign_issue(repo_full_name, issue_number, assignees):
-    settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    token = get_github_token(repo_full_name)
     if not token:
         frappe.throw(_('GitHub Personal Access Token not configured in GitHub Settings'))
 
@@ -369,8 +430,7 @@ def assign_issue(repo_full_name, issue_number, assignees):
 
 @frappe.whitelist()
 def add_pr_reviewer(repo_full_name, pr_number, reviewers):
-    settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    token = get_github_token(repo_full_name)
     if not token:
         frappe.throw(_('GitHub Personal Access Token not configured in GitHub Settings'))
     if isinstance(reviewers, str):
@@ -399,257 +459,294 @@ def add_pr_reviewer(repo_full_name, pr_number, reviewers):
     return resp
 
 @frappe.whitelist()
-def sync_repo(repository):
-    repo_full = repository
-    if not _can_sync_repo(repo_full):
+def sync_repo(repository, time_budget=None):
+    """Sync one repository from GitHub.
+
+    With ``time_budget`` (seconds) the pass stops at the first checkpoint
+    after it and returns ``complete: False``; the next call resumes it.
+    Only one sync of a repository runs at a time: a background call made
+    while one is running waits for it (at most ``time_budget``, when given)
+    and returns its result; a web request returns at once with
+    ``lock.timed_out`` (see sync_lock.py).
+    """
+    if not _can_sync_repo(repository):
         frappe.throw(_('You do not have permission to sync this repository.'))
-    settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    return sync_lock.run_exclusive(
+        repository,
+        lambda: _profiled_sync_repo(repository, time_budget),
+        wait=frappe.utils.flt(time_budget) or None,
+    )
+
+def _profiled_sync_repo(repository, time_budget=None):
+    # Phase timings, request and query counts go to a Sync Log (sync_profile.py)
+    with sync_profile.profile_sync(repository) as profile:
+        result = profile.result = _sync_repo(repository, time_budget)
+    if profile.log:
+        result['sync_log'] = profile.log.name
+    return result
+
+def _sync_repo(repository, time_budget=None):
+    started = time.monotonic()
+    repo_full = repository
+    token = get_github_token(repo_full)
     if not token:
         frappe.throw(_('GitHub Personal Access Token not configured in GitHub Settings'))
     
-    # Get repository info
-    repo_info = github_request('GET', f'/repos/{repo_full}', token) or {}
-    branches = github_request('GET', f'/repos/{repo_full}/branches', token) or []
-    members = github_request('GET', f'/repos/{repo_full}/collaborators', token) or []
-    
-    # Upsert repo doc (without last_synced yet)
-    existing = frappe.db.exists('Repository', {'full_name': repo_full})
-    if existing:
-        repo_doc = frappe.get_doc('Repository', existing)
-        is_new = False
-    else:
-        repo_doc = frappe.get_doc({
-            'doctype': 'Repository',
-            'full_name': repo_full,
-            'repo_name': repo_full.split('/')[-1],
-            'repo_owner': repo_full.split('/')[0],
-            'url': f'https://github.com/{repo_full}',
-            'github_id': str(repo_info.get('id', '')),
-            'visibility': 'Private' if repo_info.get('private') else 'Public',
-            'default_branch': repo_info.get('default_branch', 'main'),
-            'is_synced': 1
-        })
-        is_new = True
-    
-    repo_doc.github_id = str(repo_info.get('id', ''))
-    repo_doc.visibility = 'Private' if repo_info.get('private') else 'Public'
-    repo_doc.default_branch = repo_info.get('default_branch', 'main')
+    # Get repository info, branches and collaborators: a few GraphQL queries
+    # when enabled, otherwise (or if GitHub rejects them) the REST endpoints
+    use_graphql = github_graphql.graphql_enabled()
+    fetched = None
+    with sync_profile.phase('Fetch Repository'):
+        if use_graphql:
+            try:
+                fetched = github_graphql.fetch_repository(repo_full, token)
+            except Exception:
+                frappe.log_error(frappe.get_traceback(), f'GitHub GraphQL Fallback: {repo_full}')
+                use_graphql = False
+        repo_info, branches, members = fetched or _fetch_repository_rest(repo_full, token)
+    # Branch heads seen through GraphQL go to the commit store as well
+    with sync_profile.phase('Commit Lookups'):
+        commit_store.store_commits([b['commit_record'] for b in branches if b.get('commit_record')])
     
-    last_synced_local = getattr(repo_doc, 'last_synced', None) if not is_new else None
-    since_utc = convert_to_github_datetime(last_synced_local)
+    # Upsert the repository row (without last_synced yet). An existing
+    # Repository is read and written field by field, so its branch and
+    # member rows are never loaded or rewritten as a whole
+    repo_values = {
+        'github_id': str(repo_info.get('id', '')),
+        'visibility': 'Private' if repo_info.get('private') else 'Public',
+        'default_branch': repo_info.get('default_branch', 'main'),
+    }
+    with sync_profile.phase('Write Repository'):
+        existing = frappe.db.exists('Repository', {'full_name': repo_full})
+        if existing:
+            repo_name = existing
+            stored = frappe.db.get_value(
+                'Repository', repo_name,
+                [*repo_values, 'last_synced', 'issues_synced_until', 'pulls_synced_until'], as_dict=True
+            )
+            changed_values = {k: v for k, v in repo_values.items() if stored.get(k) != v}
+            if changed_values:
+                frappe.db.set_value('Repository', repo_name, changed_values)
+        else:
+            repo_doc = frappe.get_doc(dict(
+                repo_values,
+                doctype='Repository',
+                full_name=repo_full,
+                repo_name=repo_full.split('/')[-1],
+                repo_owner=repo_full.split('/')[0],
+                url=f'https://github.com/{repo_full}',
+                is_synced=1,
+            ))
+            repo_doc.insert(ignore_permissions=True)
+            repo_name = repo_doc.name
+            stored = {}
     
-    params = {'state': 'all'}
-    if since_utc:
-        params['since'] = since_utc
+        # Branches and members: only new, changed and vanished rows are written
+        bulk_writer.reconcile_table(bulk_writer.BRANCH, repo_name, [
+            {
+                'repo_full_name': repo_full,
+                'branch_name': b.get('name'),
+                'commit_sha': b.get('commit', {}).get('sha') or '',
+                'protected': 1 if b.get('protected') else 0,
+                'last_updated': convert_github_datetime(b.get('commit_date')) if b.get('commit_date') else None,
+            }
+            for b in branches
+        ])
+        bulk_writer.reconcile_table(bulk_writer.MEMBER, repo_name, [_member_row(repo_full, m, m.get('email')) for m in members])
     
-    issues = github_request('GET', f'/repos/{repo_full}/issues', token, params=params) or []
-    pulls = github_request('GET', f'/repos/{repo_full}/pulls', token, params=params) or []
+    # Separate watermarks: /issues filters by ``since`` server side, while
+    # /pulls ignores it and is walked newest-updated first until older PRs
+    issues_since = convert_to_github_datetime(stored.get('issues_synced_until') or stored.get('last_synced'))
+    pulls_since = convert_to_github_datetime(stored.get('pulls_synced_until'))
     
-    if is_new:
-        repo_doc.insert(ignore_permissions=True)
-    else:
-        repo_doc.save(ignore_permissions=True)
+    # Oldest-updated first, so the issue watermark can advance page by page
+    params = {'state': 'all', 'per_page': 100, 'sort': 'updated', 'direction': 'asc'}
+    if issues_since:
+        params['since'] = issues_since
+    pull_params = {'state': 'all', 'per_page': 100, 'sort': 'updated', 'direction': 'desc'}
     
-    # Collect all GitHub logins for assignees/reviewers to batch query ERP users
-    all_github_logins = set()
-    for issue in issues:
-        if issue.get('pull_request'):
-            continue
-        for a in issue.get('assignees', []):
-            all_github_logins.add(a.get('login'))
-    for pr in pulls:
-        for r in pr.get('requested_reviewers', []):
-            all_github_logins.add(r.get('login'))
+    # Checkpointed pass: every page is committed with its progress (see
+    # sync_state.py), and an unfinished pass is resumed here
+    state = sync_state.begin(repo_name, issues_since, pulls_since)
+    budget = frappe.utils.flt(time_budget)
+    deadline = started + budget if budget > 0 else None
+    complete = True
     
+    # Issues and pull requests are streamed page by page so memory stays
+    # bounded by one page instead of the whole repository history
     gh_to_erp = {}
-    if all_github_logins:
-        users = frappe.get_all(
-            'User',
-            filters={'github_username': ['in', list(all_github_logins)]},
-            fields=['name', 'github_username']
-        )
-        gh_to_erp = {u['github_username']: u['name'] for u in users}
-    
-    # Clear and update branches
-    repo_doc.set('branches_table', [])
-    for b in branches:
-        branch_name = b.get('name')
-        commit_sha = b.get('commit', {}).get('sha')
-        
-        # Get the commit details for last updated date
-        commit_date = ''
-        if commit_sha:
-            commit = github_request('GET', f'/repos/{repo_full}/commits/{commit_sha}', token)
-            if isinstance(commit, dict):
-                commit_date_str = commit.get('commit', {}).get('author', {}).get('date', '')
-                commit_date = convert_github_datetime(commit_date_str) if commit_date_str else ''
-            else:
-                print(f"Unexpected commit response for {repo_full}, branch {branch_name}, SHA {commit_sha}: {commit}")
-                commit_date = ''
-                
-        repo_doc.append('branches_table', {
-            'repo_full_name': repo_full,
-            'branch_name': branch_name,
-            'commit_sha': commit_sha or '',
-            'protected': b.get('protected', False),
-            'last_updated': commit_date
-        })
-    
-    # Clear and update members
-    repo_doc.set('members_table', [])
-    for m in members:
-        user_info = github_request('GET', f"/users/{m.get('login')}", token)
-        m_email = user_info.get("email") or ""
-        repo_doc.append('members_table', {
-            'repo_full_name': repo_full,
-            'github_username': m.get('login'),
-            'github_id': str(m.get('id', '')),
-            'role': 'maintainer' if m.get('permissions', {}).get('admin') else 'member',
-            'email': m_email or ''
-        })
+    # Stored rows are indexed once per sync; unchanged records are skipped
+    with sync_profile.phase('Load Index'):
+        issue_index = bulk_writer.load_index(bulk_writer.ISSUE, repo_full)
+        pull_index = bulk_writer.load_index(bulk_writer.PULL_REQUEST, repo_full)
+    # Records are committed in batches, each with the checkpoint it completes
+    issue_writer = bulk_writer.ChunkedWriter(
+        lambda records: bulk_writer.upsert_issues(repo_full, records, gh_to_erp, index=issue_index),
+        title=f'GitHub Sync: {repo_full} issues',
+    )
+    pull_writer = bulk_writer.ChunkedWriter(
+        lambda records: bulk_writer.upsert_pull_requests(repo_full, records, gh_to_erp, index=pull_index),
+        title=f'GitHub Sync: {repo_full} pull requests',
+    )
     
-    repo_doc.save(ignore_permissions=True)
+    def save_issue_progress(until, count):
+        if until:
+            frappe.db.set_value('Repository', repo_name, 'issues_synced_until', convert_github_datetime(until))
+        sync_state.checkpoint(repo_name, issues_until=until, issues_count=count)
     
-    # Sync issues
-    for issue in issues:
-        if issue.get('pull_request'):
-            continue  # Skip pull requests (they're handled separately)
-        
-        # Check if issue exists
-        issue_filters = {'repository': repo_full, 'issue_number': issue.get('number')}
-        existing_issue = frappe.db.exists('Repository Issue', issue_filters)
-        
-        assignees_gh = issue.get('assignees', [])
-        labels_list = [lab.get('name') for lab in issue.get('labels', [])]
-        
-        if existing_issue:
-            # Update existing issue
-            local = frappe.get_doc('Repository Issue', issue_filters)
-            local.title = issue.get('title')
-            local.body = issue.get('body') or ''
-            local.state = issue.get('state')
-            local.labels = ','.join(labels_list)
-            local.url = issue.get('html_url')
-            local.github_id = str(issue.get('id', ''))
-            local.updated_at = convert_github_datetime(issue.get('updated_at'))
-            
-            # Update assignees
-            local.set('assignees_table', [])
-            for assignee in assignees_gh:
-                erp_user = gh_to_erp.get(assignee.get('login'), assignee.get('login'))
-                local.append('assignees_table', {
-                    'user': erp_user,
-                    'issue': local.name
-                })
-            
-            local.save(ignore_permissions=True)
-        else:
-            # Create new issue
-            issue_doc = frappe.get_doc({
-                'doctype': 'Repository Issue',
-                'repository': repo_full,
-                'issue_number': issue.get('number'),
-                'title': issue.get('title'),
-                'body': issue.get('body') or '',
-                'state': issue.get('state'),
-                'labels': ','.join(labels_list),
-                'url': issue.get('html_url'),
-                'github_id': str(issue.get('id', '')),
-                'created_at': convert_github_datetime(issue.get('created_at')),
-                'updated_at': convert_github_datetime(issue.get('updated_at'))
-            })
-            issue_doc.insert(ignore_permissions=True)
-            
-            # Add assignees after insert
-            for assignee in assignees_gh:
-                erp_user = gh_to_erp.get(assignee.get('login'), assignee.get('login'))
-                issue_doc.append('assignees_table', {
-                    'user': erp_user,
-                    'issue': issue_doc.name
-                })
-            issue_doc.save(ignore_permissions=True)
+    issue_count = state.issues_count or 0
+    issues_until = issues_since
+    if state.phase in ('Repository', 'Issues'):
+        sync_state.checkpoint(repo_name, phase='Issues')
+        issue_pages = _with_rest_fallback(
+            github_graphql.iter_issue_pages(repo_full, token, since=issues_since) if use_graphql else None,
+            lambda: iter_github_pages(f'/repos/{repo_full}/issues', token, params=params),
+            repo_full,
+        )
+        for page in sync_profile.iterate('Fetch Issues', issue_pages):
+            issue_count += len(page)
+            issues_until = max([issues_until or ''] + [i.get('updated_at') or '' for i in page]) or None
+            # PRs are handled separately
+            with sync_profile.phase('Write Issues'):
+                issue_writer.add(page, checkpoint=lambda until=issues_until, count=issue_count: save_issue_progress(until, count))
+            if deadline and time.monotonic() > deadline:
+                complete = False
+                break
+        with sync_profile.phase('Write Issues'):
+            issue_writer.flush()
     
-    # Sync pull requests
-    for pr in pulls:
-        # Check if PR exists
-        pr_filters = {'repository': repo_full, 'pr_number': pr.get('number')}
-        existing_pr = frappe.db.exists('Repository Pull Request', pr_filters)
-        
-        reviewers_gh = pr.get('requested_reviewers', [])
-        
-        if existing_pr:
-            # Update existing PR
-            local = frappe.get_doc('Repository Pull Request', pr_filters)
-            local.title = pr.get('title')
-            local.body = pr.get('body') or ''
-            local.state = pr.get('state')
-            local.head_branch = pr.get('head', {}).get('ref')
-            local.base_branch = pr.get('base', {}).get('ref')
-            local.author = pr.get('user', {}).get('login')
-            local.mergeable_state = pr.get('mergeable_state')
-            local.github_id = str(pr.get('id', ''))
-            local.url = pr.get('html_url')
-            local.updated_at = convert_github_datetime(pr.get('updated_at'))
-            
-            # Update reviewers
-            local.set('reviewers_table', [])
-            for reviewer in reviewers_gh:
-                gh_login = reviewer.get('login')
-                erp_user = gh_to_erp.get(gh_login, gh_login)
-                local.append('reviewers_table', {
-                    'user': erp_user,
-                    'pull_request': local.name
-                })
-            
-            local.save(ignore_permissions=True)
-        else:
-            # Create new PR
-            pr_doc = frappe.get_doc({
-                'doctype': 'Repository Pull Request',
-                'repository': repo_full,
-                'pr_number': pr.get('number'),
-                'title': pr.get('title'),
-                'body': pr.get('body') or '',
-                'state': pr.get('state'),
-                'head_branch': pr.get('head', {}).get('ref'),
-                'base_branch': pr.get('base', {}).get('ref'),
-                'author': pr.get('user', {}).get('login'),
-                'mergeable_state': pr.get('mergeable_state'),
-                'github_id': str(pr.get('id', '')),
-                'url': pr.get('html_url'),
-                'created_at': convert_github_datetime(pr.get('created_at')),
-                'updated_at': convert_github_datetime(pr.get('updated_at'))
-            })
-            pr_doc.insert(ignore_permissions=True)
-            
-            # Add reviewers after insert
-            for reviewer in reviewers_gh:
-                gh_login = reviewer.get('login')
-                erp_user = gh_to_erp.get(gh_login, gh_login)
-                pr_doc.append('reviewers_table', {
-                    'user': erp_user,
-                    'pull_request': pr_doc.name
-                })
-            pr_doc.save(ignore_permissions=True)
+    # A resumed pull request walk continues from its saved page with the
+    # watermark it started from
+    pull_count = state.pulls_count or 0
+    pulls_since = state.pulls_since
+    pulls_until = state.pulls_until
+    # A cursor only means something to the transport that saved it: a REST
+    # walk is finished over REST, a GraphQL one restarts from the first page
+    # when GraphQL is unavailable (rows already written are skipped unchanged)
+    transport, cursor = sync_state.decode_cursor(state.pulls_cursor)
+    if complete:
+        sync_state.checkpoint(repo_name, phase='Pull Requests')
+        def rest_pulls():
+            if transport == 'rest':
+                return iter_github_pages(cursor, token, parallel=False)
+            # Pages are fetched one at a time when we expect to stop early
+            return iter_github_pages(
+                f'/repos/{repo_full}/pulls', token, params=pull_params, parallel=not pulls_since
+            )
+
+        graphql_after = cursor if transport == 'graphql' else None
+        pull_pages = _with_rest_fallback(
+            github_graphql.iter_pull_request_pages(repo_full, token, after=graphql_after)
+            if use_graphql and transport != 'rest' else None,
+            rest_pulls,
+            repo_full,
+        )
+        for page in sync_profile.iterate('Fetch Pull Requests', pull_pages):
+            changed = [pr for pr in page if not pulls_since or (pr.get('updated_at') or '') >= pulls_since]
+            pull_count += len(changed)
+            pulls_until = max([pulls_until or ''] + [pr.get('updated_at') or '' for pr in changed]) or None
+            # Sorted by update time: after a page with older PRs everything is already synced
+            finished = len(changed) < len(page) or not getattr(page, 'next_url', None)
+            next_cursor = None if finished else sync_state.encode_cursor(page.transport, page.next_url)
+            with sync_profile.phase('Write Pull Requests'):
+                pull_writer.add(changed, checkpoint=lambda progress=dict(
+                    pulls_until=pulls_until, pulls_count=pull_count, pulls_cursor=next_cursor,
+                ): sync_state.checkpoint(repo_name, **progress))
+            if finished:
+                break
+            if deadline and time.monotonic() > deadline:
+                complete = False
+                break
+        with sync_profile.phase('Write Pull Requests'):
+            pull_writer.flush()
     
-    # Update last_synced at the end
-    repo_doc.last_synced = frappe.utils.now()
-    repo_doc.save(ignore_permissions=True)
+    # Records that failed to write are fetched again by the next sync
+    issues_until = _before_failures(issues_until, issue_writer.failed_since)
+    pulls_until = _before_failures(pulls_until, pull_writer.failed_since)
+    if complete:
+        # Update last_synced and the watermarks at the end
+        synced = {'last_synced': frappe.utils.now()}
+        if issues_until:
+            synced['issues_synced_until'] = convert_github_datetime(issues_until)
+        if pulls_until:
+            synced['pulls_synced_until'] = convert_github_datetime(pulls_until)
+        frappe.db.set_value('Repository', repo_name, synced)
+        sync_state.complete(repo_name)
+    else:
+        sync_state.pause(repo_name)
     
     return {
         'success': True,
         'message': f'Synced repository {repo_full}',
         'branches': len(branches), 
-        'issues': len(issues), 
-        'pulls': len(pulls), 
-        'members': len(members)
+        'issues': issue_count, 
+        'pulls': pull_count, 
+        'members': len(members),
+        'skipped': issue_writer.counts['unchanged'] + pull_writer.counts['unchanged'],
+        'written': {k: issue_writer.counts[k] + pull_writer.counts[k] for k in issue_writer.counts},
+        'errors': issue_writer.stats['errors'] + pull_writer.stats['errors'],
+        'chunks': {'issues': issue_writer.stats, 'pulls': pull_writer.stats},
+        'complete': complete
+    }
+
+def _before_failures(until, failed_since):
+    """Watermark ``until`` held back to the oldest record that failed to
+    write (``since`` is inclusive, so that record is fetched again)"""
+    if failed_since and (not until or failed_since < until):
+        return failed_since
+    return until
+
+def _member_row(repo_full, member, email):
+    return {
+        'repo_full_name': repo_full,
+        'github_username': member.get('login'),
+        'github_id': str(member.get('id', '')),
+        'role': 'maintainer' if member.get('permissions', {}).get('admin') else 'member',
+        'email': email or ''
     }
 
+def _fetch_repository_rest(repo_full, token):
+    """REST version of ``github_graphql.fetch_repository``: one extra call per
+    branch head not in the commit store, for its date, and per collaborator
+    not in the profile cache, for their email"""
+    repo_info = github_request('GET', f'/repos/{repo_full}', token) or {}
+    branches = github_request('GET', f'/repos/{repo_full}/branches', token) or []
+    members = github_request('GET', f'/repos/{repo_full}/collaborators', token) or []
+    
+    with sync_profile.phase('Commit Lookups'):
+        commit_dates = commit_store.get_commit_dates(
+            repo_full, [b.get('commit', {}).get('sha') for b in branches], token
+        )
+    for b in branches:
+        b['commit_date'] = commit_dates.get(b.get('commit', {}).get('sha')) or ''
+    
+    with sync_profile.phase('Member Profiles'):
+        profiles = github_cache.get_user_profiles([m.get('login') for m in members], token)
+    for m in members:
+        m['email'] = (profiles.get(m.get('login')) or {}).get("email") or ""
+    
+    return repo_info, branches, members
+
+def _with_rest_fallback(graphql_pages, rest_pages, repo_full):
+    """Yield ``graphql_pages``, switching to ``rest_pages()`` if the first GraphQL page fails.
+
+    Errors after a page has been handed out are raised as usual, so nothing is synced twice.
+    """
+    if graphql_pages is not None:
+        try:
+            first = next(graphql_pages, None)
+        except Exception:
+            frappe.log_error(frappe.get_traceback(), f'GitHub GraphQL Fallback: {repo_full}')
+        else:
+            if first is not None:
+                yield first
+                yield from graphql_pages
+            return
+    yield from rest_pages()
+
 @frappe.whitelist()
 def create_issue(repository, title, body=None, assignees=None, labels=None):
-    settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    token = get_github_token(repository)
     if not token:
         frappe.throw(_('GitHub Personal Access Token not configured in GitHub Settings'))
     
@@ -708,8 +805,7 @@ def create_issue(repository, title, body=None, assignees=None, labels=None):
 @frappe.whitelist()
 def bulk_create_issues(repository, issues):
     """Bulk create multiple issues in a repository"""
-    settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    token = get_github_token(repository)
     if not token:
         frappe.throw(_('GitHub Personal Access Token not configured in GitHub Settings'))
     
@@ -743,8 +839,7 @@ def bulk_create_issues(repository, issues):
 
 @frappe.whitelist()
 def create_pull_request(repository, title, head, base, body=None):
-    settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    token = get_github_token(repository)
     if not token:
         frappe.throw(_('GitHub Personal Access Token not configured in GitHub Settings'))
     
@@ -785,8 +880,7 @@ def create_pull_request(repository, title, head, base, body=None):
 def sync_repo_members(repo_full_name):
     if not _can_sync_repo(repo_full_name):
         frappe.throw(_('You do not have permission to sync this repository.'))
-    settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    token = get_github_token(repo_full_name)
     if not token:
         frappe.throw(_('GitHub Personal Access Token not configured in GitHub Settings'))
 
@@ -795,22 +889,17 @@ def sync_repo_members(repo_full_name):
     except Exception as e:
         frappe.throw(str(e))
 
-    # Update repository members table
+    # One (cached) profile lookup per member, shared by the repository and every linked project
+    profiles = github_cache.get_user_profiles([m.get('login') for m in members or []], token)
+
+    # Update repository members table: only new, changed and removed members are written
     try:
-        repo_doc = frappe.get_doc('Repository', {'full_name': repo_full_name})
-        repo_doc.set('members_table', [])
-        for m in members or []:
-            user_info = github_request('GET', f"/users/{m.get('login')}", token)
-            m_email = user_info.get("email") or ""
-            repo_doc.append('members_table', {
-                'repo_full_name': repo_full_name,
-                'github_username': m.get('login'),
-                'github_id': str(m.get('id', '')),
-                'role': 'maintainer' if m.get('permissions', {}).get('admin') else 'member',
-                'email': m_email or ''
-            })
-        
-        repo_doc.save(ignore_permissions=True)
+        repo_name = frappe.db.get_value('Repository', {'full_name': repo_full_name}, 'name')
+        if repo_name:
+            bulk_writer.reconcile_table(bulk_writer.MEMBER, repo_name, [
+                _member_row(repo_full_name, m, (profiles.get(m.get('login')) or {}).get("email"))
+                for m in members or []
+            ])
     except Exception:
         pass
 
@@ -822,8 +911,7 @@ def sync_repo_members(repo_full_name):
             proj.set('project_users', [])
             
             for m in members or []:
-                user_info = github_request('GET', f"/users/{m.get('login')}", token)
-                m_email = user_info.get("email") or ""
+                m_email = (profiles.get(m.get('login')) or {}).get("email") or ""
                 username = m.get('login')
                 erp_user = None
                 
@@ -857,8 +945,7 @@ def sync_repo_members(repo_full_name):
 @frappe.whitelist()
 def manage_repo_access(repo_full_name, action, identifier, permission='push'):
     _require_github_admin()
-    settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    token = get_github_token(repo_full_name)
     if not token:
         frappe.throw(_('GitHub Personal Access Token not configured in GitHub Settings'))
 
@@ -888,69 +975,22 @@ def manage_repo_access(repo_full_name, action, identifier, permission='push'):
         frappe.throw(_('manage_repo_access failed: {0}').format(str(e)))
 
 def background_sync_all_repositories():
-    """Background job for syncing all repositories with progress updates"""
+    """Background job: fan the sync of every repository out as one job per repository.
+
+    At most ``GitHub Settings.sync_concurrency`` repositories sync at once;
+    aggregated progress is published on ``github_sync_progress`` (see
+    sync_queue.py).
+    """
     _require_github_admin()
-    repos = frappe.get_all('Repository', fields=['full_name'])
-    total = len(repos)
-    progress = 0
-    results = {'success': 0, 'failed': 0}
-    start_time = time.time()
-    
-    for r in repos:
-        repo_name = r.get('full_name')
-        frappe.publish_realtime(
-            event='github_sync_progress',
-            message={
-                'progress': progress,
-                'total': total,
-                'repo': repo_name,
-                'phase': 'syncing',
-                'time_s': round(time.time() - start_time, 1)
-            }
-        )
-        
-        try:
-            sync_repo(repo_name)
-            results['success'] += 1
-            status = 'success'
-        except Exception as e:
-            results['failed'] += 1
-            status = 'failed'
-            frappe.log_error(message=str(e), title=f'GitHub Sync Error - {repo_name}')
-        
-        progress += 1
-        frappe.publish_realtime(
-            event='github_sync_progress',
-            message={
-                'progress': progress,
-                'total': total,
-                'repo': repo_name,
-                'status': status,
-                'success': results['success'],
-                'failed': results['failed'],
-                'time_s': round(time.time() - start_time, 1)
-            }
-        )
-    
-    settings = frappe.get_single("GitHub Settings")
-    settings.last_sync = frappe.utils.now()
-    settings.save(ignore_permissions=True)
-    
-    frappe.publish_realtime(
-        event='github_sync_progress',
-        message={
-            'progress': total,
-            'total': total,
-            'msg': 'completed',
-            'success': results['success'],
-            'failed': results['failed'],
-            'time_s': round(time.time() - start_time, 1)
-        }
-    )
+    return sync_queue.start_run()
 
 @frappe.whitelist()
 def start_sync_all_repositories():
     """Start background sync of all repositories"""
+    _require_github_admin()
+    status = sync_queue.get_run_status()
+    if status:
+        return dict(status, status='running')
     frappe.enqueue('erpnext_github_integration.github_api.background_sync_all_repositories')
     return {'status': 'queued'}
 
@@ -958,8 +998,7 @@ def start_sync_all_repositories():
 def get_repository_activity(repository, days=30):
     """Get recent activity for a repository"""
     try:
-        settings = frappe.get_single('GitHub Settings')
-        token = settings.get_password('personal_access_token')
+        token = get_github_token(repository)
         
         # Validate and convert days
         try:
@@ -1019,7 +1058,7 @@ def create_repository_webhook(repo_full_name, webhook_url=None, events=None):
     """Create a webhook for the repository"""
     _require_github_admin()
     settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    token = get_github_token(repo_full_name)
     if not token:
         frappe.throw(_('GitHub Personal Access Token not configured in GitHub Settings'))
     
@@ -1051,8 +1090,7 @@ def create_repository_webhook(repo_full_name, webhook_url=None, events=None):
 @frappe.whitelist()
 def list_repository_webhooks(repo_full_name):
     """List all webhooks for a repository"""
-    settings = frappe.get_single('GitHub Settings')
-    token = settings.get_password('personal_access_token')
+    token = get_github_token(repo_full_name)
     if not token:
         frappe.throw(_('GitHub Personal Access Token not configured in GitHub Settings'))
     
@@ -0,0 +1,265 @@
+import hashlib, json, time
+import frappe
+from .utils import get_conf
+
+# Conditional request (ETag / Last-Modified) cache for GitHub GETs.
+# 304 responses don't count against the rate limit, so every page we can
+# revalidate instead of re-download saves budget as well as transfer time.
+# Bodies share Redis with the rest of the site, so their total size is
+# capped: a sorted set of entries by last use plus their sizes lets the
+# least recently used ones be evicted once ``github_etag_cache_total_bytes``
+# is exceeded.
+#
+# Below it, a read-through cache of GitHub user profiles (/users/{login})
+# shared by every sync path.
+
+ETAG_CACHE_PREFIX = "github_etag"
+ETAG_STATS_PREFIX = "github_etag_stats"
+ETAG_STATS_FIELDS = ('requests', 'conditional', 'hits', 'stored', 'evictions')
+DEFAULT_ETAG_TTL = 7 * 24 * 3600
+DEFAULT_ETAG_MAX_BYTES = 2 * 1024 * 1024
+DEFAULT_ETAG_TOTAL_BYTES = 64 * 1024 * 1024
+
+# KEYS: LRU set, sizes hash, total counter. ARGV: entry key, size, now, cap.
+# Records the entry, then drops the least recently used ones (entry, size
+# and value) until the total fits; returns how many were dropped.
+_ACCOUNT = """
+local old = tonumber(redis.call('hget', KEYS[2], ARGV[1]) or 0)
+redis.call('hset', KEYS[2], ARGV[1], ARGV[2])
+redis.call('zadd', KEYS[1], ARGV[3], ARGV[1])
+local total = redis.call('incrby', KEYS[3], tonumber(ARGV[2]) - old)
+local evicted = 0
+while total > tonumber(ARGV[4]) do
+    local oldest = redis.call('zrange', KEYS[1], 0, 0)
+    if #oldest == 0 then break end
+    local size = tonumber(redis.call('hget', KEYS[2], oldest[1]) or 0)
+    redis.call('zrem', KEYS[1], oldest[1])
+    redis.call('hdel', KEYS[2], oldest[1])
+    redis.call('del', oldest[1])
+    total = redis.call('decrby', KEYS[3], size)
+    evicted = evicted + 1
+end
+return evicted
+"""
+
+USER_CACHE_PREFIX = "github_user_profile"
+USER_STATS_PREFIX = "github_user_profile_stats"
+USER_STATS_FIELDS = ('hits', 'misses', 'evictions')
+DEFAULT_USER_TTL = 24 * 3600
+DEFAULT_USER_MAX_ENTRIES = 5000
+
+def _etag_key(url, params, auth):
+    # The Authorization header is part of the key: two credentials can see
+    # different payloads for the same URL (private repos, emails, ...).
+    raw = json.dumps([url, sorted((params or {}).items()), auth or ''], default=str)
+    return f"{ETAG_CACHE_PREFIX}|{hashlib.sha1(raw.encode()).hexdigest()}"
+
+def _etag_index_keys():
+    cache = frappe.cache()
+    return [cache.make_key(f"{ETAG_CACHE_PREFIX}_{part}") for part in ('lru', 'sizes', 'bytes')]
+
+def _incr_stat(field, amount=1, prefix=ETAG_STATS_PREFIX):
+    # Plain INCR counters: RedisWrapper pickles hash values, which would break
+    # atomic increments.
+    try:
+        cache = frappe.cache()
+        cache.incrby(cache.make_key(f"{prefix}|{field}"), amount)
+    except Exception:
+        pass
+
+def _read_stats(prefix, fields):
+    cache = frappe.cache()
+    values = cache.mget([cache.make_key(f"{prefix}|{f}") for f in fields])
+    return {field: int(value or 0) for field, value in zip(fields, values, strict=True)}
+
+def get_conditional(url, params, auth):
+    """Return the cached ``{etag, last_modified, body, link}`` entry for a GET, if any"""
+    if not get_conf('github_etag_cache_enabled', 1):
+        return None
+    try:
+        cache = frappe.cache()
+        key = _etag_key(url, params, auth)
+        entry = cache.get_value(key)
+        if entry:
+            cache.execute_command('ZADD', _etag_index_keys()[0], 'XX', time.time(), cache.make_key(key))
+        return entry
+    except Exception:
+        return None
+
+def store_conditional(url, params, auth, resp, body):
+    """Remember the validators and decoded body of a 200 response"""
+    etag = resp.headers.get('ETag')
+    last_modified = resp.headers.get('Last-Modified')
+    if not (etag or last_modified) or not get_conf('github_etag_cache_enabled', 1):
+        return
+    size = len(resp.content or b'')
+    if size > int(get_conf('github_etag_cache_max_bytes', DEFAULT_ETAG_MAX_BYTES)):
+        return
+    try:
+        cache = frappe.cache()
+        key = _etag_key(url, params, auth)
+        cache.set_value(
+            key,
+            {
+                'etag': etag,
+                'last_modified': last_modified,
+                'body': body,
+                'link': resp.headers.get('Link'),
+            },
+            expires_in_sec=int(get_conf('github_etag_cache_ttl', DEFAULT_ETAG_TTL)),
+        )
+        _incr_stat('stored')
+        total_bytes = int(get_conf('github_etag_cache_total_bytes', DEFAULT_ETAG_TOTAL_BYTES))
+        evicted = cache.execute_command(
+            'EVAL', _ACCOUNT, 3, *_etag_index_keys(), cache.make_key(key), size, time.time(), total_bytes
+        )
+        if evicted:
+            _incr_stat('evictions', int(evicted))
+    except Exception:
+        pass
+
+def record_request(conditional):
+    _incr_stat('requests')
+    if conditional:
+        _incr_stat('conditional')
+
+def record_hit():
+    _incr_stat('hits')
+
+def get_etag_stats():
+    """Return counters and hit ratio of the conditional request cache"""
+    stats = _read_stats(ETAG_STATS_PREFIX, ETAG_STATS_FIELDS)
+    stats['hit_ratio'] = round(stats['hits'] / stats['requests'], 4) if stats['requests'] else 0.0
+    stats['revalidation_ratio'] = (
+        round(stats['hits'] / stats['conditional'], 4) if stats['conditional'] else 0.0
+    )
+    try:
+        lru, _sizes, total = _etag_index_keys()
+        stats['entries'] = int(frappe.cache().execute_command('ZCARD', lru) or 0)
+        stats['bytes'] = int(frappe.cache().execute_command('GET', total) or 0)
+    except Exception:
+        stats['entries'] = stats['bytes'] = 0
+    return stats
+
+def reset_etag_stats():
+    cache = frappe.cache()
+    cache.delete(*[cache.make_key(f"{ETAG_STATS_PREFIX}|{f}") for f in ETAG_STATS_FIELDS])
+
+# User profiles: one key per login (expiring after the TTL) plus a sorted set
+# of logins by last access, trimmed to the newest N entries (LRU eviction).
+
+PROFILE_FIELDS = (
+    'login', 'id', 'node_id', 'type', 'name', 'email', 'company', 'blog',
+    'location', 'bio', 'avatar_url', 'html_url',
+)
+
+def _user_key(login):
+    # GitHub logins are case-insensitive
+    return f"{USER_CACHE_PREFIX}|{(login or '').lower()}"
+
+def _user_index_key():
+    return frappe.cache().make_key(f"{USER_CACHE_PREFIX}_lru")
+
+def _touch_users(logins):
+    try:
+        now = time.time()
+        args = [item for login in logins for item in (now, (login or '').lower())]
+        if args:
+            frappe.cache().execute_command('ZADD', _user_index_key(), *args)
+    except Exception:
+        pass
+
+def _evict_users():
+    max_entries = int(get_conf('github_user_cache_max_entries', DEFAULT_USER_MAX_ENTRIES))
+    try:
+        cache = frappe.cache()
+        index = _user_index_key()
+        excess = int(cache.execute_command('ZCARD', index) or 0) - max_entries
+        if excess <= 0:
+            return
+        stale = cache.execute_command('ZRANGE', index, 0, excess - 1) or []
+        stale = [login.decode() if isinstance(login, bytes) else login for login in stale]
+        if stale:
+            cache.execute_command('ZREM', index, *stale)
+            cache.delete(*[cache.make_key(_user_key(login)) for login in stale])
+            _incr_stat('evictions', len(stale), prefix=USER_STATS_PREFIX)
+    except Exception:
+        pass
+
+def _store_user_profile(login, profile):
+    try:
+        frappe.cache().set_value(
+            _user_key(login),
+            {field: profile.get(field) for field in PROFILE_FIELDS},
+            expires_in_sec=int(get_conf('github_user_cache_ttl', DEFAULT_USER_TTL)),
+        )
+    except Exception:
+        return
+    _touch_users([login])
+    _evict_users()
+
+def get_user_profiles(logins, token):
+    """Return ``{login: profile}`` for ``logins``, fetching only the ones not cached.
+
+    Profiles hold the public fields of ``/users/{login}`` (id, name, email,
+    ...). Logins GitHub can't resolve are left out.
+    """
+    from .github_client import github_request
+    from .rate_limit import GitHubRateLimitError
+
+    logins = list(dict.fromkeys(login for login in logins if login))
+    profiles, missing = {}, []
+    for login in logins:
+        try:
+            profile = frappe.cache().get_value(_user_key(login))
+        except Exception:
+            profile = None
+        if profile:
+            profiles[login] = profile
+        else:
+            missing.append(login)
+
+    if profiles:
+        _touch_users(list(profiles))
+        _incr_stat('hits', len(profiles), prefix=USER_STATS_PREFIX)
+    if missing:
+        _incr_stat('misses', len(missing), prefix=USER_STATS_PREFIX)
+
+    for login in missing:
+        try:
+            profile = github_request('GET', f'/users/{login}', token)
+        except GitHubRateLimitError:
+            raise
+        except Exception:
+            continue
+        if isinstance(profile, dict) and profile.get('login'):
+            _store_user_profile(login, profile)
+            profiles[login] = {field: profile.get(field) for field in PROFILE_FIELDS}
+    return profiles
+
+def get_user_profile(login, token):
+    """Cached profile of one GitHub user, or None"""
+    return get_user_profiles([login], token).get(login)
+
+def invalidate_user_profile(login):
+    try:
+        cache = frappe.cache()
+        cache.delete_value(_user_key(login))
+        cache.execute_command('ZREM', _user_index_key(), (login or '').lower())
+    except Exception:
+        pass
+
+def get_user_profile_stats():
+    """Return counters, size and hit ratio of the user profile cache"""
+    stats = _read_stats(USER_STATS_PREFIX, USER_STATS_FIELDS)
+    try:
+        stats['entries'] = int(frappe.cache().execute_command('ZCARD', _user_index_key()) or 0)
+    except Exception:
+        stats['entries'] = 0
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+    return stats
+
+def reset_user_profile_stats():
+    cache = frappe.cache()
+    cache.delete(*[cache.make_key(f"{USER_STATS_PREFIX}|{f}") for f in USER_STATS_FIELDS])
@@ -1,10 +1,99 @@
+import os, threading
 import requests, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 import frappe
 from frappe import _
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from . import github_cache, github_metrics, rate_limit, retry_policy, token_pool
+from .rate_limit import GitHubRateLimitError
 
 
 GITHUB_API = "https://api.github.com"
 
+# Transport defaults, overridable from site_config.json
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TRANSPORT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+
+# Parallel pagination: at most this many pages in flight per list, and one
+# worker per PAGINATION_RATE_RESERVE requests left in the rate limit window
+DEFAULT_PAGINATION_WORKERS = 4
+PAGINATION_RATE_RESERVE = 100
+
+# A page refused with a used up rate limit is tried again at most this many
+# times, each after the window resets (plus a margin for clock skew)
+RATE_LIMIT_RETRIES = 3
+RATE_LIMIT_RESET_MARGIN = 5
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+def get_api_base():
+    """GitHub API root: ``github_api_url`` in site config (GitHub Enterprise,
+    the benchmark stand-in server) or api.github.com"""
+    conf = getattr(frappe.local, 'conf', None) or {}
+    return (conf.get('github_api_url') or GITHUB_API).rstrip('/')
+
+def _get_transport_config():
+    conf = getattr(frappe.local, 'conf', None) or {}
+    return {
+        'pool_size': int(conf.get('github_http_pool_size') or DEFAULT_POOL_SIZE),
+        'retries': int(conf.get('github_http_max_retries') or DEFAULT_TRANSPORT_RETRIES),
+        'backoff_factor': float(conf.get('github_http_backoff_factor') or DEFAULT_BACKOFF_FACTOR),
+    }
+
+def _build_session():
+    config = _get_transport_config()
+    # Transport-level retries only cover failures to connect, where nothing
+    # reached GitHub. Timeouts, 5xx and secondary rate limits are retried by
+    # _send (retry_policy.py) so they are counted and feed the circuit breaker.
+    retry = Retry(
+        total=config['retries'],
+        connect=config['retries'],
+        read=0,
+        status=0,
+        other=0,
+        backoff_factor=config['backoff_factor'],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config['pool_size'],
+        pool_maxsize=config['pool_size'],
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def get_session():
+    """Return the keep-alive session shared by every GitHub call in this process.
+
+    The session is created lazily and rebuilt after a fork, so connection pools
+    are never shared between a worker and its children.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+def reset_session():
+    """Drop the pooled session, e.g. after changing transport settings"""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _session_pid = None
+
 def _get_headers(token):
     return {
         "Authorization": f"token {token}",
@@ -12,74 +101,429 @@ def _get_headers(token):
         "User-Agent": "erpnext-github-integration"
     }
 
+def _token_from_auth(auth):
+    auth = auth or ''
+    return auth[len('token '):] if auth.startswith('token ') else auth
+
+class _Budget:
+    """Rate limit policy of one logical call: which credential draws on the
+    shared budget, and whether to wait for it (at most ``max_wait`` seconds)
+    or fail fast with ``GitHubRateLimitError``.
+
+    When it owns the request ``headers`` it may rotate to another pooled
+    credential of ``organization`` once its own runs into the reserve;
+    ``/user`` calls never rotate, their answer depends on the credential.
+    """
+
+    __slots__ = ('block', 'headers', 'max_wait', 'organization', 'token')
+
+    def __init__(self, token, block=True, max_wait=None, organization=None, headers=None):
+        self.token = token
+        self.block = block
+        self.max_wait = max_wait
+        self.organization = organization
+        self.headers = headers
+
+    @classmethod
+    def from_headers(cls, headers):
+        return cls(_token_from_auth(headers.get('Authorization')))
+
+    def acquire(self, url):
+        resource = rate_limit.resource_for_path(urlsplit(url).path)
+        if self.headers is not None and not token_pool.is_user_scoped(url):
+            try:
+                rate_limit.acquire(self.token, resource, block=False)
+                return
+            except GitHubRateLimitError:
+                alternative = token_pool.alternative_token(self.token, self.organization, resource)
+                if alternative:
+                    self.token = alternative
+                    self.headers['Authorization'] = f"token {alternative}"
+        rate_limit.acquire(self.token, resource, block=self.block, max_wait=self.max_wait)
+
+    def record(self, resp):
+        # Attribute the headers to the credential that actually made the call
+        request = getattr(resp, 'request', None)
+        token = _token_from_auth(request.headers.get('Authorization')) if request is not None else None
+        return rate_limit.record(token or self.token, resp)
+
 def _handle_rate_limit(resp):
+    """True when a response says the rate limit window is used up.
+
+    Waiting for the reset is left to the next ``_Budget.acquire``, which honours
+    the caller's choice between blocking and failing fast.
+    """
     remaining = resp.headers.get('X-RateLimit-Remaining')
-    reset = resp.headers.get('X-RateLimit-Reset')
-    if remaining is not None:
+    try:
+        return remaining is not None and int(remaining) <= 0
+    except (TypeError, ValueError):
+        return False
+
+def _wait_for_reset(resp, budget):
+    """Sleep until the rate limit window of ``resp`` resets.
+
+    Raises ``GitHubRateLimitError`` when that is further away than the
+    caller is willing to wait.
+    """
+    try:
+        reset = int(resp.headers.get('X-RateLimit-Reset'))
+    except (TypeError, ValueError):
+        reset = 0
+    wait = max(0, reset - time.time()) + RATE_LIMIT_RESET_MARGIN
+    if wait > _wait_limit(budget):
+        raise GitHubRateLimitError(
+            _("GitHub API rate limit exceeded, retry in {0} seconds").format(int(wait)),
+            retry_after=int(wait),
+        )
+    time.sleep(wait)
+
+def _parse_link_header(link):
+    """Map each ``rel`` of an RFC 5988 Link header to its URL"""
+    links = {}
+    if not link:
+        return links
+    for part in link.split(','):
+        if '<' not in part or 'rel=' not in part:
+            continue
+        url = part[part.find('<')+1:part.find('>')]
+        rel = part[part.find('rel=')+4:].strip().strip('"')
+        links[rel] = url
+    return links
+
+def _prepare_conditional(url, headers, params=None):
+    """Return the headers to send for a GET and the cache entry they revalidate"""
+    cached = github_cache.get_conditional(url, params, headers.get('Authorization'))
+    request_headers = headers
+    if cached:
+        request_headers = dict(headers)
+        if cached.get('etag'):
+            request_headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            request_headers['If-Modified-Since'] = cached['last_modified']
+    github_cache.record_request(bool(cached))
+    return request_headers, cached
+
+def _resolve_conditional(url, params, headers, cached, resp):
+    """Decode a GET response into ``(data, link)``, answering a 304 from the cache"""
+    if resp.status_code == 304 and cached:
+        github_cache.record_hit()
+        return cached.get('body'), cached.get('link')
+
+    data = None
+    if resp.status_code == 200:
         try:
-            remaining = int(remaining)
-            if remaining <= 0 and reset:
-                reset = int(reset)
-                wait = max(0, reset - int(time.time()) + 2)
-                time.sleep(wait)
-                return True
-        except Exception:
-            pass
-    return False
-
-def _get_with_pagination(url, headers, params=None, retry=2):
-    results = []
-    while url:
-        resp = requests.get(url, headers=headers, params=params, timeout=30)
-        if resp.status_code == 200:
             data = resp.json()
-            if isinstance(data, list):
-                results.extend(data)
-            else:
-                results.append(data)
-            if _handle_rate_limit(resp):
+        except ValueError:
+            data = resp.text
+        github_cache.store_conditional(url, params, headers.get('Authorization'), resp, data)
+    return data, resp.headers.get('Link')
+
+def _wait_limit(budget):
+    if not budget.block:
+        return 0
+    return rate_limit.default_max_wait() if budget.max_wait is None else budget.max_wait
+
+def _send(method, url, headers, budget, params=None, data=None):
+    """Send one logical request, retrying transient failures.
+
+    Timeouts, 5xx and secondary rate limits are retried up to
+    ``retry_policy.max_attempts()`` with jittered exponential backoff, or after
+    ``Retry-After``, as long as the wait fits the caller's ``max_wait``.
+    GETs are made conditional against the ETag cache. Returns ``(resp, cached)``
+    with the last response; a network error on the last attempt is raised.
+    """
+    endpoint = retry_policy.endpoint_template(url)
+    attempts = retry_policy.max_attempts()
+    for attempt in range(attempts):
+        failures = retry_policy.check_circuit(endpoint)
+        # Acquire first: it may rotate the credential in ``headers``
+        budget.acquire(url)
+        cached = None
+        request_headers = headers
+        if method == 'GET':
+            request_headers, cached = _prepare_conditional(url, headers, params)
+        started = time.monotonic()
+        try:
+            resp = get_session().request(
+                method, url, headers=request_headers, params=params, json=data, timeout=30
+            )
+            error = None
+        except requests.exceptions.RequestException as e:
+            resp, error = None, e
+        github_metrics.record_request(method, url, resp, error, time.monotonic() - started)
+        if resp is not None:
+            budget.record(resp)
+
+        if retry_policy.is_failure(resp, error):
+            retry_policy.record_failure(endpoint)
+        elif resp is not None:
+            retry_policy.record_success(endpoint, failures)
+
+        retryable = retry_policy.is_retryable(resp, error, method, url)
+        if retryable and attempt < attempts - 1:
+            delay = retry_policy.retry_delay(attempt, resp)
+            if delay <= _wait_limit(budget):
+                retry_policy.record_attempt(resp, error)
+                time.sleep(delay)
                 continue
-            link = resp.headers.get('Link')
-            next_url = None
-            if link:
-                parts = link.split(',')
-                for p in parts:
-                    if 'rel="next"' in p:
-                        next_url = p[p.find('<')+1:p.find('>')]
-                        break
-            url = next_url
-            params = None
-        elif resp.status_code == 403:
-            if 'rate limit' in (resp.text or "").lower():
-                if _handle_rate_limit(resp):
-                    continue
-            frappe.throw(resp.raise_for_status())
-        else:
-            frappe.throw(resp.raise_for_status())
-    return results
+        if error is not None:
+            raise error
+        return resp, cached
+
+def _cached_get(url, headers, params=None, budget=None):
+    """GET ``url``, revalidating against the ETag cache when we have a copy.
+
+    Returns ``(resp, data, link)``. A 304 is answered from the cache, so callers
+    see the same decoded body (and pagination links) as on a 200.
+    """
+    budget = budget or _Budget.from_headers(headers)
+    resp, cached = _send('GET', url, headers, budget, params=params)
+    data, link = _resolve_conditional(url, params, headers, cached, resp)
+    return resp, data, link
 
-def github_request(method, path, token, params=None, data=None, retry=2):
-    url = f"{GITHUB_API}{path}" if path.startswith('/') else path
+def _get_page(url, headers, params=None, budget=None):
+    """Fetch a single page; a used up rate limit is waited out until its reset"""
+    budget = budget or _Budget.from_headers(headers)
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        resp, data, link = _cached_get(url, headers, params=params, budget=budget)
+        if resp.status_code in (200, 304):
+            return resp, data, link
+        if resp.status_code == 403 and 'rate limit' in (resp.text or "").lower() and _handle_rate_limit(resp):
+            if attempt < RATE_LIMIT_RETRIES:
+                _wait_for_reset(resp, budget)
+                continue
+            frappe.throw(_("GitHub API rate limit exceeded"), exc=GitHubRateLimitError)
+        _throw_for_status(resp, url)
+
+def _throw_for_status(resp, url):
+    """Raise a readable error for a response the caller cannot use"""
+    try:
+        resp.raise_for_status()
+    except requests.exceptions.HTTPError as e:
+        # Transient errors were already retried by _send
+        frappe.logger().error(f"GitHub API Error: {str(e)}")
+        frappe.throw(_("GitHub API Error: {0}").format(str(e)))
+    # Not an HTTP error (1xx, unfollowed 3xx): still not a usable page
+    frappe.throw(_("GitHub API Error: unexpected status {0} for {1}").format(resp.status_code, url))
+
+class GitHubPage(list):
+    """Items of one page of a list endpoint.
+
+    ``url`` is the address the page was fetched from and ``next_url`` the one
+    that continues after it (``None`` on the last page); for ``transport``
+    ``graphql`` both are cursors.
+    """
+    def __init__(self, items, url=None, next_url=None, transport='rest'):
+        super().__init__(items)
+        self.url = url
+        self.next_url = next_url
+        self.transport = transport
+
+def _page_items(data):
+    # Non-list payloads (e.g. search results) are kept whole, as one item
+    if data is None:
+        return []
+    return data if isinstance(data, list) else [data]
+
+def _remaining_page_urls(links):
+    """Build the URLs of every page after the current one from rel="next"/"last".
+
+    Only offset (``page=N``) pagination can be addressed this way; cursor based
+    endpoints (``after=``/``before=``) return an empty list and are walked serially.
+    """
+    next_url, last_url = links.get('next'), links.get('last')
+    if not next_url or not last_url:
+        return []
+    next_parts = urlsplit(next_url)
+    next_query = parse_qsl(next_parts.query, keep_blank_values=True)
+    next_page = dict(next_query).get('page')
+    last_page = dict(parse_qsl(urlsplit(last_url).query)).get('page')
+    if not (next_page and last_page and next_page.isdigit() and last_page.isdigit()):
+        return []
+
+    urls = []
+    for page in range(int(next_page), int(last_page) + 1):
+        query = [(k, str(page) if k == 'page' else v) for k, v in next_query]
+        urls.append(urlunsplit(next_parts._replace(query=urlencode(query))))
+    return urls
+
+def _page_workers(resp, pages_left):
+    """Size the page fetch pool from the configured cap and the remaining budget"""
+    conf = getattr(frappe.local, 'conf', None) or {}
+    workers = int(conf.get('github_pagination_workers') or DEFAULT_PAGINATION_WORKERS)
+    remaining = resp.headers.get('X-RateLimit-Remaining')
+    if remaining is not None and str(remaining).isdigit():
+        headroom = int(remaining) - pages_left
+        # Close to the limit a serial walk lets the shared budget pace the calls
+        if headroom < PAGINATION_RATE_RESERVE:
+            return 1
+        workers = min(workers, headroom // PAGINATION_RATE_RESERVE)
+    return max(1, min(workers, pages_left))
+
+def _timed_get(session, url, headers):
+    # Runs in a pool thread: only measures, metrics are written by the caller
+    started = time.monotonic()
+    try:
+        return session.get(url, headers=headers, timeout=30), None, time.monotonic() - started
+    except requests.exceptions.RequestException as e:
+        return None, e, time.monotonic() - started
+
+def _fetch_pages_concurrently(urls, headers, workers, budget):
+    """Yield the decoded body of each URL in page order, fetching ``workers`` at a time.
+
+    Only the HTTP round-trip runs in the pool. Cache lookups, rate-limit handling
+    and errors stay on the calling thread, which owns the Frappe site context.
+    """
+    session = get_session()
+    urls = iter(urls)
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='github-page') as executor:
+        def submit_next():
+            url = next(urls, None)
+            if url is None:
+                return False
+            endpoint = retry_policy.endpoint_template(url)
+            failures = retry_policy.check_circuit(endpoint)
+            budget.acquire(url)
+            request_headers, cached = _prepare_conditional(url, headers)
+            future = executor.submit(_timed_get, session, url, request_headers)
+            pending.append((url, endpoint, failures, cached, future))
+            return True
+
+        # Keep a bounded window in flight so memory stays proportional to workers
+        for _ in range(workers * 2):
+            if not submit_next():
+                break
+
+        while pending:
+            url, endpoint, failures, cached, future = pending.popleft()
+            resp, error, elapsed = future.result()
+            github_metrics.record_request('GET', url, resp, error, elapsed)
+
+            if resp is not None:
+                budget.record(resp)
+            if retry_policy.is_failure(resp, error):
+                retry_policy.record_failure(endpoint)
+            elif resp is not None:
+                retry_policy.record_success(endpoint, failures)
+
+            if resp is not None and resp.status_code in (200, 304):
+                data, _link = _resolve_conditional(url, None, headers, cached, resp)
+            else:
+                # Rate limited or failed: the serial path knows how to retry, wait
+                # for a reset or surface the error
+                _resp, data, _link = _get_page(url, headers, budget=budget)
+
+            submit_next()
+            yield url, data
+
+def _iter_following_pages(url, resp, data, link, headers, budget, parallel=True):
+    """Yield the page already fetched from ``url`` and then every page after it.
+
+    Offset paginated lists with a rel="last" link are fetched in parallel; cursor
+    based lists, a tight rate limit budget or ``parallel=False`` (callers that
+    may stop early) fall back to following rel="next".
+    """
+    first_url, pages = url, 0
+    try:
+        while True:
+            links = _parse_link_header(link)
+            pages += 1
+            yield GitHubPage(_page_items(data), url=url, next_url=links.get('next'))
+
+            page_urls = _remaining_page_urls(links) if parallel else []
+            if page_urls:
+                workers = _page_workers(resp, len(page_urls))
+                if workers > 1:
+                    fetched = _fetch_pages_concurrently(page_urls, headers, workers, budget)
+                    for index, (page_url, page_data) in enumerate(fetched):
+                        next_url = page_urls[index + 1] if index + 1 < len(page_urls) else None
+                        pages += 1
+                        yield GitHubPage(_page_items(page_data), url=page_url, next_url=next_url)
+                    return
+
+            url = links.get('next')
+            if not url:
+                return
+            resp, data, link = _get_page(url, headers, budget=budget)
+    finally:
+        github_metrics.record_pages(first_url, pages)
+
+def _iter_pages(url, headers, params=None, budget=None, parallel=True):
+    budget = budget or _Budget.from_headers(headers)
+    resp, data, link = _get_page(url, headers, params=params, budget=budget)
+    yield from _iter_following_pages(url, resp, data, link, headers, budget, parallel=parallel)
+
+def _get_with_pagination(url, headers, params=None):
+    return [item for page in _iter_pages(url, headers, params=params) for item in page]
+
+def iter_github_pages(path, token, params=None, block=True, max_wait=None, parallel=True):
+    """Yield each page of a GitHub list endpoint as a ``GitHubPage`` as soon as it arrives.
+
+    Only the pages currently in flight are held in memory, so callers that
+    process page by page stay bounded regardless of the size of the list.
+    Pass ``parallel=False`` when the caller may stop before the end, so no
+    page is requested before it is needed. ``block``/``max_wait`` behave as
+    in ``github_request``.
+    """
+    url = f"{get_api_base()}{path}" if path.startswith('/') else path
+    headers = _get_headers(token)
+    budget = _Budget(
+        token, block=block, max_wait=max_wait,
+        organization=token_pool.organization_for_path(path), headers=headers,
+    )
+    yield from _iter_pages(url, headers, params=params, budget=budget, parallel=parallel)
+
+def iter_github_items(path, token, params=None, block=True, max_wait=None):
+    """Yield the items of a GitHub list endpoint one by one, page by page"""
+    for page in iter_github_pages(path, token, params=params, block=block, max_wait=max_wait):
+        yield from page
+
+def github_request(method, path, token, params=None, data=None, retry=2, block=True, max_wait=None):
+    """Call the GitHub REST API and return the decoded body (all pages for lists).
+
+    Requests draw on the rate limit budget shared by every process using
+    ``token``; when it runs into the reserve the call moves on to another
+    credential of the pool (GitHub Settings > Credentials) that has budget.
+    With ``block`` (default) the call waits up to ``max_wait`` seconds for
+    budget; with ``block=False`` it raises ``GitHubRateLimitError``
+    immediately, whose ``retry_after`` tells the caller when to try again.
+    """
+    url = f"{get_api_base()}{path}" if path.startswith('/') else path
     headers = _get_headers(token)
+    budget = _Budget(
+        token, block=block, max_wait=max_wait,
+        organization=token_pool.organization_for_path(path), headers=headers,
+    )
 
     for attempt in range(retry):
-        resp = requests.request(method, url, headers=headers, params=params, json=data, timeout=30)
-        
-        if resp.status_code in (200, 201, 204):
+        if method.upper() == 'GET':
+            resp, body, link = _cached_get(url, headers, params=params, budget=budget)
+        else:
+            resp, _cached = _send(method.upper(), url, headers, budget, params=params, data=data)
+            body, link = None, resp.headers.get('Link')
+            if resp.status_code in (200, 201):
+                try:
+                    body = resp.json()
+                except ValueError:
+                    body = resp.text
+
+        if resp.status_code in (200, 201, 204, 304):
             if resp.status_code == 204:
                 return None
-            if 'Link' in resp.headers:
-                return _get_with_pagination(url, headers, params=params)
-            try:
-                return resp.json()
-            except ValueError:
-                return resp.text
+            if link:
+                # Keep the first page we already have and follow the rest
+                pages = _iter_following_pages(url, resp, body, link, headers, budget)
+                return [item for page in pages for item in page]
+            return body
                 
         elif resp.status_code == 403:
             error_text = (resp.text or "").lower()
             
             if 'rate limit' in error_text:
-                if _handle_rate_limit(resp):
+                if _handle_rate_limit(resp) and attempt < retry - 1:
+                    _wait_for_reset(resp, budget)
                     continue
                 frappe.throw(_("GitHub API rate limit exceeded"))
             
@@ -88,11 +532,29 @@ def github_request(method, path, token, params=None, data=None, retry=2):
                 frappe.throw(_("GitHub Permission Error: {0}").format(resp.text))
                 
         else:
-            try:
-                resp.raise_for_status()
-            except requests.exceptions.HTTPError as e:
-                frappe.logger().error(f"GitHub API Error: {str(e)}")
-                if attempt == retry - 1:  # Last attempt
-                    frappe.throw(_("GitHub API Error: {0}").format(str(e)))
-                # Continue to next iteration for retry
+            _throw_for_status(resp, url)
     return None
+
+class GitHubGraphQLError(frappe.ValidationError):
+    """GitHub answered a GraphQL query with errors"""
+
+def github_graphql(query, token, variables=None, block=True, max_wait=None):
+    """Run a GraphQL query against the GitHub API and return its ``data``.
+
+    GitHub reports query errors (unknown fields, missing scopes, ...) with a
+    200 status, so they are raised here as ``GitHubGraphQLError``.
+    """
+    base = get_api_base()
+    # GitHub Enterprise Server serves GraphQL at /api/graphql, beside /api/v3
+    url = (base[:-len('/v3')] if base.endswith('/api/v3') else base) + '/graphql'
+    body = github_request(
+        'POST', url, token,
+        data={'query': query, 'variables': variables or {}},
+        block=block, max_wait=max_wait,
+    )
+    if not isinstance(body, dict):
+        raise GitHubGraphQLError(_("Unexpected GitHub GraphQL response"))
+    if body.get('errors'):
+        messages = '; '.join(e.get('message') or str(e) for e in body['errors'])
+        raise GitHubGraphQLError(_("GitHub GraphQL Error: {0}").format(messages))
+    return body.get('data') or {}
@@ -0,0 +1,210 @@
+import frappe
+from . import commit_store
+from .github_client import GitHubPage, github_graphql
+
+# GraphQL fetch path for repository sync.
+#
+# The REST sync needs one call per branch (commit date) and one per
+# collaborator (email) on top of the list calls. Here the same data comes
+# from a handful of paginated queries, and every node is reshaped into the
+# REST payload sync_repo already understands, so both paths write identical
+# records (and hashes): fields the REST lists lack, such as the merge state
+# of a pull request, are left out here too.
+
+PAGE_SIZE = 100
+# Issues and pull requests carry nested connections; smaller pages keep each
+# query well inside GitHub's node limit and response time budget.
+ISSUE_PAGE_SIZE = 50
+
+_REPOSITORY_QUERY = """
+query($owner: String!, $name: String!) {
+  repository(owner: $owner, name: $name) {
+    databaseId
+    isPrivate
+    defaultBranchRef { name }
+  }
+}
+"""
+
+_REFS_QUERY = """
+query($owner: String!, $name: String!, $first: Int!, $after: String) {
+  repository(owner: $owner, name: $name) {
+    connection: refs(refPrefix: "refs/heads/", first: $first, after: $after) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        name
+        branchProtectionRule { id }
+        target {
+          oid
+          ... on Commit { committedDate author { date name user { login } } }
+        }
+      }
+    }
+  }
+}
+"""
+
+_COLLABORATORS_QUERY = """
+query($owner: String!, $name: String!, $first: Int!, $after: String) {
+  repository(owner: $owner, name: $name) {
+    connection: collaborators(first: $first, after: $after) {
+      pageInfo { hasNextPage endCursor }
+      edges {
+        permission
+        node { login databaseId email }
+      }
+    }
+  }
+}
+"""
+
+_ISSUES_QUERY = """
+query($owner: String!, $name: String!, $first: Int!, $after: String, $since: DateTime) {
+  repository(owner: $owner, name: $name) {
+    connection: issues(first: $first, after: $after, filterBy: {since: $since},
+                       orderBy: {field: UPDATED_AT, direction: ASC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        databaseId number title body state url createdAt updatedAt
+        assignees(first: 10) { nodes { login } }
+        labels(first: 100) { nodes { name } }
+      }
+    }
+  }
+}
+"""
+
+_PULL_REQUESTS_QUERY = """
+query($owner: String!, $name: String!, $first: Int!, $after: String) {
+  repository(owner: $owner, name: $name) {
+    connection: pullRequests(first: $first, after: $after,
+                             orderBy: {field: UPDATED_AT, direction: DESC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        databaseId number title body state url createdAt updatedAt
+        headRefName baseRefName
+        author { login }
+        reviewRequests(first: 100) {
+          nodes { requestedReviewer { ... on User { login } } }
+        }
+      }
+    }
+  }
+}
+"""
+
+def graphql_enabled():
+    """Whether repository sync should try the GraphQL fetch path first"""
+    try:
+        value = frappe.db.get_single_value('GitHub Settings', 'use_graphql_sync')
+    except Exception:
+        return False
+    return bool(value)
+
+def _split(repo_full):
+    owner, name = repo_full.split('/', 1)
+    return {'owner': owner, 'name': name}
+
+def _iter_connection(query, token, variables, page_size=PAGE_SIZE, after=None):
+    """Yield the node (or edge) list of each page of ``repository.connection``
+    as a ``GitHubPage`` whose ``url``/``next_url`` are the cursors before and after it"""
+    while True:
+        data = github_graphql(query, token, dict(variables, first=page_size, after=after))
+        connection = ((data.get('repository') or {}).get('connection')) or {}
+        page_info = connection.get('pageInfo') or {}
+        next_cursor = page_info.get('endCursor') if page_info.get('hasNextPage') else None
+        yield GitHubPage(
+            connection.get('edges', connection.get('nodes')) or [], url=after, next_url=next_cursor,
+            transport='graphql',
+        )
+        if not next_cursor:
+            return
+        after = next_cursor
+
+def _branch(repo_full, node):
+    target = node.get('target') or {}
+    return {
+        'name': node.get('name'),
+        'commit': {'sha': target.get('oid')},
+        'protected': bool(node.get('branchProtectionRule')),
+        'commit_date': (target.get('author') or {}).get('date') or '',
+        'commit_record': commit_store.from_graphql(repo_full, target) if target.get('oid') else None,
+    }
+
+def _member(edge):
+    node = edge.get('node') or {}
+    return {
+        'login': node.get('login'),
+        'id': node.get('databaseId'),
+        'permissions': {'admin': edge.get('permission') == 'ADMIN'},
+        'email': node.get('email') or '',
+    }
+
+def _issue(node):
+    return {
+        'id': node.get('databaseId'),
+        'number': node.get('number'),
+        'title': node.get('title'),
+        'body': node.get('body'),
+        'state': (node.get('state') or '').lower(),
+        'html_url': node.get('url'),
+        'created_at': node.get('createdAt'),
+        'updated_at': node.get('updatedAt'),
+        'assignees': [{'login': a.get('login')} for a in (node.get('assignees') or {}).get('nodes') or []],
+        'labels': [{'name': label.get('name')} for label in (node.get('labels') or {}).get('nodes') or []],
+    }
+
+def _pull_request(node):
+    # REST reports merged pull requests as closed
+    state = (node.get('state') or '').lower()
+    reviewers = [
+        (r.get('requestedReviewer') or {}).get('login')
+        for r in (node.get('reviewRequests') or {}).get('nodes') or []
+    ]
+    return {
+        'id': node.get('databaseId'),
+        'number': node.get('number'),
+        'title': node.get('title'),
+        'body': node.get('body'),
+        'state': 'closed' if state == 'merged' else state,
+        'html_url': node.get('url'),
+        'created_at': node.get('createdAt'),
+        'updated_at': node.get('updatedAt'),
+        'head': {'ref': node.get('headRefName')},
+        'base': {'ref': node.get('baseRefName')},
+        'user': {'login': (node.get('author') or {}).get('login')},
+        # Not in REST list responses either (only on /pulls/{number})
+        'mergeable_state': None,
+        # Team review requests have no login, as in REST's requested_reviewers
+        'requested_reviewers': [{'login': login} for login in reviewers if login],
+    }
+
+def fetch_repository(repo_full, token):
+    """Repository info, branches (with ``commit_date`` and a ``commit_record`` for the
+    commit store) and collaborators (with ``email``)"""
+    variables = _split(repo_full)
+    repository = github_graphql(_REPOSITORY_QUERY, token, variables).get('repository') or {}
+    repo_info = {
+        'id': repository.get('databaseId'),
+        'private': repository.get('isPrivate'),
+        'default_branch': (repository.get('defaultBranchRef') or {}).get('name') or 'main',
+    }
+    branches = [_branch(repo_full, n) for page in _iter_connection(_REFS_QUERY, token, variables) for n in page]
+    members = [_member(e) for page in _iter_connection(_COLLABORATORS_QUERY, token, variables) for e in page]
+    return repo_info, branches, members
+
+def iter_issue_pages(repo_full, token, since=None):
+    """Pages of issues (without pull requests) updated since ``since``, shaped like REST"""
+    variables = dict(_split(repo_full), since=since)
+    for page in _iter_connection(_ISSUES_QUERY, token, variables, ISSUE_PAGE_SIZE):
+        yield [_issue(n) for n in page]
+
+def iter_pull_request_pages(repo_full, token, after=None):
+    """Pages of pull requests shaped like REST, most recently updated first.
+
+    Each page's ``next_url`` is the cursor to pass as ``after`` to continue after it.
+    """
+    for page in _iter_connection(_PULL_REQUESTS_QUERY, token, _split(repo_full), ISSUE_PAGE_SIZE, after=after):
+        yield GitHubPage(
+            [_pull_request(n) for n in page], url=page.url, next_url=page.next_url, transport=page.transport
+        )
@@ -0,0 +1,186 @@
+import time
+import frappe
+from . import rate_limit, sync_profile
+from .retry_policy import endpoint_template
+from .utils import cache_key, get_conf, hgetall
+
+# Outbound GitHub API metrics.
+#
+# Every HTTP attempt adds to counters kept per "METHOD endpoint-template" in
+# Redis: a latency histogram (fixed millisecond buckets, from which
+# p50/p95/p99 are interpolated), status codes, bytes and, for list calls,
+# pages per call. Rate limit headers feed a gauge per credential plus a
+# short per-minute history. Writes are pipelined and never raise.
+
+METRICS_PREFIX = "github_metrics"
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+PAGE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 500)
+RATE_SERIES_LENGTH = 24 * 60
+RATE_SAMPLE_SECONDS = 60
+
+def _enabled():
+    return get_conf('github_metrics_enabled', 1) not in (0, '0', False)
+
+def _key(*parts):
+    return cache_key(METRICS_PREFIX, *parts)
+
+def _bucket(value, buckets):
+    for bound in buckets:
+        if value <= bound:
+            return str(bound)
+    return '+Inf'
+
+def _series_name(method, url):
+    return f"{method.upper()} {endpoint_template(url)}"
+
+def record_request(method, url, resp=None, error=None, elapsed=0.0):
+    """Record one HTTP attempt (``elapsed`` in seconds)"""
+    sync_profile.count_request()
+    if not _enabled():
+        return
+    series = _series_name(method, url)
+    status = str(resp.status_code) if resp is not None else type(error).__name__
+    elapsed_ms = int(elapsed * 1000)
+    size = len(resp.content or b'') if resp is not None else 0
+    try:
+        pipe = frappe.cache().pipeline(transaction=False)
+        pipe.execute_command('SADD', _key('endpoints'), series)
+        pipe.execute_command('HINCRBY', _key(series, 'latency'), _bucket(elapsed_ms, LATENCY_BUCKETS_MS), 1)
+        pipe.execute_command('HINCRBY', _key(series, 'status'), status, 1)
+        pipe.execute_command('HINCRBY', _key(series, 'totals'), 'requests', 1)
+        pipe.execute_command('HINCRBY', _key(series, 'totals'), 'latency_ms', elapsed_ms)
+        pipe.execute_command('HINCRBY', _key(series, 'totals'), 'bytes', size)
+        pipe.execute()
+    except Exception:
+        pass
+    if resp is not None:
+        _record_rate_limit(resp)
+
+def record_pages(url, pages):
+    """Record how many pages one list call walked"""
+    if not _enabled() or not pages:
+        return
+    series = _series_name('GET', url)
+    try:
+        pipe = frappe.cache().pipeline(transaction=False)
+        pipe.execute_command('HINCRBY', _key(series, 'pages'), _bucket(pages, PAGE_BUCKETS), 1)
+        pipe.execute_command('HINCRBY', _key(series, 'totals'), 'list_calls', 1)
+        pipe.execute_command('HINCRBY', _key(series, 'totals'), 'pages', pages)
+        pipe.execute()
+    except Exception:
+        pass
+
+def _record_rate_limit(resp):
+    remaining = resp.headers.get('X-RateLimit-Remaining')
+    if remaining is None:
+        return
+    request = getattr(resp, 'request', None)
+    auth = (request.headers.get('Authorization') or '') if request is not None else ''
+    fingerprint = rate_limit.token_fingerprint(auth.split(' ', 1)[-1])
+    resource = resp.headers.get('X-RateLimit-Resource') or 'core'
+    now = int(time.time())
+    try:
+        cache = frappe.cache()
+        pipe = cache.pipeline(transaction=False)
+        pipe.execute_command('SADD', _key('rate_limits'), f"{fingerprint}|{resource}")
+        pipe.execute_command(
+            'HSET', _key('rate', fingerprint, resource),
+            'remaining', remaining,
+            'limit', resp.headers.get('X-RateLimit-Limit') or 0,
+            'reset', resp.headers.get('X-RateLimit-Reset') or 0,
+            'updated', now,
+        )
+        pipe.execute()
+        # One history point per credential and minute
+        if cache.execute_command('SET', _key('rate_sample', fingerprint, resource), 1, 'NX', 'EX', RATE_SAMPLE_SECONDS):
+            series_key = _key('rate_series', fingerprint, resource)
+            pipe = cache.pipeline(transaction=False)
+            pipe.execute_command('LPUSH', series_key, f"{now}:{remaining}")
+            pipe.execute_command('LTRIM', series_key, 0, RATE_SERIES_LENGTH - 1)
+            pipe.execute()
+    except Exception:
+        pass
+
+def _members(key):
+    return sorted(
+        m.decode() if isinstance(m, bytes) else m
+        for m in frappe.cache().execute_command('SMEMBERS', key) or []
+    )
+
+def _percentile(histogram, buckets, q):
+    """Interpolate the ``q`` quantile from bucket counts"""
+    counts = [int(histogram.get(str(bound), 0)) for bound in buckets] + [int(histogram.get('+Inf', 0))]
+    total = sum(counts)
+    if not total:
+        return None
+    target = q * total
+    seen, lower = 0, 0
+    for bound, count in zip([*buckets, None], counts, strict=True):
+        if count and seen + count >= target:
+            if bound is None:
+                # Beyond the last bucket: report its bound
+                return buckets[-1]
+            return round(lower + (bound - lower) * (target - seen) / count, 1)
+        seen += count
+        lower = bound if bound is not None else lower
+    return buckets[-1]
+
+def get_endpoint_metrics():
+    """Per endpoint template: requests, status codes, bytes, latency percentiles (ms) and pages per call"""
+    metrics = []
+    for series in _members(_key('endpoints')):
+        totals = hgetall(_key(series, 'totals'))
+        latency = hgetall(_key(series, 'latency'))
+        statuses = {k: int(v) for k, v in hgetall(_key(series, 'status')).items()}
+        requests = int(totals.get('requests', 0))
+        list_calls = int(totals.get('list_calls', 0))
+        method, endpoint = series.split(' ', 1)
+        metrics.append({
+            'method': method,
+            'endpoint': endpoint,
+            'requests': requests,
+            'errors': sum(c for s, c in statuses.items() if not s.isdigit() or int(s) >= 400),
+            'statuses': statuses,
+            'bytes': int(totals.get('bytes', 0)),
+            'avg_ms': round(int(totals.get('latency_ms', 0)) / requests, 1) if requests else None,
+            'p50_ms': _percentile(latency, LATENCY_BUCKETS_MS, 0.50),
+            'p95_ms': _percentile(latency, LATENCY_BUCKETS_MS, 0.95),
+            'p99_ms': _percentile(latency, LATENCY_BUCKETS_MS, 0.99),
+            'list_calls': list_calls,
+            'avg_pages': round(int(totals.get('pages', 0)) / list_calls, 1) if list_calls else None,
+        })
+    return sorted(metrics, key=lambda m: m['requests'], reverse=True)
+
+def get_rate_limit_gauges(history=60):
+    """Last reported rate limit per credential fingerprint and resource, with recent per-minute samples"""
+    gauges = []
+    for member in _members(_key('rate_limits')):
+        fingerprint, resource = member.split('|', 1)
+        state = hgetall(_key('rate', fingerprint, resource))
+        if not state:
+            continue
+        samples = frappe.cache().execute_command('LRANGE', _key('rate_series', fingerprint, resource), 0, history - 1) or []
+        points = []
+        for sample in samples:
+            ts, remaining = (sample.decode() if isinstance(sample, bytes) else sample).split(':', 1)
+            points.append([int(ts), int(remaining)])
+        gauges.append({
+            'fingerprint': fingerprint,
+            'resource': resource,
+            'remaining': int(state.get('remaining', 0)),
+            'limit': int(state.get('limit', 0)),
+            'reset': int(state.get('reset', 0)),
+            'updated': int(state.get('updated', 0)),
+            'history': list(reversed(points)),
+        })
+    return gauges
+
+def reset_metrics():
+    cache = frappe.cache()
+    keys = [_key('endpoints'), _key('rate_limits')]
+    for series in _members(_key('endpoints')):
+        keys.extend(_key(series, part) for part in ('latency', 'status', 'totals', 'pages'))
+    for member in _members(_key('rate_limits')):
+        fingerprint, resource = member.split('|', 1)
+        keys.extend(_key(part, fingerprint, resource) for part in ('rate', 'rate_series', 'rate_sample'))
+    cache.execute_command('DEL', *keys)
@@ -180,11 +180,20 @@ doc_events = {
 # 	],
 # }
 
-# scheduler_events = {
-#     "hourly": [
-#         "erpnext_github_integration.github_api.sync_all_repositories"
-#     ]
-# }
+scheduler_events = {
+    "cron": {
+        # Queues the repositories that are due, busiest and stalest first
+        "*/5 * * * *": [
+            "erpnext_github_integration.sync_scheduler.schedule_syncs",
+            # Replaces sync jobs that died without starting the next one
+            "erpnext_github_integration.sync_queue.refill"
+        ],
+        # Restarts webhook inbox drainers that died
+        "* * * * *": [
+            "erpnext_github_integration.webhook_inbox.recover"
+        ]
+    }
+}
 
 # Testing
 # -------
@@ -263,7 +272,8 @@ override_doctype_dashboards = {
 # Automatically update python controller files with type annotations for this app.
 # export_python_type_annotations = True
 
-# default_log_clearing_doctypes = {
-# 	"Logging DocType Name": 30  # days to retain logs
-# }
+default_log_clearing_doctypes = {
+	"Sync Log": 30,  # days to retain logs
+	"GitHub Webhook Delivery": 7
+}
 
@@ -0,0 +1,165 @@
+import hashlib, math, time
+import frappe
+from frappe import _
+from .utils import hgetall
+
+# Cluster-wide GitHub rate limit budget.
+#
+# Every process that talks to GitHub with the same credential shares one
+# bucket in Redis. Responses refill it from the X-RateLimit-* headers and
+# every request takes a token before it is sent. Above the reserve
+# (GitHub Settings > Rate Limit Threshold) requests go straight through;
+# inside the reserve they are spaced evenly over what is left of the window,
+# so the workers slow down together instead of all hitting zero at once.
+
+RATE_LIMIT_PREFIX = "github_rate_limit"
+DEFAULT_RESERVE = 100
+DEFAULT_MAX_WAIT = 10
+DEFAULT_JOB_MAX_WAIT = 3600
+
+# KEYS[1] bucket; ARGV now, reserve -> {allowed, seconds to wait}
+_ACQUIRE_SCRIPT = """
+local remaining = tonumber(redis.call('HGET', KEYS[1], 'remaining'))
+local reset = tonumber(redis.call('HGET', KEYS[1], 'reset'))
+local now = tonumber(ARGV[1])
+local reserve = tonumber(ARGV[2])
+if not remaining or not reset or reset <= now then
+    return {1, '0'}
+end
+if remaining > reserve then
+    redis.call('HINCRBY', KEYS[1], 'remaining', -1)
+    return {1, '0'}
+end
+if remaining > 0 then
+    local next_at = tonumber(redis.call('HGET', KEYS[1], 'next_at') or '0')
+    if next_at <= now then
+        redis.call('HSET', KEYS[1], 'next_at', tostring(now + (reset - now) / remaining))
+        redis.call('HINCRBY', KEYS[1], 'remaining', -1)
+        return {1, '0'}
+    end
+    return {0, tostring(next_at - now)}
+end
+return {0, tostring(reset - now)}
+"""
+
+# KEYS[1] bucket; ARGV remaining, reset, limit, now
+_RECORD_SCRIPT = """
+local remaining = tonumber(ARGV[1])
+local reset = tonumber(ARGV[2])
+local current_reset = tonumber(redis.call('HGET', KEYS[1], 'reset') or '0')
+local current = tonumber(redis.call('HGET', KEYS[1], 'remaining') or '-1')
+if reset ~= current_reset or current < 0 or remaining < current then
+    redis.call('HSET', KEYS[1], 'remaining', remaining, 'reset', reset, 'limit', ARGV[3])
+end
+if reset ~= current_reset then
+    redis.call('HDEL', KEYS[1], 'next_at')
+end
+redis.call('EXPIRE', KEYS[1], math.max(60, reset - tonumber(ARGV[4]) + 60))
+return 1
+"""
+
+
+class GitHubRateLimitError(frappe.ValidationError):
+    """The shared rate limit budget is exhausted; ``retry_after`` says for how long (seconds)"""
+
+    def __init__(self, message=None, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def token_fingerprint(token):
+    """Stable, non-reversible identifier of a credential for Redis keys and reports"""
+    return hashlib.sha1((token or '').encode()).hexdigest()[:16]
+
+def resource_for_path(path):
+    """GitHub keeps separate budgets for search and GraphQL"""
+    path = path or ''
+    if '/search/' in path:
+        return 'search'
+    if path.rstrip('/').endswith('/graphql'):
+        return 'graphql'
+    return 'core'
+
+def _bucket_key(token, resource):
+    # Shared across sites: sites that use the same credential draw on one budget
+    return frappe.cache().make_key(
+        f"{RATE_LIMIT_PREFIX}|{token_fingerprint(token)}|{resource}", shared=True
+    )
+
+def _reserve():
+    try:
+        value = frappe.db.get_single_value('GitHub Settings', 'rate_limit_threshold')
+    except Exception:
+        value = None
+    return DEFAULT_RESERVE if value in (None, '') else int(value)
+
+def default_max_wait():
+    """Web requests should not hold a worker for long; background jobs can wait for a reset"""
+    if getattr(frappe.local, 'request', None) is not None:
+        return DEFAULT_MAX_WAIT
+    return DEFAULT_JOB_MAX_WAIT
+
+def acquire(token, resource='core', block=True, max_wait=None):
+    """Take one request from the shared budget of ``token``.
+
+    With ``block`` the call sleeps (at most ``max_wait`` seconds) until the
+    budget allows the request, otherwise it raises ``GitHubRateLimitError``
+    straight away with a ``retry_after`` hint.
+    """
+    cache = frappe.cache()
+    key = _bucket_key(token, resource)
+    reserve = _reserve()
+    if max_wait is None:
+        max_wait = default_max_wait()
+    deadline = time.time() + max_wait
+
+    while True:
+        try:
+            allowed, wait = cache.eval(_ACQUIRE_SCRIPT, 1, key, time.time(), reserve)
+        except Exception:
+            # Never let a Redis hiccup stop GitHub traffic; GitHub itself still enforces the limit
+            frappe.logger().warning("GitHub rate limit budget unavailable, continuing without it")
+            return
+        if int(allowed):
+            return
+
+        wait = max(float(wait), 0.05)
+        if not block or time.time() + wait > deadline:
+            raise GitHubRateLimitError(
+                _("GitHub API rate limit budget exhausted, retry in {0} seconds").format(math.ceil(wait)),
+                retry_after=math.ceil(wait),
+            )
+        time.sleep(wait)
+
+def record(token, resp):
+    """Feed the shared budget from a response's X-RateLimit-* headers.
+
+    Returns True when GitHub reports the window as exhausted.
+    """
+    remaining = resp.headers.get('X-RateLimit-Remaining')
+    reset = resp.headers.get('X-RateLimit-Reset')
+    if remaining is None or reset is None:
+        return False
+    try:
+        remaining, reset = int(remaining), int(reset)
+    except (TypeError, ValueError):
+        return False
+
+    resource = resp.headers.get('X-RateLimit-Resource') or 'core'
+    try:
+        frappe.cache().eval(
+            _RECORD_SCRIPT, 1, _bucket_key(token, resource),
+            remaining, reset, resp.headers.get('X-RateLimit-Limit') or 0, int(time.time()),
+        )
+    except Exception:
+        pass
+    return remaining <= 0
+
+def get_budget(token, resource='core'):
+    """Current shared budget of ``token`` as ``{remaining, limit, reset}``"""
+    state = hgetall(_bucket_key(token, resource))
+    return {
+        'remaining': int(state['remaining']) if 'remaining' in state else None,
+        'limit': int(state['limit']) if state.get('limit') else None,
+        'reset': int(state['reset']) if 'reset' in state else None,
+    }
@@ -0,0 +1,258 @@
+import math, random, re, time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import frappe
+from frappe import _
+import requests
+from .utils import get_conf
+
+# Retry policy and circuit breaker for GitHub calls.
+#
+# Transient failures (timeouts, 5xx, secondary rate limits) are retried with
+# exponential backoff and full jitter, or after the Retry-After GitHub asks
+# for. Server-side failures also feed a breaker per endpoint template
+# (/repos/{owner}/{repo}/issues, ...) shared by every worker: after too many
+# in a short window the endpoint is not called at all for a cool-down, then a
+# single failure re-opens it while a success closes it again.
+
+CIRCUIT_PREFIX = "github_circuit"
+RETRY_STATS_PREFIX = "github_retry_stats"
+RETRY_STATS_FIELDS = (
+    'retries', 'timeouts', 'server_errors', 'secondary_rate_limits',
+    'retry_after_waits', 'circuit_opened', 'short_circuited',
+)
+
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+# GitHub asks to wait at least a minute after a secondary rate limit without Retry-After
+SECONDARY_LIMIT_DELAY = 60
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_FAILURE_WINDOW = 60
+DEFAULT_COOLDOWN = 30
+
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+_SHA_RE = re.compile(r'^[0-9a-f]{40}$')
+
+
+class GitHubCircuitOpenError(frappe.ValidationError):
+    """Calls to ``endpoint`` are suspended; ``retry_after`` says for how long (seconds)"""
+
+    def __init__(self, message=None, endpoint=None, retry_after=None):
+        super().__init__(message)
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+def max_attempts():
+    return max(1, int(get_conf('github_retry_max_attempts', DEFAULT_MAX_ATTEMPTS)))
+
+def endpoint_template(url):
+    """Collapse a GitHub URL or path into its endpoint template.
+
+    ``/repos/acme/api/issues/42`` becomes ``/repos/{owner}/{repo}/issues/{number}``.
+    """
+    parts = [p for p in urlsplit(url).path.split('/') if p]
+    if parts and parts[0] == 'api':
+        # GitHub Enterprise Server: /api/v3/...
+        parts = parts[2:] if len(parts) > 1 and parts[1] == 'v3' else parts[1:]
+    template = []
+    for index, part in enumerate(parts):
+        if parts[0] == 'repos' and index in (1, 2):
+            part = '{owner}' if index == 1 else '{repo}'
+        elif parts[0] in ('users', 'orgs') and index == 1:
+            part = '{login}' if parts[0] == 'users' else '{org}'
+        elif part.isdigit():
+            part = '{number}'
+        elif _SHA_RE.match(part):
+            part = '{sha}'
+        template.append(part)
+    return '/' + '/'.join(template)
+
+def _is_secondary_rate_limit(resp):
+    if resp.status_code == 429:
+        return True
+    if resp.status_code != 403:
+        return False
+    if resp.headers.get('Retry-After'):
+        return True
+    return 'secondary rate limit' in (resp.text or '').lower()
+
+def is_retryable(resp=None, error=None, method='GET', url=''):
+    """Whether a failed attempt may be repeated.
+
+    Requests that may have reached GitHub are only repeated when they are
+    safe to send twice: idempotent methods and GraphQL queries.
+    """
+    idempotent = method.upper() in ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS') or url.rstrip('/').endswith('/graphql')
+    if error is not None:
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        return idempotent and isinstance(error, requests.exceptions.Timeout | requests.exceptions.ConnectionError)
+    if resp is None:
+        return False
+    if _is_secondary_rate_limit(resp):
+        # Rejected before processing, safe for any method
+        return True
+    return idempotent and resp.status_code in RETRYABLE_STATUSES
+
+def is_failure(resp=None, error=None):
+    """Whether an attempt counts against the endpoint's circuit breaker"""
+    if error is not None:
+        return isinstance(error, requests.exceptions.Timeout | requests.exceptions.ConnectionError)
+    return resp is not None and resp.status_code >= 500
+
+def _retry_after(resp):
+    value = resp.headers.get('Retry-After')
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return int(value)
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def retry_delay(attempt, resp=None):
+    """Seconds to wait before attempt ``attempt + 1``"""
+    if resp is not None:
+        retry_after = _retry_after(resp)
+        if retry_after is not None:
+            return retry_after
+        if _is_secondary_rate_limit(resp):
+            return SECONDARY_LIMIT_DELAY
+    base = float(get_conf('github_retry_base_delay', DEFAULT_BASE_DELAY))
+    cap = float(get_conf('github_retry_max_delay', DEFAULT_MAX_DELAY))
+    # Full jitter: spreads retries of many workers hitting the same incident
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def record_attempt(resp=None, error=None):
+    """Count a failed attempt by kind, and the retry that follows it.
+
+    Called by the client right before it waits, so a delay that is never
+    waited (last attempt, over the caller's budget) is not counted.
+    """
+    if resp is not None and _retry_after(resp) is not None:
+        _incr_stat('retry_after_waits')
+    if error is not None:
+        _incr_stat('timeouts')
+    elif resp is not None and resp.status_code >= 500:
+        _incr_stat('server_errors')
+    elif resp is not None and _is_secondary_rate_limit(resp):
+        _incr_stat('secondary_rate_limits')
+    _incr_stat('retries')
+
+# Circuit breaker
+
+def _circuit_keys(endpoint):
+    cache = frappe.cache()
+    return (
+        cache.make_key(f"{CIRCUIT_PREFIX}|{endpoint}|open", shared=True),
+        cache.make_key(f"{CIRCUIT_PREFIX}|{endpoint}|failures", shared=True),
+    )
+
+def _index_key():
+    return frappe.cache().make_key(f"{CIRCUIT_PREFIX}_endpoints", shared=True)
+
+def check_circuit(endpoint):
+    """Raise ``GitHubCircuitOpenError`` while ``endpoint`` is cooling down.
+
+    Returns the number of recent failures, which ``record_success`` uses to
+    skip the write when there is nothing to reset.
+    """
+    open_key, failures_key = _circuit_keys(endpoint)
+    try:
+        open_until, failures = frappe.cache().execute_command('MGET', open_key, failures_key)
+    except Exception:
+        # Without Redis there is no shared breaker; let the call through
+        return 0
+    if open_until is not None:
+        wait = float(open_until) - time.time()
+        if wait > 0:
+            _incr_stat('short_circuited')
+            raise GitHubCircuitOpenError(
+                _("GitHub endpoint {0} is failing, calls are suspended for {1} seconds").format(
+                    endpoint, math.ceil(wait)
+                ),
+                endpoint=endpoint,
+                retry_after=math.ceil(wait),
+            )
+    return int(failures or 0)
+
+def record_success(endpoint, failures=1):
+    if not failures:
+        return
+    try:
+        frappe.cache().execute_command('DEL', _circuit_keys(endpoint)[1])
+    except Exception:
+        pass
+
+def record_failure(endpoint):
+    """Count a failure; open the circuit once the threshold is reached within the window"""
+    threshold = int(get_conf('github_circuit_failure_threshold', DEFAULT_FAILURE_THRESHOLD))
+    window = int(get_conf('github_circuit_window', DEFAULT_FAILURE_WINDOW))
+    cooldown = int(get_conf('github_circuit_cooldown', DEFAULT_COOLDOWN))
+    open_key, failures_key = _circuit_keys(endpoint)
+    try:
+        cache = frappe.cache()
+        failures = int(cache.execute_command('INCR', failures_key))
+        if failures == 1:
+            cache.execute_command('EXPIRE', failures_key, window)
+        cache.execute_command('SADD', _index_key(), endpoint)
+        if failures >= threshold:
+            cache.execute_command('SET', open_key, time.time() + cooldown, 'EX', cooldown)
+            # Half-open after the cool-down: one more failure re-opens it
+            cache.execute_command('SET', failures_key, threshold - 1, 'EX', window + cooldown)
+            _incr_stat('circuit_opened')
+            frappe.logger().warning(f"GitHub circuit opened for {endpoint} ({failures} failures)")
+    except Exception:
+        pass
+
+def get_circuit_status():
+    """State of every endpoint that failed recently: closed, open or half-open"""
+    cache = frappe.cache()
+    status = []
+    now = time.time()
+    for endpoint in cache.execute_command('SMEMBERS', _index_key()) or []:
+        endpoint = endpoint.decode() if isinstance(endpoint, bytes) else endpoint
+        open_key, failures_key = _circuit_keys(endpoint)
+        open_until, failures = cache.execute_command('MGET', open_key, failures_key)
+        if open_until is None and failures is None:
+            cache.execute_command('SREM', _index_key(), endpoint)
+            continue
+        retry_in = max(0, math.ceil(float(open_until) - now)) if open_until is not None else 0
+        threshold = int(get_conf('github_circuit_failure_threshold', DEFAULT_FAILURE_THRESHOLD))
+        if retry_in:
+            state = 'open'
+        elif int(failures or 0) >= threshold - 1:
+            state = 'half-open'
+        else:
+            state = 'closed'
+        status.append({
+            'endpoint': endpoint,
+            'state': state,
+            'failures': int(failures or 0),
+            'retry_in': retry_in,
+        })
+    return sorted(status, key=lambda s: s['endpoint'])
+
+# Counters
+
+def _incr_stat(field, amount=1):
+    try:
+        cache = frappe.cache()
+        cache.execute_command('INCRBY', cache.make_key(f"{RETRY_STATS_PREFIX}|{field}"), amount)
+    except Exception:
+        pass
+
+def get_retry_stats():
+    cache = frappe.cache()
+    values = cache.execute_command(
+        'MGET', *[cache.make_key(f"{RETRY_STATS_PREFIX}|{f}") for f in RETRY_STATS_FIELDS]
+    )
+    return {field: int(value or 0) for field, value in zip(RETRY_STATS_FIELDS, values, strict=True)}
+
+def reset_retry_stats():
+    cache = frappe.cache()
+    cache.execute_command('DEL', *[cache.make_key(f"{RETRY_STATS_PREFIX}|{f}") for f in RETRY_STATS_FIELDS])
@@ -0,0 +1,159 @@
+import json, threading, time
+import frappe
+from frappe import _
+from .utils import cache_key, decode, get_conf
+
+# One sync per repository at a time, across workers and web requests.
+#
+# The first caller takes a Redis lock (``SET NX`` with a short lease) and a
+# thread renews the lease while the sync runs, so a dead worker frees the
+# repository within one lease. Anybody else asking for the same repository
+# attaches to the running sync: it waits for the lock to change hands and
+# returns the result the holder stored, instead of syncing a second time.
+# If the holder died without a result, the waiter takes the lock itself.
+#
+# Every result carries a ``lock`` entry: whether it was coalesced, how long
+# the caller waited and how many callers attached to the sync.
+
+LOCK_PREFIX = "github_sync_lock"
+DEFAULT_LEASE = 60
+DEFAULT_WAIT = 120
+# Web requests do not hold a worker waiting for somebody else's sync
+WEB_WAIT = 0
+RESULT_TTL = 300
+POLL_INTERVAL = 0.5
+
+# Only the holder (same token) may renew or release the lock
+_RENEW = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end return 0"
+_RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+def _key(*parts):
+    return cache_key(LOCK_PREFIX, *parts)
+
+def _lease():
+    return max(5, frappe.utils.cint(get_conf('github_sync_lock_lease', DEFAULT_LEASE)))
+
+def default_wait():
+    """Web requests return at once when the repository is busy; background jobs attach to the sync"""
+    if getattr(frappe.local, 'request', None) is not None:
+        return WEB_WAIT
+    return frappe.utils.flt(get_conf('github_sync_lock_wait', DEFAULT_WAIT))
+
+def get_holder(repo_full):
+    """Token of the sync holding ``repo_full``, if any"""
+    return decode(frappe.cache().execute_command('GET', _key(repo_full)))
+
+class _Renewer:
+    """Keeps extending the lease from a daemon thread until stopped"""
+
+    def __init__(self, key, token, lease):
+        # The cache client is shared with the thread; frappe.local is not
+        self.cache, self.key, self.token, self.lease = frappe.cache(), key, token, lease
+        self.stop_event = threading.Event()
+        self.lost = False
+        self.renewals = 0
+        self.thread = threading.Thread(target=self._run, name='github-sync-lock', daemon=True)
+
+    def _run(self):
+        while not self.stop_event.wait(self.lease / 3):
+            try:
+                renewed = self.cache.execute_command('EVAL', _RENEW, 1, self.key, self.token, self.lease * 1000)
+            except Exception:
+                # Redis hiccup: try again before the lease runs out
+                continue
+            if not renewed:
+                self.lost = True
+                return
+            self.renewals += 1
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+
+def run_exclusive(repo_full, sync, wait=None):
+    """Run ``sync()`` holding the lock of ``repo_full``, or attach to the sync already running.
+
+    ``wait`` (seconds, default ``default_wait()``) bounds how long an
+    attached caller waits; after it the caller gets an incomplete result
+    saying the sync is still running. In a web request it is capped at
+    ``WEB_WAIT``.
+    """
+    cache = frappe.cache()
+    key = _key(repo_full)
+    lease = _lease()
+    wait = default_wait() if wait is None else frappe.utils.flt(wait)
+    if getattr(frappe.local, 'request', None) is not None:
+        wait = min(wait, WEB_WAIT)
+    started = time.monotonic()
+    attached = None
+
+    while True:
+        token = frappe.generate_hash(length=12)
+        if cache.execute_command('SET', key, token, 'NX', 'PX', lease * 1000):
+            break
+        holder = get_holder(repo_full)
+        if not holder:
+            # Released between SET and GET
+            continue
+        if holder != attached:
+            attached = holder
+            cache.execute_command('INCR', _key(repo_full, holder, 'waiters'))
+            cache.execute_command('EXPIRE', _key(repo_full, holder, 'waiters'), RESULT_TTL)
+        while get_holder(repo_full) == holder:
+            if time.monotonic() - started >= wait:
+                return {
+                    'success': True,
+                    'message': _('A sync of {0} is already running').format(repo_full),
+                    'complete': False,
+                    'lock': _lock_info(True, started, contended=True, timed_out=True),
+                }
+            time.sleep(POLL_INTERVAL)
+        result = decode(cache.execute_command('GET', _key(repo_full, holder, 'result')))
+        if result:
+            return _attached_result(repo_full, json.loads(result), started)
+        # The holder died or lost its lease without a result: take over
+
+    acquired = time.monotonic()
+    # The result is stored before the lock is released, so a waiter that
+    # sees the lock gone either finds it or knows the holder died
+    with _Renewer(key, token, lease) as renewer:
+        try:
+            result = sync()
+            if isinstance(result, dict):
+                waiters = decode(cache.execute_command('GET', _key(repo_full, token, 'waiters')))
+                result['lock'] = _lock_info(
+                    False, started, waited_s=round(acquired - started, 3), contended=attached is not None,
+                    attached=frappe.utils.cint(waiters), renewals=renewer.renewals, lease_lost=renewer.lost,
+                )
+            _store_result(repo_full, token, result)
+        except Exception as e:
+            _store_result(repo_full, token, {'success': False, 'message': str(e)})
+            raise
+        finally:
+            cache.execute_command('EVAL', _RELEASE, 1, key, token)
+    return result
+
+def _lock_info(coalesced, started, **info):
+    info.setdefault('waited_s', round(time.monotonic() - started, 3))
+    return dict(info, coalesced=coalesced)
+
+def _store_result(repo_full, token, result):
+    # Read by the callers that attached while the lock was held
+    try:
+        frappe.cache().execute_command(
+            'SET', _key(repo_full, token, 'result'), json.dumps(result, default=str), 'EX', RESULT_TTL
+        )
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), f'GitHub Sync Lock: {repo_full}')
+
+def _attached_result(repo_full, result, started):
+    if not result.get('success', True):
+        # The sync we attached to failed: fail the same way
+        frappe.throw(_('Sync of {0} failed: {1}').format(repo_full, result.get('message')))
+    result = dict(result)
+    result['lock'] = _lock_info(True, started, contended=True)
+    return result
@@ -0,0 +1,208 @@
+import functools, os, resource, time
+from contextlib import contextmanager
+import frappe
+from .utils import get_conf
+
+# Per-phase profile of a repository sync, saved as a Sync Log.
+#
+# While a sync runs, ``frappe.local.github_sync_profile`` holds a
+# SyncProfile. Code marks its phases with ``phase(name)`` (or ``timed`` for
+# hot helpers such as date conversion, ``iterate`` for page generators);
+# time is charged to the innermost phase only, so nested phases never count
+# twice. GitHub requests (from github_metrics.record_request) and database
+# queries (by wrapping ``frappe.db.sql``, as frappe.recorder does) are
+# charged to the phase running when they are made. Resident memory is
+# sampled at phase boundaries. Without a profile every helper is a no-op.
+
+DOCTYPE = 'Sync Log'
+OTHER = 'Other'
+
+def _enabled():
+    return get_conf('github_sync_log', 1) not in (0, '0', False)
+
+def _rss_mb():
+    # Current resident size on Linux, else the process peak
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1048576
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def current():
+    return getattr(frappe.local, 'github_sync_profile', None)
+
+class SyncProfile:
+    """Context manager profiling one sync of ``repository``; saves a Sync Log on exit"""
+
+    def __init__(self, repository):
+        self.repository = repository
+        self.phases = {}
+        self.stack = []
+        self.result = None
+        self.log = None
+
+    def _phase(self, name):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = frappe._dict(seconds=0.0, calls=0, requests=0, queries=0, peak_rss_mb=0.0)
+        return phase
+
+    def _charge(self):
+        now = time.perf_counter()
+        self._phase(self.stack[-1]).seconds += now - self.mark
+        self.mark = now
+
+    def push(self, name, sample=True):
+        self._charge()
+        self.stack.append(name)
+        self._phase(name).calls += 1
+        if sample:
+            self._sample(name)
+
+    def pop(self, sample=True):
+        self._charge()
+        name = self.stack.pop()
+        if sample:
+            self._sample(name)
+
+    def _sample(self, name):
+        rss = _rss_mb()
+        phase = self._phase(name)
+        phase.peak_rss_mb = max(phase.peak_rss_mb, rss)
+        self.peak_rss_mb = max(self.peak_rss_mb, rss)
+
+    def count_request(self):
+        self._phase(self.stack[-1]).requests += 1
+
+    def __enter__(self):
+        self.started_at = frappe.utils.now()
+        self.started = self.mark = time.perf_counter()
+        self.peak_rss_mb = _rss_mb()
+        self.stack = [OTHER]
+        self._phase(OTHER).calls = 1
+        db = frappe.db
+        self._sql = db.sql
+
+        def sql(*args, **kwargs):
+            self._phase(self.stack[-1]).queries += 1
+            return self._sql(*args, **kwargs)
+
+        db.sql = sql
+        frappe.local.github_sync_profile = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._charge()
+        self.duration = time.perf_counter() - self.started
+        frappe.db.sql = self._sql
+        frappe.local.github_sync_profile = None
+        if exc_type:
+            # The transaction is the caller's to end; the log is written in a
+            # transaction of its own once it has (rolled back, usually)
+            error = f'{exc_type.__name__}: {exc}'
+            frappe.db.after_rollback.add(lambda: self._save_failed(error))
+            frappe.db.after_commit.add(lambda: self._save_failed(error))
+            return False
+        try:
+            self.save()
+        except Exception:
+            frappe.log_error(frappe.get_traceback(), f'GitHub Sync Log: {self.repository}')
+        return False
+
+    def _save_failed(self, error):
+        try:
+            self.save(status='Failed', error=error)
+            frappe.db.commit()
+        except Exception:
+            frappe.db.rollback()
+            frappe.log_error(frappe.get_traceback(), f'GitHub Sync Log: {self.repository}')
+
+    def save(self, status=None, error=None):
+        result = self.result or {}
+        written = result.get('written') or {}
+        phases = sorted(self.phases.items(), key=lambda p: p[1].seconds, reverse=True)
+        self.log = frappe.get_doc({
+            'doctype': DOCTYPE,
+            'repository': frappe.db.get_value('Repository', {'full_name': self.repository}, 'name'),
+            'repo_full_name': self.repository,
+            'status': status or ('Completed' if result.get('complete', True) else 'Paused'),
+            'started_at': self.started_at,
+            'duration': round(self.duration, 3),
+            'slowest_phase': phases[0][0] if phases else None,
+            'requests': sum(p.requests for _, p in phases),
+            'queries': sum(p.queries for _, p in phases),
+            'issues': result.get('issues') or 0,
+            'pulls': result.get('pulls') or 0,
+            'rows_inserted': written.get('inserted') or 0,
+            'rows_updated': written.get('updated') or 0,
+            'rows_skipped': result.get('skipped') or 0,
+            'errors': result.get('errors') or 0,
+            'peak_rss_mb': round(self.peak_rss_mb, 1),
+            'error': error,
+            'phases': [
+                dict(p, phase=name, seconds=round(p.seconds, 4), peak_rss_mb=round(p.peak_rss_mb, 1))
+                for name, p in phases
+            ],
+        }).insert(ignore_permissions=True)
+        return self.log
+
+def profile_sync(repository):
+    """SyncProfile for ``repository``, or a no-op context when sync logs are disabled"""
+    if not _enabled() or current() is not None:
+        return _NullProfile()
+    return SyncProfile(repository)
+
+class _NullProfile:
+    result = log = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+@contextmanager
+def phase(name):
+    """Charge the enclosed block to ``name``"""
+    profile = current()
+    if profile is None:
+        yield
+        return
+    profile.push(name)
+    try:
+        yield
+    finally:
+        profile.pop()
+
+_END = object()
+
+def iterate(name, iterable):
+    """Yield from ``iterable``, charging the time spent producing each item to ``name``"""
+    iterator = iter(iterable)
+    while True:
+        with phase(name):
+            item = next(iterator, _END)
+        if item is _END:
+            return
+        yield item
+
+def timed(name):
+    """Decorator charging every call to ``name``; cheap enough for per-record helpers"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profile = current()
+            if profile is None:
+                return fn(*args, **kwargs)
+            profile.push(name, sample=False)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.pop(sample=False)
+        return wrapper
+    return decorator
+
+def count_request():
+    profile = current()
+    if profile is not None:
+        profile.count_request()
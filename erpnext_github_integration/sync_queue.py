@@ -0,0 +1,247 @@
+import time
+import frappe
+from .utils import cache_key, decode, get_conf, hgetall
+
+# Fan-out of "sync all repositories" over background workers.
+#
+# The coordinator puts every repository on the pending list of a run and
+# enqueues up to ``GitHub Settings.sync_concurrency`` per-repository jobs;
+# each job enqueues the next pending repository when it finishes. Run
+# counters live in Redis, so every job publishes the aggregate progress of
+# the run on ``github_sync_progress``. A repository already queued or
+# running (in this or another run) is not enqueued a second time.
+#
+# Jobs go to the ``github_sync_queue`` of site config, else to a
+# ``github_sync`` queue when common_site_config defines workers for it,
+# else to ``long``.
+#
+# Each job syncs with a time budget below the job timeout
+# (``github_sync_time_budget``, default 80% of it). A repository too big to
+# finish in one job pauses at a checkpoint (see sync_state.py) and goes back
+# on the pending list, so it is finished by several bounded jobs; after
+# ``MAX_DEFERRALS`` pauses it is left to resume in the next run.
+#
+# A job killed by its timeout, OOM or a worker restart never enqueues the
+# next repository. Every job is tracked on the run's ``running`` set until a
+# job timeout after it started; ``refill`` (scheduler, every 5 minutes)
+# counts overdue jobs as failed and tops the run back up to
+# ``sync_concurrency`` jobs.
+
+RUN_PREFIX = "github_sync_run"
+RUN_TTL = 24 * 3600
+DEFAULT_CONCURRENCY = 4
+DEFAULT_JOB_TIMEOUT = 3600
+MAX_DEFERRALS = 5
+
+def _key(*parts):
+    return cache_key(RUN_PREFIX, *parts)
+
+def get_queue():
+    queue = get_conf('github_sync_queue', None)
+    if queue:
+        return queue
+    return 'github_sync' if 'github_sync' in (get_conf('workers', None) or {}) else 'long'
+
+def get_concurrency():
+    value = frappe.db.get_single_value('GitHub Settings', 'sync_concurrency')
+    return max(1, frappe.utils.cint(value) or DEFAULT_CONCURRENCY)
+
+def _lease():
+    # A job that has not finished after its timeout is dead
+    return frappe.utils.cint(get_conf('github_sync_job_timeout', DEFAULT_JOB_TIMEOUT)) + 60
+
+def _time_budget():
+    budget = frappe.utils.flt(get_conf('github_sync_time_budget', 0))
+    return budget if budget > 0 else 0.8 * (_lease() - 60)
+
+def get_active_run():
+    """Id of the run in progress, if any (a run nobody reports on for a job timeout is over)"""
+    return decode(frappe.cache().execute_command('GET', _key('active')))
+
+def start_run(repositories=None):
+    """Queue a sync of ``repositories`` (default: all) and return the run id.
+
+    If a run is already in progress its id is returned instead.
+    """
+    cache = frappe.cache()
+    run_id = frappe.generate_hash(length=10)
+    if not cache.execute_command('SET', _key('active'), run_id, 'NX', 'EX', _lease()):
+        return get_active_run()
+
+    if repositories is None:
+        repositories = frappe.get_all('Repository', pluck='full_name')
+    repositories = [r for r in dict.fromkeys(repositories) if r]
+
+    pipe = cache.pipeline(transaction=False)
+    pipe.execute_command(
+        'HSET', _key(run_id),
+        'total', len(repositories), 'done', 0, 'success', 0, 'failed', 0, 'skipped', 0, 'deferred', 0,
+        'started', time.time(),
+    )
+    if repositories:
+        pipe.execute_command('RPUSH', _key(run_id, 'pending'), *repositories)
+    pipe.execute_command('EXPIRE', _key(run_id), RUN_TTL)
+    pipe.execute_command('EXPIRE', _key(run_id, 'pending'), RUN_TTL)
+    pipe.execute()
+
+    if not repositories:
+        _finish(run_id)
+        return run_id
+    for _ in range(get_concurrency()):
+        if not _enqueue_next(run_id):
+            break
+    return run_id
+
+def get_run_status(run_id=None):
+    """Counters of ``run_id`` (default: the active run), or None"""
+    run_id = run_id or get_active_run()
+    if not run_id:
+        return None
+    state = hgetall(_key(run_id))
+    if not state:
+        return None
+    status = {k: int(state.get(k, 0)) for k in ('total', 'done', 'success', 'failed', 'skipped', 'deferred')}
+    status.update(
+        run_id=run_id,
+        pending=int(frappe.cache().execute_command('LLEN', _key(run_id, 'pending')) or 0),
+        time_s=round(time.time() - float(state.get('started') or time.time()), 1),
+    )
+    return status
+
+def _enqueue_next(run_id):
+    """Enqueue the next pending repository not already queued; False when none is left"""
+    cache = frappe.cache()
+    while True:
+        repo = decode(cache.execute_command('LPOP', _key(run_id, 'pending')))
+        if not repo:
+            return False
+        # Held until the job ends; expires on its own if the worker dies
+        if cache.execute_command('SET', _key('queued', repo), run_id, 'NX', 'EX', _lease()):
+            _track(run_id, repo)
+            frappe.enqueue(
+                'erpnext_github_integration.sync_queue.sync_repository_job',
+                queue=get_queue(),
+                timeout=_lease() - 60,
+                job_name=f'github_sync|{repo}',
+                repository=repo,
+                run_id=run_id,
+            )
+            return True
+        _record(run_id, repo, 'skipped')
+
+def _track(run_id, repo, started=False):
+    """Mark ``repo`` running in ``run_id`` until a job timeout from now"""
+    key = _key(run_id, 'running')
+    # A started job only renews its entry: gone means ``refill`` gave up on it
+    flags = ('XX',) if started else ()
+    pipe = frappe.cache().pipeline(transaction=False)
+    pipe.execute_command('ZADD', key, *flags, time.time() + _lease(), repo)
+    pipe.execute_command('EXPIRE', key, RUN_TTL)
+    pipe.execute()
+
+def sync_repository_job(repository, run_id):
+    """Background job: sync one repository of a run, then start the next one"""
+    from .github_api import sync_repo
+    from .sync_scheduler import record_cost
+
+    # The job timeout counts from now, not from when it was queued
+    _track(run_id, repository, started=True)
+    _publish(run_id, repo=repository, phase='syncing')
+    status = 'success'
+    try:
+        result = sync_repo(repository, time_budget=_time_budget())
+        frappe.db.commit()
+        # A sync we only attached to cost this job nothing
+        if not (result or {}).get('lock', {}).get('coalesced'):
+            record_cost(repository, result)
+        if not (result or {}).get('complete', True):
+            status = 'paused'
+    except Exception as e:
+        frappe.db.rollback()
+        status = 'failed'
+        frappe.log_error(message=frappe.get_traceback() or str(e), title=f'GitHub Sync Error - {repository}')
+    finally:
+        cache = frappe.cache()
+        cache.execute_command('DEL', _key('queued', repository))
+        # Otherwise ``refill`` already counted this job as dead
+        if cache.execute_command('ZREM', _key(run_id, 'running'), repository):
+            _end_job(run_id, repository, status)
+            _enqueue_next(run_id)
+
+def _end_job(run_id, repository, status):
+    cache = frappe.cache()
+    if status == 'paused':
+        deferrals = cache.execute_command('HINCRBY', _key(run_id, 'deferrals'), repository, 1)
+        cache.execute_command('EXPIRE', _key(run_id, 'deferrals'), RUN_TTL)
+        if deferrals <= MAX_DEFERRALS:
+            # Resumed from its checkpoint once the repositories ahead had their turn
+            _touch(run_id)
+            cache.execute_command('RPUSH', _key(run_id, 'pending'), repository)
+            _publish(run_id, repo=repository, status=status)
+            return
+        # A repository that keeps pausing (rate limited, huge) must not hold
+        # the run open; its checkpoint is resumed by the next run
+        status = 'deferred'
+    _record(run_id, repository, status)
+
+def refill():
+    """Scheduler: count jobs of the active run that outlived their timeout
+    as failed and top the run back up to ``sync_concurrency`` jobs"""
+    run_id = get_active_run()
+    if not run_id:
+        return None
+    cache = frappe.cache()
+    running = _key(run_id, 'running')
+    for repo in cache.execute_command('ZRANGEBYSCORE', running, '-inf', time.time()) or []:
+        repo = decode(repo)
+        # Only one of us (this, the job's finally) settles a job
+        if not cache.execute_command('ZREM', running, repo):
+            continue
+        if decode(cache.execute_command('GET', _key('queued', repo))) == run_id:
+            cache.execute_command('DEL', _key('queued', repo))
+        frappe.log_error(
+            message=f'The sync job of {repo} in run {run_id} did not finish within its timeout',
+            title=f'GitHub Sync Error - {repo}',
+        )
+        _record(run_id, repo, 'failed')
+    if get_active_run() != run_id:
+        return run_id
+    if cache.execute_command('LLEN', _key(run_id, 'pending')):
+        _touch(run_id)
+    for _ in range(get_concurrency() - int(cache.execute_command('ZCARD', running) or 0)):
+        if not _enqueue_next(run_id):
+            break
+    return run_id
+
+def _touch(run_id):
+    if get_active_run() == run_id:
+        frappe.cache().execute_command('EXPIRE', _key('active'), _lease())
+
+def _record(run_id, repo, status):
+    _touch(run_id)
+    pipe = frappe.cache().pipeline(transaction=False)
+    pipe.execute_command('HINCRBY', _key(run_id), status, 1)
+    pipe.execute_command('HINCRBY', _key(run_id), 'done', 1)
+    pipe.execute()
+    progress = _publish(run_id, repo=repo, status=status)
+    if progress and progress['done'] >= progress['total']:
+        _finish(run_id)
+
+def _publish(run_id, **message):
+    status = get_run_status(run_id)
+    if not status:
+        return None
+    message.update(status, progress=status['done'])
+    frappe.publish_realtime(event='github_sync_progress', message=message)
+    return status
+
+def _finish(run_id):
+    cache = frappe.cache()
+    # Several callers may see the last count; only the first one finishes the run
+    if not cache.execute_command('HSETNX', _key(run_id), 'finished', time.time()):
+        return
+    if get_active_run() == run_id:
+        cache.execute_command('DEL', _key('active'))
+    frappe.db.set_single_value('GitHub Settings', 'last_sync', frappe.utils.now())
+    frappe.db.commit()
+    _publish(run_id, msg='completed')
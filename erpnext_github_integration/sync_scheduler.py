@@ -0,0 +1,152 @@
+import math, time
+import frappe
+from .utils import cache_key, decode, hgetall
+
+# Activity-aware background sync (scheduler_events, every 5 minutes).
+#
+# Each repository gets an interval from ``GitHub Settings.sync_interval_minutes``
+# scaled by how busy it is: webhook deliveries over the last day (decayed,
+# pushes weigh most), open pull requests and the age of its newest branch
+# head. Repositories are ranked by staleness / interval; the ones overdue
+# (>= 1) are handed to sync_queue most overdue first until the estimated
+# cost reaches what is left of the hourly request budget.
+
+ACTIVITY_PREFIX = "github_sync_activity"
+ACTIVITY_HOURS = 24
+ACTIVITY_HALF_LIFE_HOURS = 6
+EVENT_WEIGHTS = {'push': 3, 'pull_request': 2, 'issues': 1}
+MIN_INTERVAL_MINUTES = 5
+QUIET_FACTOR = 4
+DORMANT_FACTOR = 24
+DEFAULT_COST = 10
+
+def _key(*parts):
+    return cache_key(ACTIVITY_PREFIX, *parts)
+
+def _hour(ts=None):
+    return int((ts or time.time()) // 3600)
+
+def record_activity(repo_full, event):
+    """Count a webhook delivery towards the repository's activity; never raises"""
+    try:
+        key = _key('hour', str(_hour()))
+        pipe = frappe.cache().pipeline(transaction=False)
+        pipe.execute_command('ZINCRBY', key, EVENT_WEIGHTS.get(event, 1), repo_full)
+        pipe.execute_command('EXPIRE', key, (ACTIVITY_HOURS + 1) * 3600)
+        pipe.execute()
+    except Exception:
+        pass
+
+def get_activity():
+    """``{repo: score}``: webhook weights of the last day, halving every 6 hours"""
+    now = _hour()
+    pipe = frappe.cache().pipeline(transaction=False)
+    for age in range(ACTIVITY_HOURS):
+        pipe.execute_command('ZRANGE', _key('hour', str(now - age)), 0, -1, 'WITHSCORES')
+    activity = {}
+    for age, rows in enumerate(pipe.execute()):
+        decay = 0.5 ** (age / ACTIVITY_HALF_LIFE_HOURS)
+        for repo, score in zip(rows[::2], rows[1::2], strict=True):
+            repo = decode(repo)
+            activity[repo] = activity.get(repo, 0) + float(score) * decay
+    return activity
+
+def record_cost(repo_full, result):
+    """Remember roughly how many requests a sync of ``repo_full`` took"""
+    if not isinstance(result, dict):
+        return
+    pages = sum(math.ceil((result.get(k) or 0) / 100) for k in ('branches', 'members', 'issues', 'pulls'))
+    frappe.cache().execute_command('HSET', _key('cost'), repo_full, 3 + pages)
+
+def _spend(cost):
+    key = _key('spent', str(_hour()))
+    pipe = frappe.cache().pipeline(transaction=False)
+    pipe.execute_command('INCRBY', key, int(cost))
+    pipe.execute_command('EXPIRE', key, 2 * 3600)
+    pipe.execute()
+
+def _spent():
+    return int(frappe.cache().execute_command('GET', _key('spent', str(_hour()))) or 0)
+
+def _settings():
+    settings = frappe.get_cached_doc('GitHub Settings')
+    return frappe._dict(
+        # Off until the integration itself is enabled (it is installed disabled)
+        enabled=settings.get('enabled') and settings.get('scheduled_sync'),
+        interval=max(MIN_INTERVAL_MINUTES, frappe.utils.cint(settings.get('sync_interval_minutes')) or 60),
+        budget=frappe.utils.cint(settings.get('sync_request_budget')) or 1000,
+    )
+
+def get_schedule():
+    """Every enabled repository with its heat, interval (minutes), staleness and priority, most urgent first"""
+    settings = _settings()
+    now = frappe.utils.now_datetime()
+    repos = frappe.get_all('Repository', filters={'enabled': 1}, fields=['name', 'full_name', 'last_synced'])
+    open_pulls = dict(frappe.db.sql(
+        """select repository, count(*) from `tabRepository Pull Request`
+            where state = 'open' group by repository"""
+    ))
+    last_push = dict(frappe.db.sql(
+        """select parent, max(last_updated) from `tabRepository Branch`
+            where parenttype = 'Repository' group by parent"""
+    ))
+    activity = get_activity()
+    costs = _costs()
+
+    schedule = []
+    for repo in repos:
+        score = activity.get(repo.full_name, 0)
+        pulls = open_pulls.get(repo.full_name, 0)
+        pushed = last_push.get(repo.name)
+        push_age_days = (now - pushed).total_seconds() / 86400 if pushed else None
+        if not score and not pulls and (push_age_days is None or push_age_days > 30):
+            heat = 1 / DORMANT_FACTOR
+        elif not score and (push_age_days is None or push_age_days > 7):
+            heat = 1 / QUIET_FACTOR
+        else:
+            heat = 1 + score / 10 + pulls / 20 + (1 if push_age_days is not None and push_age_days < 1 else 0)
+        interval = max(MIN_INTERVAL_MINUTES, settings.interval / heat)
+        staleness = (now - repo.last_synced).total_seconds() / 60 if repo.last_synced else None
+        schedule.append({
+            'repository': repo.full_name,
+            'heat': round(heat, 2),
+            'activity': round(score, 1),
+            'open_pulls': pulls,
+            'interval_minutes': round(interval, 1),
+            'staleness_minutes': round(staleness, 1) if staleness is not None else None,
+            # Never synced: first in line
+            'priority': round(staleness / interval, 2) if staleness is not None else float('inf'),
+            'cost': costs.get(repo.full_name, DEFAULT_COST),
+        })
+    return sorted(schedule, key=lambda r: (r['priority'], r['heat']), reverse=True)
+
+def _costs():
+    return {k: int(v) for k, v in hgetall(_key('cost')).items()}
+
+def schedule_syncs():
+    """Scheduler entry point: queue the overdue repositories that fit in this hour's budget.
+    Does nothing while the integration is disabled or has no credentials."""
+    from . import sync_queue
+    from .github_api import get_github_token
+
+    settings = _settings()
+    if not settings.enabled or not get_github_token():
+        return None
+    if sync_queue.get_active_run():
+        # The previous batch (or a manual full sync) is still running
+        return None
+
+    left = settings.budget - _spent()
+    batch, cost = [], 0
+    for entry in get_schedule():
+        if entry['priority'] < 1 or cost >= left:
+            break
+        # The most overdue repository always fits, however big it is
+        if batch and cost + entry['cost'] > left:
+            break
+        batch.append(entry['repository'])
+        cost += entry['cost']
+    if not batch:
+        return None
+    _spend(cost)
+    return sync_queue.start_run(batch)
@@ -0,0 +1,80 @@
+import frappe
+from .sync_profile import timed
+
+# Checkpoints of repository sync passes (Repository Sync State, one per
+# repository).
+#
+# A pass runs the repository, issues and pull request phases. Each page of
+# issues or pull requests is committed together with its checkpoint: issues
+# are walked oldest-updated first, so the issue watermark itself is the
+# cursor, while the newest-first pull request walk keeps the URL (REST) or
+# cursor (GraphQL) of its next page, tagged with its transport (``rest:`` /
+# ``graphql:``). A pass that was interrupted, or paused at its time budget,
+# is picked up by the next sync of the repository.
+
+DOCTYPE = 'Repository Sync State'
+
+def begin(repository, issues_since, pulls_since):
+    """Start a new pass, or resume the unfinished one; returns the state"""
+    now = frappe.utils.now()
+    state = frappe.db.get_value(DOCTYPE, repository, '*', as_dict=True)
+    if state and state.status != 'Completed':
+        values = {'status': 'Running', 'jobs': (state.jobs or 0) + 1, 'last_checkpoint': now}
+        frappe.db.set_value(DOCTYPE, repository, values)
+        state.update(values)
+        return state
+
+    values = {
+        'status': 'Running',
+        'phase': 'Repository',
+        'jobs': 1,
+        'started_at': now,
+        'last_checkpoint': now,
+        'completed_at': None,
+        'issues_since': issues_since,
+        'issues_until': issues_since,
+        'issues_count': 0,
+        'pulls_since': pulls_since,
+        'pulls_until': pulls_since,
+        'pulls_cursor': None,
+        'pulls_count': 0,
+    }
+    if state:
+        frappe.db.set_value(DOCTYPE, repository, values)
+    else:
+        frappe.get_doc(dict(values, doctype=DOCTYPE, repository=repository)).insert(ignore_permissions=True)
+    return frappe._dict(values, repository=repository)
+
+TRANSPORTS = ('rest', 'graphql')
+
+def encode_cursor(transport, cursor):
+    return f'{transport}:{cursor}' if cursor else None
+
+def decode_cursor(value):
+    """``(transport, cursor)`` of a saved ``pulls_cursor``; ``(None, None)`` without one"""
+    if not value:
+        return None, None
+    transport, sep, cursor = value.partition(':')
+    if sep and transport in TRANSPORTS:
+        return transport, cursor
+    # Saved before cursors were tagged
+    return ('rest' if value.startswith('http') else 'graphql'), value
+
+@timed('Checkpoints')
+def checkpoint(repository, **values):
+    """Save progress and commit it together with the rows written before it"""
+    values['last_checkpoint'] = frappe.utils.now()
+    frappe.db.set_value(DOCTYPE, repository, values)
+    frappe.db.commit()
+
+def pause(repository):
+    checkpoint(repository, status='Paused')
+
+def complete(repository):
+    frappe.db.set_value(DOCTYPE, repository, {
+        'status': 'Completed',
+        'phase': 'Done',
+        'pulls_cursor': None,
+        'completed_at': frappe.utils.now(),
+        'last_checkpoint': frappe.utils.now(),
+    })
@@ -0,0 +1,150 @@
+import datetime
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from erpnext_github_integration import bulk_writer
+from erpnext_github_integration.bulk_writer import BRANCH, ISSUE
+
+
+def _issue(**values):
+    row = {
+        'repository': 'octo/hello', 'issue_number': 7, 'title': 'Crash', 'body': '', 'state': 'open',
+        'labels': 'bug', 'url': 'https://github.com/octo/hello/issues/7', 'github_id': '70',
+        'created_at': '2026-01-02 03:04:05', 'updated_at': '2026-01-03 03:04:05',
+    }
+    row.update(values)
+    return row
+
+
+class TestHash(FrappeTestCase):
+    def test_stable_across_representations(self):
+        stored = _issue(body=None, updated_at=datetime.datetime(2026, 1, 3, 3, 4, 5))
+        self.assertEqual(bulk_writer._hash(ISSUE, stored, []), bulk_writer._hash(ISSUE, _issue(), []))
+
+    def test_ignores_other_fields(self):
+        self.assertEqual(
+            bulk_writer._hash(ISSUE, _issue(sync_hash='x', name='octo/hello-#7'), ['a@example.com']),
+            bulk_writer._hash(ISSUE, _issue(), ['a@example.com']),
+        )
+
+    def test_changes_with_values_and_people(self):
+        base = bulk_writer._hash(ISSUE, _issue(), ['a@example.com', 'b@example.com'])
+        self.assertNotEqual(base, bulk_writer._hash(ISSUE, _issue(state='closed'), ['a@example.com', 'b@example.com']))
+        self.assertNotEqual(base, bulk_writer._hash(ISSUE, _issue(), ['a@example.com']))
+        # Order is part of the list as stored (idx)
+        self.assertNotEqual(base, bulk_writer._hash(ISSUE, _issue(), ['b@example.com', 'a@example.com']))
+
+
+class TestReconcileTable(FrappeTestCase):
+    def setUp(self):
+        self.stored = [
+            frappe._dict(name='b1', idx=1, repo_full_name='octo/hello', branch_name='main',
+                         commit_sha='aaa', protected=1, last_updated=datetime.datetime(2026, 1, 1)),
+            frappe._dict(name='b2', idx=2, repo_full_name='octo/hello', branch_name='dev',
+                         commit_sha='bbb', protected=0, last_updated=None),
+            frappe._dict(name='b3', idx=5, repo_full_name='octo/hello', branch_name='old',
+                         commit_sha='ccc', protected=0, last_updated=None),
+        ]
+        patches = {
+            'get_all': patch.object(bulk_writer.frappe, 'get_all', side_effect=lambda *a, **k: list(self.stored)),
+            'delete': patch.object(bulk_writer.frappe.db, 'delete'),
+            'bulk_insert': patch.object(bulk_writer.frappe.db, 'bulk_insert'),
+            'upsert': patch.object(bulk_writer, '_bulk_upsert'),
+            'autoname': patch.object(bulk_writer, '_autoname', return_value='new1'),
+        }
+        self.mocks = {}
+        for key, p in patches.items():
+            self.mocks[key] = p.start()
+            self.addCleanup(p.stop)
+
+    def _reconcile(self, rows, **kwargs):
+        return bulk_writer.reconcile_table(BRANCH, 'REPO-0001', rows, **kwargs)
+
+    def test_writes_only_what_changed(self):
+        counts = self._reconcile([
+            {'branch_name': 'main', 'commit_sha': 'aaa', 'protected': True, 'last_updated': '2026-01-01 00:00:00'},
+            {'branch_name': 'dev', 'commit_sha': 'bbc'},
+            {'branch_name': 'feature', 'commit_sha': 'ddd', 'protected': False},
+        ])
+        self.assertEqual(counts, {'inserted': 1, 'updated': 1, 'deleted': 1, 'unchanged': 1})
+
+        self.mocks['delete'].assert_called_once_with('Repository Branch', {'name': ['in', ['b3']]})
+
+        (doctype, fields, updates), _kwargs = self.mocks['upsert'].call_args
+        self.assertEqual(len(updates), 1)
+        update = dict(zip(fields, updates[0], strict=True))
+        # Fields the row does not carry keep their stored values
+        self.assertEqual((update['name'], update['commit_sha'], update['repo_full_name']), ('b2', 'bbc', 'octo/hello'))
+
+        (doctype, fields, inserts), _kwargs = self.mocks['bulk_insert'].call_args
+        insert = dict(zip(fields, inserts[0], strict=True))
+        self.assertEqual(insert['name'], 'new1')
+        self.assertEqual((insert['parent'], insert['parentfield'], insert['idx']), ('REPO-0001', 'branches_table', 6))
+        self.assertEqual(insert['branch_name'], 'feature')
+
+    def test_keeps_missing_rows_when_asked(self):
+        counts = self._reconcile([{'branch_name': 'main', 'commit_sha': 'aaa'}], delete_missing=False)
+        self.assertEqual(counts, {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 1})
+        self.mocks['delete'].assert_not_called()
+        self.mocks['upsert'].assert_not_called()
+        self.mocks['bulk_insert'].assert_not_called()
+
+    def test_drops_duplicates_and_repeated_keys(self):
+        self.stored.append(frappe._dict(name='b4', idx=6, repo_full_name='octo/hello', branch_name='main',
+                                        commit_sha='aaa', protected=1, last_updated=None))
+        counts = self._reconcile([
+            {'branch_name': 'main', 'commit_sha': 'aaa'},
+            {'branch_name': 'main', 'commit_sha': 'zzz'},
+            {'branch_name': ''},
+        ], delete_missing=False)
+        self.assertEqual(counts, {'inserted': 0, 'updated': 0, 'deleted': 1, 'unchanged': 1})
+        self.mocks['delete'].assert_called_once_with('Repository Branch', {'name': ['in', ['b4']]})
+
+
+class TestChunkedWriter(FrappeTestCase):
+    def setUp(self):
+        self.written = []
+        self.checkpoints = []
+        patches = [
+            patch.object(bulk_writer.frappe.db, 'savepoint'),
+            patch.object(bulk_writer.frappe.db, 'rollback'),
+            patch.object(bulk_writer.frappe.db, 'commit'),
+            patch.object(bulk_writer.frappe, 'log_error'),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _write(self, records):
+        if any(r.get('fail') for r in records):
+            raise frappe.ValidationError('bad record')
+        self.written.extend(r['number'] for r in records)
+        return {'updated': len(records)}
+
+    def _writer(self):
+        return bulk_writer.ChunkedWriter(self._write, batch_size=3)
+
+    def test_checkpoint_runs_after_a_clean_chunk(self):
+        writer = self._writer()
+        writer.add([{'number': 1}, {'number': 2}, {'number': 3}], checkpoint=lambda: self.checkpoints.append(1))
+        self.assertEqual(self.written, [1, 2, 3])
+        self.assertEqual(self.checkpoints, [1])
+
+    def test_failed_record_holds_the_checkpoint(self):
+        writer = self._writer()
+        writer.add([
+            {'number': 1, 'updated_at': '2026-10-17T10:00:00Z'},
+            {'number': 2, 'updated_at': '2026-10-17T10:00:01Z', 'fail': True},
+            {'number': 3, 'updated_at': '2026-10-17T10:00:02Z'},
+        ], checkpoint=lambda: self.checkpoints.append(1))
+        # The rest of the chunk is kept, but progress does not move past record 2
+        self.assertEqual(self.written, [1, 3])
+        self.assertEqual(self.checkpoints, [])
+        self.assertEqual(writer.stats['errors'], 1)
+        self.assertEqual(writer.failed_since, '2026-10-17T10:00:01Z')
+
+        writer.add([{'number': 4}, {'number': 5}, {'number': 6}], checkpoint=lambda: self.checkpoints.append(2))
+        self.assertEqual(self.written, [1, 3, 4, 5, 6])
+        self.assertEqual(self.checkpoints, [])
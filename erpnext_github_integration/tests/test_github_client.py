@@ -0,0 +1,140 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import requests
+from frappe.tests.utils import FrappeTestCase
+
+from erpnext_github_integration import github_client
+
+API = "https://api.github.com/repos/octo/hello/issues"
+
+
+def _links(next_page, last_page, query='state=all&per_page=100'):
+    return {
+        'next': f'{API}?{query}&page={next_page}',
+        'last': f'{API}?{query}&page={last_page}',
+    }
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200, headers=None):
+        self.body = body
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = b'x'
+        self.text = ''
+
+    def json(self):
+        return self.body
+
+
+class TestRemainingPageUrls(FrappeTestCase):
+    def test_builds_every_page_up_to_last(self):
+        urls = github_client._remaining_page_urls(_links(2, 4))
+        self.assertEqual(urls, [
+            f'{API}?state=all&per_page=100&page=2',
+            f'{API}?state=all&per_page=100&page=3',
+            f'{API}?state=all&per_page=100&page=4',
+        ])
+
+    def test_keeps_the_other_parameters(self):
+        urls = github_client._remaining_page_urls(_links(3, 3, query='labels=&since=2026-01-01'))
+        self.assertEqual(urls, [f'{API}?labels=&since=2026-01-01&page=3'])
+
+    def test_cursor_pagination_is_walked_serially(self):
+        links = {'next': f'{API}?after=Y3Vyc29y', 'last': f'{API}?before=Y3Vyc29y'}
+        self.assertEqual(github_client._remaining_page_urls(links), [])
+
+    def test_without_last_link(self):
+        self.assertEqual(github_client._remaining_page_urls({'next': f'{API}?page=2'}), [])
+        self.assertEqual(github_client._remaining_page_urls(github_client._parse_link_header('')), [])
+
+    def test_parses_link_header(self):
+        header = f'<{API}?page=2>; rel="next", <{API}?page=9>; rel="last"'
+        urls = github_client._remaining_page_urls(github_client._parse_link_header(header))
+        self.assertEqual(len(urls), 8)
+        self.assertTrue(urls[-1].endswith('page=9'))
+
+
+class TestPageWorkers(FrappeTestCase):
+    def _workers(self, remaining, pages_left, conf=None):
+        headers = {} if remaining is None else {'X-RateLimit-Remaining': str(remaining)}
+        with patch.object(github_client.frappe.local, 'conf', conf or {}, create=True):
+            return github_client._page_workers(FakeResponse([], headers=headers), pages_left)
+
+    def test_default_cap(self):
+        self.assertEqual(self._workers(5000, 50), github_client.DEFAULT_PAGINATION_WORKERS)
+
+    def test_configured_cap(self):
+        self.assertEqual(self._workers(5000, 50, {'github_pagination_workers': 8}), 8)
+
+    def test_never_more_than_pages_left(self):
+        self.assertEqual(self._workers(5000, 2), 2)
+
+    def test_serial_close_to_the_limit(self):
+        self.assertEqual(self._workers(github_client.PAGINATION_RATE_RESERVE + 10, 20), 1)
+
+    def test_scaled_by_budget(self):
+        reserve = github_client.PAGINATION_RATE_RESERVE
+        self.assertEqual(self._workers(2 * reserve + 10, 10), 2)
+
+    def test_unknown_budget(self):
+        self.assertEqual(self._workers(None, 10), github_client.DEFAULT_PAGINATION_WORKERS)
+
+
+class TestFetchPagesConcurrently(FrappeTestCase):
+    def setUp(self):
+        self.urls = github_client._remaining_page_urls(_links(2, 7))
+        self.session = MagicMock()
+        self.lock = threading.Lock()
+        self.in_flight = self.max_in_flight = 0
+        patches = [
+            patch.object(github_client, 'get_session', return_value=self.session),
+            patch.object(github_client, '_prepare_conditional', side_effect=lambda url, headers: (headers, None)),
+            patch.object(github_client.github_cache, 'store_conditional'),
+            patch.object(github_client.github_metrics, 'record_request'),
+            patch.object(github_client.retry_policy, 'check_circuit', return_value=0),
+            patch.object(github_client.retry_policy, 'record_failure'),
+            patch.object(github_client.retry_policy, 'record_success'),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _get(self, url, headers=None, timeout=None):
+        page = int(url.rsplit('=', 1)[1])
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        # Earlier pages answer last, so completion order differs from page order
+        time.sleep(0.01 * (10 - page))
+        with self.lock:
+            self.in_flight -= 1
+        if page in getattr(self, 'failing', ()):
+            raise requests.exceptions.ConnectionError('reset')
+        return FakeResponse([{'page': page}])
+
+    def _fetch(self, workers=3):
+        self.session.get.side_effect = self._get
+        return list(github_client._fetch_pages_concurrently(self.urls, {}, workers, MagicMock()))
+
+    def test_yields_in_page_order(self):
+        fetched = self._fetch()
+        self.assertEqual([url for url, _data in fetched], self.urls)
+        self.assertEqual([data[0]['page'] for _url, data in fetched], [2, 3, 4, 5, 6, 7])
+
+    def test_bounded_by_workers(self):
+        self._fetch(workers=2)
+        self.assertLessEqual(self.max_in_flight, 2)
+
+    def test_failed_page_falls_back_to_serial_fetch(self):
+        self.failing = {4}
+        serial = FakeResponse([{'page': 4, 'serial': True}])
+        with patch.object(github_client, '_get_page', return_value=(serial, serial.body, None)) as get_page:
+            fetched = self._fetch()
+        get_page.assert_called_once()
+        self.assertEqual(get_page.call_args[0][0], self.urls[2])
+        self.assertEqual([data[0]['page'] for _url, data in fetched], [2, 3, 4, 5, 6, 7])
+        self.assertTrue(fetched[2][1][0]['serial'])
+        github_client.retry_policy.record_failure.assert_called_once()
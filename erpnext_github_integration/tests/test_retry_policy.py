@@ -0,0 +1,151 @@
+import time
+from unittest.mock import patch
+
+import frappe
+import requests
+from frappe.tests.utils import FrappeTestCase
+
+from erpnext_github_integration import retry_policy
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None, text=''):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = text
+
+
+class TestEndpointTemplate(FrappeTestCase):
+    def test_repository_paths(self):
+        self.assertEqual(
+            retry_policy.endpoint_template('https://api.github.com/repos/acme/api/issues/42?per_page=100'),
+            '/repos/{owner}/{repo}/issues/{number}',
+        )
+        self.assertEqual(
+            retry_policy.endpoint_template('/repos/acme/api/commits/' + 'a1' * 20),
+            '/repos/{owner}/{repo}/commits/{sha}',
+        )
+
+    def test_users_and_orgs(self):
+        self.assertEqual(retry_policy.endpoint_template('/users/octocat'), '/users/{login}')
+        self.assertEqual(retry_policy.endpoint_template('/orgs/acme/repos'), '/orgs/{org}/repos')
+
+    def test_enterprise_prefix(self):
+        self.assertEqual(
+            retry_policy.endpoint_template('https://ghe.example.com/api/v3/repos/acme/api/pulls'),
+            '/repos/{owner}/{repo}/pulls',
+        )
+        self.assertEqual(retry_policy.endpoint_template('https://ghe.example.com/api/graphql'), '/graphql')
+
+
+class TestIsRetryable(FrappeTestCase):
+    def test_server_errors_only_for_idempotent_requests(self):
+        self.assertTrue(retry_policy.is_retryable(FakeResponse(502), method='GET'))
+        self.assertFalse(retry_policy.is_retryable(FakeResponse(502), method='POST', url='/repos/a/b/issues'))
+        self.assertTrue(retry_policy.is_retryable(FakeResponse(502), method='POST', url='https://api.github.com/graphql'))
+        self.assertFalse(retry_policy.is_retryable(FakeResponse(404), method='GET'))
+
+    def test_secondary_rate_limits_for_any_method(self):
+        self.assertTrue(retry_policy.is_retryable(FakeResponse(429), method='POST'))
+        self.assertTrue(retry_policy.is_retryable(FakeResponse(403, {'Retry-After': '30'}), method='PATCH'))
+        self.assertTrue(retry_policy.is_retryable(
+            FakeResponse(403, text='You have exceeded a secondary rate limit'), method='POST'
+        ))
+        self.assertFalse(retry_policy.is_retryable(FakeResponse(403, text='Resource not accessible'), method='GET'))
+
+    def test_network_errors(self):
+        connect = requests.exceptions.ConnectTimeout()
+        read = requests.exceptions.ReadTimeout()
+        self.assertTrue(retry_policy.is_retryable(error=connect, method='POST'))
+        self.assertTrue(retry_policy.is_retryable(error=read, method='GET'))
+        self.assertFalse(retry_policy.is_retryable(error=read, method='POST'))
+        self.assertFalse(retry_policy.is_retryable(error=ValueError(), method='GET'))
+
+
+class TestRetryDelay(FrappeTestCase):
+    def test_retry_after_seconds(self):
+        self.assertEqual(retry_policy.retry_delay(0, FakeResponse(429, {'Retry-After': '17'})), 17)
+
+    def test_retry_after_date(self):
+        date = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(time.time() + 120))
+        delay = retry_policy.retry_delay(0, FakeResponse(503, {'Retry-After': date}))
+        self.assertTrue(100 <= delay <= 120)
+
+    def test_secondary_limit_without_retry_after(self):
+        resp = FakeResponse(403, text='secondary rate limit')
+        self.assertEqual(retry_policy.retry_delay(0, resp), retry_policy.SECONDARY_LIMIT_DELAY)
+
+    def test_only_waits_taken_are_counted(self):
+        resp = FakeResponse(429, {'Retry-After': '17'})
+        before = retry_policy.get_retry_stats()['retry_after_waits']
+        retry_policy.retry_delay(0, resp)
+        self.assertEqual(retry_policy.get_retry_stats()['retry_after_waits'], before)
+        retry_policy.record_attempt(resp)
+        self.assertEqual(retry_policy.get_retry_stats()['retry_after_waits'], before + 1)
+
+    def test_full_jitter_capped(self):
+        conf = {'github_retry_base_delay': 2, 'github_retry_max_delay': 10}
+        with patch.object(frappe.local, 'conf', conf, create=True):
+            for attempt in range(6):
+                delays = [retry_policy.retry_delay(attempt, FakeResponse(502)) for _ in range(50)]
+                self.assertTrue(all(0 <= d <= min(10, 2 * 2 ** attempt) for d in delays))
+
+
+class TestCircuitBreaker(FrappeTestCase):
+    def setUp(self):
+        self.endpoint = f'/test/{frappe.generate_hash(length=10)}'
+        conf = dict(frappe.local.conf or {}, github_circuit_failure_threshold=3, github_circuit_cooldown=30)
+        patcher = patch.object(frappe.local, 'conf', frappe._dict(conf))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self._clear)
+
+    def _clear(self):
+        cache = frappe.cache()
+        cache.execute_command('DEL', *retry_policy._circuit_keys(self.endpoint))
+        cache.execute_command('SREM', retry_policy._index_key(), self.endpoint)
+
+    def _state(self):
+        for status in retry_policy.get_circuit_status():
+            if status['endpoint'] == self.endpoint:
+                return status['state']
+        return None
+
+    def _open_until(self, seconds):
+        # Move the end of the cool-down instead of waiting for it
+        frappe.cache().execute_command('SET', retry_policy._circuit_keys(self.endpoint)[0], time.time() + seconds)
+
+    def test_opens_at_the_threshold(self):
+        retry_policy.record_failure(self.endpoint)
+        self.assertEqual(retry_policy.check_circuit(self.endpoint), 1)
+        self.assertEqual(self._state(), 'closed')
+
+        for _ in range(2):
+            retry_policy.record_failure(self.endpoint)
+        self.assertEqual(self._state(), 'open')
+        with self.assertRaises(retry_policy.GitHubCircuitOpenError) as raised:
+            retry_policy.check_circuit(self.endpoint)
+        self.assertEqual(raised.exception.endpoint, self.endpoint)
+        self.assertTrue(0 < raised.exception.retry_after <= 30)
+
+    def test_half_open_failure_reopens(self):
+        for _ in range(3):
+            retry_policy.record_failure(self.endpoint)
+        self._open_until(-1)
+        self.assertEqual(self._state(), 'half-open')
+        failures = retry_policy.check_circuit(self.endpoint)
+        self.assertEqual(failures, 2)
+
+        retry_policy.record_failure(self.endpoint)
+        self.assertEqual(self._state(), 'open')
+
+    def test_half_open_success_closes(self):
+        for _ in range(3):
+            retry_policy.record_failure(self.endpoint)
+        self._open_until(-1)
+        failures = retry_policy.check_circuit(self.endpoint)
+
+        retry_policy.record_success(self.endpoint, failures)
+        self.assertEqual(retry_policy.check_circuit(self.endpoint), 0)
+        retry_policy.record_failure(self.endpoint)
+        self.assertEqual(self._state(), 'closed')
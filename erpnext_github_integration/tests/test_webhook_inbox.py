@@ -0,0 +1,136 @@
+import json
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from erpnext_github_integration import webhook_inbox
+
+
+def _delivery(name, action, updated_at, event='issues', number=7):
+    kind = webhook_inbox.COALESCED_EVENTS[event]
+    payload = {'action': action, kind: {'number': number, 'updated_at': updated_at}}
+    return frappe._dict(
+        name=name, delivery_id=f'id-{name}', event=event, action=action, repo_full_name='octo/hello',
+        coalesce_key=f'octo/hello|{kind}|{number}', payload=json.dumps(payload),
+        received_at=frappe.utils.now_datetime(), attempts=1,
+    )
+
+
+class TestCoalescing(FrappeTestCase):
+    def setUp(self):
+        self.status = 'Processed'
+        self.applied = []
+        patches = {
+            'process': patch.object(webhook_inbox, '_process', side_effect=self._process),
+            'set_value': patch.object(webhook_inbox.frappe.db, 'set_value'),
+            'get_value': patch.object(webhook_inbox.frappe.db, 'get_value', return_value='2026-10-17 10:00:00'),
+            'commit': patch.object(webhook_inbox.frappe.db, 'commit'),
+            'count': patch.object(webhook_inbox, '_count_coalesced'),
+            'forget': patch.object(webhook_inbox.webhook_dedupe, 'forget'),
+        }
+        self.mocks = {}
+        for key, p in patches.items():
+            self.mocks[key] = p.start()
+            self.addCleanup(p.stop)
+
+    def _process(self, row, data=None):
+        self.applied.append((row.name, data))
+        return self.status
+
+    def _statuses(self):
+        return {args[1]: args[2] for args, _kwargs in self.mocks['set_value'].call_args_list}
+
+    def test_newest_payload_is_applied_once(self):
+        group = [
+            _delivery('d1', 'opened', '2026-10-17T10:00:00Z'),
+            _delivery('d2', 'edited', '2026-10-17T10:00:03Z'),
+            _delivery('d3', 'closed', '2026-10-17T10:00:02Z'),
+        ]
+        webhook_inbox._process_group(group)
+
+        self.assertEqual([name for name, _data in self.applied], ['d2'])
+        self.assertEqual(self.applied[0][1]['action'], 'edited')
+        statuses = self._statuses()
+        self.assertEqual(set(statuses), {'d1', 'd3'})
+        self.assertTrue(all(s['status'] == 'Coalesced' and s['coalesced_into'] == 'd2' for s in statuses.values()))
+        self.mocks['count'].assert_called_once_with('issues', 2)
+
+    def test_ties_go_to_the_later_delivery(self):
+        group = [_delivery('d1', 'edited', '2026-10-17T10:00:00Z'), _delivery('d2', 'closed', '2026-10-17T10:00:00Z')]
+        webhook_inbox._process_group(group)
+        self.assertEqual([name for name, _data in self.applied], ['d2'])
+
+    def test_unhandled_action_takes_the_latest_handled_one(self):
+        group = [
+            _delivery('d1', 'edited', '2026-10-17T10:00:00Z', event='pull_request'),
+            _delivery('d2', 'labeled', '2026-10-17T10:00:05Z', event='pull_request'),
+        ]
+        webhook_inbox._process_group(group)
+
+        name, data = self.applied[0]
+        self.assertEqual(name, 'd2')
+        self.assertEqual(data['action'], 'edited')
+        self.assertEqual(data['pull_request']['updated_at'], '2026-10-17T10:00:05Z')
+
+    def test_single_delivery_is_applied_as_is(self):
+        webhook_inbox._process_group([_delivery('d1', 'labeled', '2026-10-17T10:00:00Z')])
+        self.assertEqual(self.applied, [('d1', None)])
+        self.mocks['set_value'].assert_not_called()
+        self.mocks['count'].assert_not_called()
+
+    def test_retried_group_is_requeued_together(self):
+        self.status = 'Queued'
+        group = [_delivery('d1', 'opened', '2026-10-17T10:00:00Z'), _delivery('d2', 'edited', '2026-10-17T10:00:01Z')]
+        webhook_inbox._process_group(group)
+
+        self.assertEqual(
+            self._statuses(), {'d1': {'status': 'Queued', 'worker': None, 'retry_at': '2026-10-17 10:00:00'}}
+        )
+        self.mocks['count'].assert_not_called()
+
+    def test_failed_group_releases_every_delivery(self):
+        self.status = 'Failed'
+        group = [_delivery('d1', 'opened', '2026-10-17T10:00:00Z'), _delivery('d2', 'edited', '2026-10-17T10:00:01Z')]
+        webhook_inbox._process_group(group)
+
+        self.assertEqual(self._statuses()['d1']['status'], 'Failed')
+        self.mocks['forget'].assert_called_once_with('id-d1')
+        self.mocks['count'].assert_not_called()
+
+    def test_batch_keeps_arrival_order(self):
+        other = frappe._dict(name='p1', event='push', coalesce_key=None)
+        rows = [
+            _delivery('d1', 'opened', '2026-10-17T10:00:00Z'),
+            other,
+            _delivery('d2', 'edited', '2026-10-17T10:00:01Z'),
+        ]
+        webhook_inbox._process_batch(rows)
+        # The issue group is applied at its last delivery, after the push
+        self.assertEqual([name for name, _data in self.applied], ['p1', 'd2'])
+
+
+class TestDrain(FrappeTestCase):
+    def setUp(self):
+        self.claims = [[frappe._dict(name='d1')], [frappe._dict(name='d2')]]
+        patches = {
+            'claim': patch.object(webhook_inbox, '_claim', side_effect=lambda *a: self.claims.pop(0) if self.claims else []),
+            'queued': patch.object(webhook_inbox, '_queued', side_effect=lambda *a: bool(self.claims)),
+            'batch': patch.object(webhook_inbox, '_process_batch'),
+            'enqueue': patch.object(webhook_inbox, '_enqueue_drainer'),
+        }
+        self.mocks = {}
+        for key, p in patches.items():
+            self.mocks[key] = p.start()
+            self.addCleanup(p.stop)
+
+    def test_drains_until_empty(self):
+        webhook_inbox.drain(0)
+        self.assertEqual(self.mocks['batch'].call_count, 2)
+        self.mocks['enqueue'].assert_not_called()
+
+    def test_hands_over_to_a_new_job_after_the_time_limit(self):
+        with patch.object(webhook_inbox, 'DRAIN_SECONDS', -1):
+            webhook_inbox.drain(0)
+        self.mocks['batch'].assert_not_called()
+        self.mocks['enqueue'].assert_called_once_with(0)
@@ -0,0 +1,184 @@
+import random, time
+from urllib.parse import urlsplit
+import frappe
+from frappe import _
+from dateutil import parser
+from . import rate_limit
+
+# Pool of GitHub credentials: the Personal Access Token of GitHub Settings
+# plus every enabled row of its Credentials table (more PATs and/or GitHub
+# App installations, optionally restricted to one organization).
+#
+# Each credential has its own shared rate limit bucket (see rate_limit.py);
+# get_token hands out the one with the most budget left, so concurrent sync
+# jobs spread across the pool without any coordination. Calls about the
+# authenticated user (``/user``, ``/user/repos``, ...) answer differently
+# per credential, so they always use the Settings PAT (primary_token).
+
+APP_TOKEN_PREFIX = "github_app_installation_token"
+# Installation tokens live for an hour; renew them a little before that
+APP_TOKEN_RENEW_MARGIN = 300
+# How long a job or request reuses the resolved pool before reading it again
+POOL_REFRESH_SECONDS = 300
+
+def _settings():
+    return frappe.get_cached_doc('GitHub Settings')
+
+def _path_parts(path):
+    parts = [p for p in urlsplit(path or '').path.split('/') if p]
+    if parts and parts[0] == 'api':
+        # GitHub Enterprise Server: /api/v3/...
+        parts = parts[2:] if len(parts) > 1 and parts[1] == 'v3' else parts[1:]
+    return parts
+
+def organization_for_path(path):
+    """Owner/organization a REST path belongs to, if it names one"""
+    parts = _path_parts(path)
+    if len(parts) >= 2 and parts[0] in ('repos', 'orgs', 'users'):
+        return parts[1]
+    return None
+
+def is_user_scoped(path):
+    """True for ``/user`` endpoints, whose answer depends on the credential"""
+    parts = _path_parts(path)
+    return bool(parts) and parts[0] == 'user'
+
+def _installation_token(row):
+    """Mint (or reuse) an installation access token for a GitHub App row"""
+    key = f"{APP_TOKEN_PREFIX}|{row.app_id}|{row.installation_id}"
+    token = frappe.cache().get_value(key)
+    if token:
+        return token
+
+    import jwt
+    from .github_client import get_api_base, get_session
+
+    now = int(time.time())
+    app_jwt = jwt.encode(
+        {'iat': now - 60, 'exp': now + 540, 'iss': str(row.app_id)},
+        row.get_password('private_key'),
+        algorithm='RS256',
+    )
+    resp = get_session().post(
+        f"{get_api_base()}/app/installations/{row.installation_id}/access_tokens",
+        headers={
+            "Authorization": f"Bearer {app_jwt}",
+            "Accept": "application/vnd.github.v3+json",
+            "User-Agent": "erpnext-github-integration"
+        },
+        timeout=30,
+    )
+    resp.raise_for_status()
+    body = resp.json()
+    token = body.get('token')
+    expires_in = 3600
+    if body.get('expires_at'):
+        expires_in = int(parser.parse(body['expires_at']).timestamp()) - now
+    frappe.cache().set_value(key, token, expires_in_sec=max(60, expires_in - APP_TOKEN_RENEW_MARGIN))
+    return token
+
+def get_pool(organization=None):
+    """Tokens usable for ``organization``: unrestricted credentials plus the ones bound to it"""
+    cache = getattr(frappe.local, 'github_token_pool', None)
+    if cache is None:
+        cache = frappe.local.github_token_pool = {}
+    resolved_at, tokens = cache.get(organization, (0, None))
+    if tokens is not None and time.time() - resolved_at < POOL_REFRESH_SECONDS:
+        return tokens
+
+    settings = _settings()
+    tokens = []
+    legacy = settings.get_password('personal_access_token', raise_exception=False)
+    if legacy:
+        tokens.append(legacy)
+
+    for row in settings.get('credentials') or []:
+        if not row.enabled:
+            continue
+        if row.organization and (not organization or row.organization.lower() != organization.lower()):
+            continue
+        try:
+            if row.credential_type == 'GitHub App Installation':
+                token = _installation_token(row)
+            else:
+                token = row.get_password('token', raise_exception=False)
+        except Exception:
+            frappe.log_error(frappe.get_traceback(), f"GitHub Credential {row.label}")
+            continue
+        if token and token not in tokens:
+            tokens.append(token)
+
+    cache[organization] = (time.time(), tokens)
+    return tokens
+
+def _available(token, resource):
+    budget = rate_limit.get_budget(token, resource)
+    if budget['remaining'] is None or (budget['reset'] and budget['reset'] <= time.time()):
+        # Unknown or already reset: assume a full window
+        return budget['limit'] or 5000
+    return budget['remaining']
+
+def get_token(organization=None, resource='core', exclude=None):
+    """Return the pooled token with the most rate limit budget left, or None if none is configured"""
+    tokens = [t for t in get_pool(organization) if t not in (exclude or ())]
+    if not tokens:
+        return None
+    if len(tokens) == 1:
+        return tokens[0]
+
+    try:
+        scored = [(_available(t, resource), t) for t in tokens]
+    except Exception:
+        return random.choice(tokens)
+    best = max(score for score, _t in scored)
+    # Break near-ties randomly so concurrent jobs don't all pick the same token
+    return random.choice([t for score, t in scored if score >= best * 0.9])
+
+def primary_token():
+    """The Personal Access Token of GitHub Settings, for ``/user`` calls.
+
+    Falls back to the pool when only Credentials rows are configured.
+    """
+    return _settings().get_password('personal_access_token', raise_exception=False) or get_token()
+
+def require_token(organization=None):
+    token = get_token(organization)
+    if not token:
+        frappe.throw(_('GitHub Personal Access Token not configured in GitHub Settings'))
+    return token
+
+def alternative_token(token, organization=None, resource='core'):
+    """Another pooled token that still has budget, to rotate to when ``token`` runs low"""
+    candidate = get_token(organization, resource=resource, exclude=[token])
+    if candidate and _available(candidate, resource) > 0:
+        return candidate
+    return None
+
+def get_pool_status():
+    """Rate limit state of every pooled credential, without revealing the tokens"""
+    settings = _settings()
+    labels = []
+    if settings.get_password('personal_access_token', raise_exception=False):
+        labels.append((_('Personal Access Token'), None, settings.get_password('personal_access_token')))
+    for row in settings.get('credentials') or []:
+        if not row.enabled:
+            continue
+        try:
+            token = (
+                _installation_token(row) if row.credential_type == 'GitHub App Installation'
+                else row.get_password('token', raise_exception=False)
+            )
+        except Exception:
+            token = None
+        labels.append((row.label, row.organization, token))
+
+    status = []
+    for label, organization, token in labels:
+        entry = {'label': label, 'organization': organization, 'available': bool(token)}
+        if token:
+            entry['fingerprint'] = rate_limit.token_fingerprint(token)
+            entry.update({
+                resource: rate_limit.get_budget(token, resource) for resource in ('core', 'search', 'graphql')
+            })
+        status.append(entry)
+    return status
@@ -0,0 +1,27 @@
+import frappe
+
+# Helpers shared by the modules that keep their knobs in site config and
+# their state in Redis.
+
+def get_conf(key, default=None):
+    """``key`` of site config, or ``default`` when it is not set"""
+    conf = getattr(frappe.local, 'conf', None) or {}
+    value = conf.get(key)
+    return default if value is None else value
+
+def cache_key(prefix, *parts):
+    """Site scoped Redis key ``prefix|part|...``"""
+    return frappe.cache().make_key('|'.join((prefix, *parts)))
+
+def decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+def hgetall(key):
+    """Hash stored at ``key`` with str fields and values.
+
+    Raw HGETALL: RedisWrapper.hgetall would try to unpickle plain counters.
+    """
+    raw = frappe.cache().execute_command('HGETALL', key) or {}
+    if isinstance(raw, list):
+        raw = dict(zip(raw[::2], raw[1::2], strict=True))
+    return {decode(k): decode(v) for k, v in raw.items()}
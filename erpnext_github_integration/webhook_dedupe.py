@@ -0,0 +1,66 @@
+import frappe
+from .utils import cache_key, get_conf, hgetall
+
+# Idempotency of GitHub webhook deliveries by ``X-GitHub-Delivery``.
+#
+# Every accepted delivery id is kept in Redis for
+# ``github_webhook_dedupe_ttl`` seconds (default 3 days, as long as GitHub
+# offers redelivery). The endpoint looks the id up before anything else
+# and drops known ones; after the signature is verified it claims the id
+# with ``SET NX``, so of two redeliveries racing only one gets through and
+# unsigned requests never add ids. A delivery that failed is forgotten, so
+# a manual redelivery is applied again.
+
+DEDUPE_PREFIX = "github_webhook_delivery"
+DEFAULT_TTL = 3 * 24 * 3600
+
+def _key(*parts):
+    return cache_key(DEDUPE_PREFIX, *parts)
+
+def seen(delivery_id):
+    """True (and counted as a duplicate) if ``delivery_id`` was already accepted"""
+    if not delivery_id:
+        return False
+    try:
+        if not frappe.cache().execute_command('EXISTS', _key(delivery_id)):
+            return False
+    except Exception:
+        # Without Redis every delivery is processed, as before
+        return False
+    _count('duplicates')
+    return True
+
+def claim(delivery_id):
+    """Record ``delivery_id`` as accepted; False (counted as a duplicate) if it already was"""
+    if not delivery_id:
+        return True
+    ttl = max(60, frappe.utils.cint(get_conf('github_webhook_dedupe_ttl', DEFAULT_TTL)))
+    try:
+        claimed = frappe.cache().execute_command('SET', _key(delivery_id), 1, 'NX', 'EX', ttl)
+    except Exception:
+        return True
+    if not claimed:
+        _count('duplicates')
+        return False
+    _count('accepted')
+    return True
+
+def forget(delivery_id):
+    """Let a redelivery of ``delivery_id`` through again (its processing failed)"""
+    if not delivery_id:
+        return
+    try:
+        frappe.cache().execute_command('DEL', _key(delivery_id))
+    except Exception:
+        pass
+
+def _count(field):
+    try:
+        frappe.cache().execute_command('HINCRBY', _key('stats'), field, 1)
+    except Exception:
+        pass
+
+def get_stats():
+    """``accepted`` delivery ids and ``duplicates`` dropped since the counters were created"""
+    stats = {k: int(v) for k, v in hgetall(_key('stats')).items()}
+    return {'accepted': stats.get('accepted', 0), 'duplicates': stats.get('duplicates', 0)}
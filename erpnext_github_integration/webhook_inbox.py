@@ -0,0 +1,361 @@
+import json, time, zlib
+import frappe
+from . import webhook_dedupe
+from .utils import cache_key, get_conf, hgetall
+
+# Durable inbox of GitHub webhook deliveries.
+#
+# The endpoint only verifies the signature, stores the raw delivery as a
+# GitHub Webhook Delivery (status Queued) and answers 202; background
+# drainers apply the deliveries. Each delivery gets a partition from its
+# repository, and the partitions are split over ``github_webhook_workers``
+# drainer slots (default 2): one drainer per slot, so the deliveries of a
+# repository are applied one at a time in the order they arrived while
+# different repositories are processed in parallel.
+#
+# A drainer is enqueued (queue ``github_webhook_queue``, default ``short``)
+# when a delivery arrives and its slot is idle. It claims the oldest queued
+# deliveries of its slot in small batches until none is left, or for at
+# most ``DRAIN_SECONDS`` (well inside the queue's job timeout), after which
+# it hands the slot over to a fresh drainer job. Every minute
+# ``recover`` puts back deliveries whose drainer died and starts drainers
+# for anything due.
+#
+# A delivery whose handler fails is rolled back and queued again after
+# ``RETRY_BACKOFF_SECONDS`` times its attempts; after ``MAX_ATTEMPTS`` it
+# ends as Failed.
+#
+# Issue and pull request deliveries are coalesced: they carry a key
+# ``repo|kind|number`` and wait ``github_webhook_coalesce_window`` seconds
+# (default 2) before they are claimed. A claim takes every queued delivery
+# with the same key, and only the newest payload is applied; the others
+# end as Coalesced. A burst of label edits on one issue costs one write.
+
+DOCTYPE = 'GitHub Webhook Delivery'
+INBOX_PREFIX = "github_webhook_inbox"
+PARTITIONS = 1024
+DEFAULT_WORKERS = 2
+CLAIM_SIZE = 20
+DRAINER_LEASE = 300
+DRAIN_SECONDS = 120
+STUCK_AFTER_SECONDS = 900
+DEFAULT_COALESCE_WINDOW = 2
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 60
+# Event -> payload object whose number keys the coalescing
+COALESCED_EVENTS = {'issues': 'issue', 'pull_request': 'pull_request'}
+# Actions the handlers apply; others (labeled, assigned, ...) are ignored by them
+APPLIED_ACTIONS = {
+    'issues': ('opened', 'edited', 'reopened', 'closed', 'deleted'),
+    'pull_request': ('opened', 'edited', 'reopened', 'closed', 'merged'),
+}
+
+def _key(*parts):
+    return cache_key(INBOX_PREFIX, *parts)
+
+def enabled():
+    return get_conf('github_webhook_async', 1) not in (0, '0', False)
+
+def get_workers():
+    return max(1, frappe.utils.cint(get_conf('github_webhook_workers', DEFAULT_WORKERS)))
+
+def get_queue():
+    return get_conf('github_webhook_queue', None) or 'short'
+
+def get_coalesce_window():
+    return max(0.0, frappe.utils.flt(get_conf('github_webhook_coalesce_window', DEFAULT_COALESCE_WINDOW)))
+
+def partition(repo_full):
+    return zlib.crc32((repo_full or '').encode()) % PARTITIONS
+
+def coalesce_key(event, repo_full, data):
+    """``repo|kind|number`` for deliveries about one issue or pull request, else None"""
+    kind = COALESCED_EVENTS.get((event or '').lower().strip())
+    number = (data.get(kind) or {}).get('number') if kind else None
+    return f'{repo_full}|{kind}|{number}' if number else None
+
+def push(event, delivery_id, payload, data):
+    """Store one verified delivery and make sure its slot is being drained; returns its name"""
+    repo_full = (data.get('repository') or {}).get('full_name')
+    doc = frappe.get_doc({
+        'doctype': DOCTYPE,
+        'delivery_id': delivery_id,
+        'event': event,
+        'action': data.get('action'),
+        'repo_full_name': repo_full,
+        'inbox_partition': partition(repo_full),
+        'coalesce_key': coalesce_key(event, repo_full, data),
+        'status': 'Queued',
+        'received_at': frappe.utils.now(),
+        'payload': payload.decode('utf-8') if isinstance(payload, bytes) else payload,
+    }).insert(ignore_permissions=True)
+    # Visible to the drainer before it is enqueued
+    frappe.db.commit()
+    _start_drainer(doc.inbox_partition % get_workers())
+    return doc.name
+
+def _start_drainer(slot):
+    # The slot key stands for a drainer queued or running; it expires if the worker dies
+    if frappe.cache().execute_command('SET', _key('drainer', str(slot)), 1, 'NX', 'EX', DRAINER_LEASE):
+        _enqueue_drainer(slot)
+        return True
+    return False
+
+def _enqueue_drainer(slot):
+    frappe.enqueue(
+        'erpnext_github_integration.webhook_inbox.drain',
+        queue=get_queue(),
+        job_name=f'github_webhook_drain|{slot}',
+        slot=slot,
+    )
+
+def drain(slot):
+    """Background job: apply the queued deliveries of ``slot``, oldest first,
+    until none is left or ``DRAIN_SECONDS`` have passed"""
+    cache = frappe.cache()
+    worker = frappe.generate_hash(length=10)
+    workers = get_workers()
+    deadline = time.monotonic() + DRAIN_SECONDS
+    while True:
+        if time.monotonic() > deadline and _queued(slot, workers):
+            # Keep the slot and continue in a new job before the queue
+            # timeout kills this one with rows claimed
+            cache.execute_command('EXPIRE', _key('drainer', str(slot)), DRAINER_LEASE)
+            _enqueue_drainer(slot)
+            return
+        rows = _claim(slot, workers, worker)
+        if rows:
+            _process_batch(rows)
+            cache.execute_command('EXPIRE', _key('drainer', str(slot)), DRAINER_LEASE)
+            continue
+        if _queued(slot, workers):
+            # Only deliveries still inside their coalescing window are left
+            time.sleep(max(get_coalesce_window(), 0.1))
+            cache.execute_command('EXPIRE', _key('drainer', str(slot)), DRAINER_LEASE)
+            continue
+        cache.execute_command('DEL', _key('drainer', str(slot)))
+        # A delivery stored after the last claim but before the slot was freed
+        # started no drainer of its own
+        if not _queued(slot, workers) or not cache.execute_command(
+            'SET', _key('drainer', str(slot)), 1, 'NX', 'EX', DRAINER_LEASE
+        ):
+            return
+
+def _queued(slot, workers):
+    # Deliveries waiting for a retry are left to ``recover``
+    return frappe.db.sql(
+        f"""select name from `tab{DOCTYPE}`
+            where status = 'Queued' and mod(inbox_partition, %s) = %s
+                and (retry_at is null or retry_at <= %s) limit 1""",
+        (workers, slot, frappe.utils.now()),
+    )
+
+def _claim(slot, workers, worker):
+    window_start = frappe.utils.add_to_date(frappe.utils.now_datetime(), seconds=-get_coalesce_window())
+    candidates = frappe.db.sql(
+        f"""select name, coalesce_key from `tab{DOCTYPE}`
+            where status = 'Queued' and mod(inbox_partition, %s) = %s
+                and (coalesce_key is null or received_at <= %s)
+                and (retry_at is null or retry_at <= %s)
+            order by creation limit %s""",
+        (workers, slot, window_start, frappe.utils.now(), CLAIM_SIZE),
+    )
+    if not candidates:
+        return []
+    names = tuple(name for name, key in candidates)
+    # Newer deliveries for the same issue or PR are taken along, window or not
+    keys = tuple({key for name, key in candidates if key}) or ('',)
+    # Only rows still queued are taken, should two drainers ever meet
+    frappe.db.sql(
+        f"""update `tab{DOCTYPE}` set status = 'Processing', worker = %s, started_at = %s,
+                attempts = coalesce(attempts, 0) + 1
+            where status = 'Queued' and (name in %s or coalesce_key in %s)""",
+        (worker, frappe.utils.now(), names, keys),
+    )
+    frappe.db.commit()
+    return frappe.get_all(
+        DOCTYPE,
+        filters={'worker': worker, 'status': 'Processing'},
+        fields=[
+            'name', 'delivery_id', 'event', 'action', 'repo_full_name', 'coalesce_key', 'payload',
+            'received_at', 'attempts',
+        ],
+        order_by='creation asc',
+    )
+
+def _process_batch(rows):
+    """Apply claimed rows in arrival order, each coalesced group once at its last delivery"""
+    groups = {}
+    for row in rows:
+        if row.coalesce_key:
+            groups.setdefault(row.coalesce_key, []).append(row)
+    for row in rows:
+        group = groups.get(row.coalesce_key) if row.coalesce_key else None
+        if not group:
+            _process(row)
+        elif row is group[-1]:
+            _process_group(group)
+
+def _process_group(group):
+    if len(group) == 1:
+        _process(group[0])
+        return
+    payloads = [json.loads(row.payload) for row in group]
+    kind = COALESCED_EVENTS[group[0].event.lower().strip()]
+    # The newest state of the issue or PR; ties go to the later delivery
+    newest = max(range(len(group)), key=lambda i: ((payloads[i].get(kind) or {}).get('updated_at') or '', i))
+    data = payloads[newest]
+    applied = APPLIED_ACTIONS.get(group[0].event.lower().strip(), ())
+    if data.get('action') not in applied:
+        # E.g. an edit followed by label changes: the handlers skip "labeled",
+        # so the newest snapshot is applied as the latest handled action
+        handled = [p.get('action') for p in payloads if p.get('action') in applied and p.get('action') != 'deleted']
+        if handled:
+            data = dict(data, action=handled[-1])
+    winner = group[newest]
+    status = _process(winner, data=data)
+    now = frappe.utils.now_datetime()
+    retry_at = frappe.db.get_value(DOCTYPE, winner.name, 'retry_at') if status == 'Queued' else None
+    for row in group:
+        if row is winner:
+            continue
+        if status == 'Queued':
+            # The winner will be retried: the group is claimed again with it
+            frappe.db.set_value(
+                DOCTYPE, row.name, {'status': 'Queued', 'worker': None, 'retry_at': retry_at}, update_modified=False
+            )
+            continue
+        if status == 'Failed':
+            # Never applied either: their redeliveries must get through
+            webhook_dedupe.forget(row.delivery_id)
+        frappe.db.set_value(DOCTYPE, row.name, {
+            'status': 'Failed' if status == 'Failed' else 'Coalesced',
+            'coalesced_into': winner.name,
+            'processed_at': now,
+            'queue_ms': int((now - row.received_at).total_seconds() * 1000),
+            'process_ms': 0,
+        }, update_modified=False)
+    frappe.db.commit()
+    if status in ('Queued', 'Failed'):
+        return
+    _count_coalesced(group[0].event.lower().strip(), len(group) - 1)
+
+def _count_coalesced(event, collapsed):
+    try:
+        pipe = frappe.cache().pipeline(transaction=False)
+        pipe.execute_command('HINCRBY', _key('coalesced'), event, collapsed)
+        pipe.execute_command('HINCRBY', _key('coalesced'), f'{event}_groups', 1)
+        pipe.execute()
+    except Exception:
+        pass
+
+def _process(row, data=None):
+    """Apply one claimed delivery; returns its new status (``Queued`` when it will be retried)"""
+    from .webhooks import _process_github_webhook
+
+    started = time.monotonic()
+    status, error = 'Processed', None
+    try:
+        if not row.repo_full_name or not frappe.db.exists('Repository', {'full_name': row.repo_full_name}):
+            status = 'Ignored'
+        else:
+            _process_github_webhook(
+                event=row.event, data=data or json.loads(row.payload), repo_full_name=row.repo_full_name,
+                raise_errors=True,
+            )
+        frappe.db.commit()
+    except Exception:
+        # Nothing the handler wrote before failing is kept
+        frappe.db.rollback()
+        error = frappe.get_traceback()
+        frappe.log_error(error, f'GitHub Webhook Inbox: {row.event}')
+        # Released on every failed attempt, so a redelivery is applied again
+        webhook_dedupe.forget(row.delivery_id)
+        attempts = frappe.utils.cint(row.attempts) or 1
+        if attempts < MAX_ATTEMPTS:
+            frappe.db.set_value(DOCTYPE, row.name, {
+                'status': 'Queued',
+                'worker': None,
+                'retry_at': frappe.utils.add_to_date(
+                    frappe.utils.now_datetime(), seconds=RETRY_BACKOFF_SECONDS * attempts
+                ),
+                'error': error,
+            }, update_modified=False)
+            frappe.db.commit()
+            return 'Queued'
+        status = 'Failed'
+    now = frappe.utils.now_datetime()
+    frappe.db.set_value(DOCTYPE, row.name, {
+        'status': status,
+        'processed_at': now,
+        'queue_ms': int((now - row.received_at).total_seconds() * 1000),
+        'process_ms': int((time.monotonic() - started) * 1000),
+        'error': error,
+    }, update_modified=False)
+    frappe.db.commit()
+    return status
+
+def recover():
+    """Scheduler: requeue deliveries left Processing by a dead drainer, and drain anything due
+    (including retries whose backoff has passed)"""
+    stuck_before = frappe.utils.add_to_date(frappe.utils.now_datetime(), seconds=-STUCK_AFTER_SECONDS)
+    frappe.db.sql(
+        f"""update `tab{DOCTYPE}` set status = 'Queued', worker = null
+            where status = 'Processing' and started_at < %s""",
+        (stuck_before,),
+    )
+    frappe.db.commit()
+    workers = get_workers()
+    for slot in range(workers):
+        if _queued(slot, workers):
+            _start_drainer(slot)
+
+def get_status():
+    """Inbox depth per status and slot, the age of the oldest queued delivery and recent processing lag"""
+    workers = get_workers()
+    counts = dict(frappe.db.sql(f"select status, count(*) from `tab{DOCTYPE}` group by status"))
+    oldest = frappe.db.sql(f"select min(received_at) from `tab{DOCTYPE}` where status = 'Queued'")[0][0]
+    slots = dict(frappe.db.sql(
+        f"""select mod(inbox_partition, %s), count(*) from `tab{DOCTYPE}`
+            where status in ('Queued', 'Processing') group by mod(inbox_partition, %s)""",
+        (workers, workers),
+    ))
+    since = frappe.utils.add_to_date(frappe.utils.now_datetime(), hours=-1)
+    recent = frappe.db.sql(
+        f"""select queue_ms, process_ms, status from `tab{DOCTYPE}`
+            where processed_at >= %s and status != 'Queued' order by processed_at desc limit 10000""",
+        (since,),
+    )
+    coalesced = {k: int(v) for k, v in hgetall(_key('coalesced')).items()}
+    queue_ms = sorted(r[0] or 0 for r in recent)
+    process_ms = sorted(r[1] or 0 for r in recent if r[2] != 'Coalesced')
+
+    def percentile(values, p):
+        return values[min(len(values) - 1, int(len(values) * p))] if values else None
+
+    return {
+        'depth': (counts.get('Queued') or 0) + (counts.get('Processing') or 0),
+        'counts': counts,
+        'oldest_queued_s': round((frappe.utils.now_datetime() - oldest).total_seconds(), 1) if oldest else 0,
+        'slots': {slot: slots.get(slot, 0) for slot in range(workers)},
+        # Redeliveries dropped by X-GitHub-Delivery (webhook_dedupe.py)
+        'deliveries': webhook_dedupe.get_stats(),
+        'drainers': sum(
+            1 for slot in range(workers)
+            if frappe.cache().execute_command('EXISTS', _key('drainer', str(slot)))
+        ),
+        # Deliveries collapsed into a newer one, and the groups they formed
+        'coalesced': {
+            event: {'collapsed': coalesced.get(event, 0), 'groups': coalesced.get(f'{event}_groups', 0)}
+            for event in COALESCED_EVENTS
+        },
+        'last_hour': {
+            'processed': len(recent),
+            'coalesced': sum(1 for r in recent if r[2] == 'Coalesced'),
+            'queue_ms_p50': percentile(queue_ms, 0.5),
+            'queue_ms_p95': percentile(queue_ms, 0.95),
+            'queue_ms_max': queue_ms[-1] if queue_ms else None,
+            'process_ms_p50': percentile(process_ms, 0.5),
+            'process_ms_p95': percentile(process_ms, 0.95),
+        },
+    }
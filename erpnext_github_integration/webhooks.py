@@ -1,6 +1,7 @@
 import frappe, hmac, hashlib, json
 from frappe import _
-from .github_api import convert_github_datetime
+from .github_api import convert_github_datetime, get_github_token
+from . import bulk_writer, commit_store, sync_scheduler, webhook_dedupe, webhook_inbox
 
 
 def get_github_event_header():
@@ -28,7 +29,12 @@ def get_github_event_header():
 
 @frappe.whitelist(allow_guest=True)
 def github_webhook():
-    """Handle GitHub webhook events"""
+    """Handle GitHub webhook events: verify, store in the inbox and answer 202 (see webhook_inbox.py)"""
+    delivery_id = frappe.request.headers.get('X-GitHub-Delivery')
+    # Redeliveries are dropped before the settings, payload or database are touched
+    if webhook_dedupe.seen(delivery_id):
+        return 'duplicate'
+    claimed = False
     try:
         settings = frappe.get_single('GitHub Settings')
         secret = settings.get_password('webhook_secret') or frappe.conf.get('github_webhook_secret')
@@ -47,6 +53,11 @@ def github_webhook():
                 frappe.log_error('Invalid webhook signature', 'GitHub Webhook')
                 frappe.throw(_('Invalid webhook signature'), exc=frappe.PermissionError)
 
+        # Only signed deliveries are remembered; a concurrent redelivery loses here
+        if not webhook_dedupe.claim(delivery_id):
+            return 'duplicate'
+        claimed = True
+
         # Get event name with robust header extraction
         event = get_github_event_header()
         data = json.loads(payload.decode('utf-8'))
@@ -71,53 +82,64 @@ def github_webhook():
         if not repo_full_name:
             frappe.log_error('No repository information in webhook payload', 'GitHub Webhook')
             return 'ok'
-        
-        # Log the event for debugging
-        frappe.log_error(f'Processing webhook event: {event} for repo: {repo_full_name}', 'GitHub Webhook Debug')
 
-        # Check if repo exists in system
+        if webhook_inbox.enabled():
+            # Applied by the inbox drainers; GitHub only waits for the ack
+            webhook_inbox.push(event, delivery_id, payload, data)
+            frappe.local.response.http_status_code = 202
+            return 'queued'
+
+        # github_webhook_async: 0 applies the delivery inline
         if not frappe.db.exists('Repository', {'full_name': repo_full_name}):
             frappe.log_error(f'Repository {repo_full_name} not found in system', 'GitHub Webhook')
             return 'ok'
-
-        # Process webhook immediately to avoid background job issues
-        # You can change this back to background processing once it's working
-        _process_github_webhook(event=event, data=data, repo_full_name=repo_full_name)
+        # Raising lets the except below release the claim
+        _process_github_webhook(event=event, data=data, repo_full_name=repo_full_name, raise_errors=True)
 
         return 'ok'
 
     except Exception as e:
+        if claimed:
+            # Not stored or not applied: let GitHub's redelivery through
+            webhook_dedupe.forget(delivery_id)
         frappe.log_error(f'Webhook processing error: {frappe.get_traceback()}', 'GitHub Webhook Error')
         return {'error': str(e)}
 
 
-def _process_github_webhook(event=None, data=None, repo_full_name=None):
-    """Process GitHub webhook events in background"""
+def _process_github_webhook(event=None, data=None, repo_full_name=None, raise_errors=False):
+    """Apply one webhook delivery (called by the inbox drainers).
+
+    Errors are logged; with ``raise_errors`` they are raised as well, so the
+    inbox can roll back and retry the delivery.
+    """
     try:
         if not event:
             frappe.log_error(f"Missing event parameter. Data: {json.dumps(data, indent=2)}", "GitHub Webhook Missing Event")
             return
 
         event = event.lower().strip()
-        frappe.log_error(f"Processing event: {event} for repo: {repo_full_name}", "GitHub Webhook Processing")
+        # Busy repositories are synced more often by the scheduler
+        sync_scheduler.record_activity(repo_full_name, event)
 
         if event == "issues":
-            _handle_issues_event(data, repo_full_name)
+            _handle_issues_event(data, repo_full_name, raise_errors)
         elif event == "pull_request":
-            _handle_pull_request_event(data, repo_full_name)
+            _handle_pull_request_event(data, repo_full_name, raise_errors)
         elif event == "push":
-            _handle_push_event(data, repo_full_name)
+            _handle_push_event(data, repo_full_name, raise_errors)
         elif event == "member":
-            _handle_member_event(data, repo_full_name)
+            _handle_member_event(data, repo_full_name, raise_errors)
         elif event == "repository":
-            _handle_repository_event(data, repo_full_name)
+            _handle_repository_event(data, repo_full_name, raise_errors)
         else:
             frappe.log_error(f"Unhandled webhook event: {event}", "GitHub Webhook")
     
     except Exception as e:
         frappe.log_error(f"Error processing {event} webhook: {str(e)}", "GitHub Webhook Handler")
+        if raise_errors:
+            raise
         
-def _handle_issues_event(data, repo_full_name):
+def _handle_issues_event(data, repo_full_name, raise_errors=False):
     """Handle GitHub issues webhook events"""
     action = data.get('action')
     issue = data.get('issue', {})
@@ -132,69 +154,25 @@ def _handle_issues_event(data, repo_full_name):
         return
     
     try:
-        # Try to get existing issue
-        existing = frappe.db.exists('Repository Issue', {
-            'repository': repo_full_name,
-            'issue_number': issue_number
-        })
-        
         if action in ['opened', 'edited', 'reopened', 'closed']:
+            bulk_writer.upsert_issues(repo_full_name, [issue])
+            frappe.db.commit()
+        
+        elif action == 'deleted':
+            existing = frappe.db.exists('Repository Issue', {
+                'repository': repo_full_name,
+                'issue_number': issue_number
+            })
             if existing:
-                # Update existing issue
-                doc = frappe.get_doc('Repository Issue', existing)
-                doc.title = issue.get('title', '')
-                doc.body = issue.get('body', '')
-                doc.state = issue.get('state', 'open')
-                doc.labels = ','.join([l.get('name', '') for l in issue.get('labels', [])])
-                doc.url = issue.get('html_url', '')
-                doc.updated_at = convert_github_datetime(issue.get('updated_at'))
-                
-                # Clear and update assignees
-                doc.set('assignees_table', [])
-                for assignee in issue.get('assignees', []):
-                    doc.append('assignees_table', {
-                        'user': assignee.get('login', '')
-                    })
-                
-                doc.flags.ignore_permissions = True
-                doc.save()
-                frappe.db.commit()
-                
-            else:
-                # Create new issue
-                doc = frappe.get_doc({
-                    'doctype': 'Repository Issue',
-                    'repository': repo_full_name,
-                    'issue_number': issue_number,
-                    'title': issue.get('title', ''),
-                    'body': issue.get('body', ''),
-                    'state': issue.get('state', 'open'),
-                    'labels': ','.join([l.get('name', '') for l in issue.get('labels', [])]),
-                    'url': issue.get('html_url', ''),
-                    'github_id': str(issue.get('id', '')),
-                    'created_at': convert_github_datetime(issue.get('created_at')),
-                    'updated_at': convert_github_datetime(issue.get('updated_at'))
-                })
-                
-                # Add assignees
-                for assignee in issue.get('assignees', []):
-                    doc.append('assignees_table', {
-                        'user': assignee.get('login', '')
-                    })
-                
-                doc.flags.ignore_permissions = True
-                doc.insert()
+                frappe.delete_doc('Repository Issue', existing, ignore_permissions=True)
                 frappe.db.commit()
-        
-        elif action == 'deleted' and existing:
-            # Delete issue
-            frappe.delete_doc('Repository Issue', existing, ignore_permissions=True)
-            frappe.db.commit()
     
     except Exception as e:
         frappe.log_error(f'Error handling issue event: {frappe.get_traceback()}', 'GitHub Issues Webhook')
+        if raise_errors:
+            raise
 
-def _handle_pull_request_event(data, repo_full_name):
+def _handle_pull_request_event(data, repo_full_name, raise_errors=False):
     """Handle GitHub pull request webhook events"""
     action = data.get('action')
     pr = data.get('pull_request', {})
@@ -209,70 +187,16 @@ def _handle_pull_request_event(data, repo_full_name):
         return
     
     try:
-        # Try to get existing PR
-        existing = frappe.db.exists('Repository Pull Request', {
-            'repository': repo_full_name,
-            'pr_number': pr_number
-        })
-        
         if action in ['opened', 'edited', 'reopened', 'closed', 'merged']:
-            if existing:
-                # Update existing PR
-                doc = frappe.get_doc('Repository Pull Request', existing)
-                doc.title = pr.get('title', '')
-                doc.body = pr.get('body', '')
-                doc.state = pr.get('state', 'open')
-                doc.head_branch = pr.get('head', {}).get('ref', '')
-                doc.base_branch = pr.get('base', {}).get('ref', '')
-                doc.author = pr.get('user', {}).get('login', '')
-                doc.mergeable_state = pr.get('mergeable_state', '')
-                doc.url = pr.get('html_url', '')
-                doc.updated_at = convert_github_datetime(pr.get('updated_at'))
-                
-                # Clear and update reviewers
-                doc.set('reviewers_table', [])
-                for reviewer in pr.get('requested_reviewers', []):
-                    doc.append('reviewers_table', {
-                        'user': reviewer.get('login', '')
-                    })
-                
-                doc.flags.ignore_permissions = True
-                doc.save()
-                frappe.db.commit()
-                
-            else:
-                # Create new PR
-                doc = frappe.get_doc({
-                    'doctype': 'Repository Pull Request',
-                    'repository': repo_full_name,
-                    'pr_number': pr_number,
-                    'title': pr.get('title', ''),
-                    'body': pr.get('body', ''),
-                    'state': pr.get('state', 'open'),
-                    'head_branch': pr.get('head', {}).get('ref', ''),
-                    'base_branch': pr.get('base', {}).get('ref', ''),
-                    'author': pr.get('user', {}).get('login', ''),
-                    'mergeable_state': pr.get('mergeable_state', ''),
-                    'github_id': str(pr.get('id', '')),
-                    'url': pr.get('html_url', ''),
-                    'created_at': convert_github_datetime(pr.get('created_at')),
-                    'updated_at': convert_github_datetime(pr.get('updated_at'))
-                })
-                
-                # Add reviewers
-                for reviewer in pr.get('requested_reviewers', []):
-                    doc.append('reviewers_table', {
-                        'user': reviewer.get('login', '')
-                    })
-                
-                doc.flags.ignore_permissions = True
-                doc.insert()
-                frappe.db.commit()
+            bulk_writer.upsert_pull_requests(repo_full_name, [pr])
+            frappe.db.commit()
     
     except Exception as e:
         frappe.log_error(f'Error handling PR event: {frappe.get_traceback()}', 'GitHub PR Webhook')
+        if raise_errors:
+            raise
 
-def _handle_push_event(data, repo_full_name):
+def _handle_push_event(data, repo_full_name, raise_errors=False):
     """Handle GitHub push webhook events"""
     try:
         ref = data.get('ref', '')
@@ -282,43 +206,44 @@ def _handle_push_event(data, repo_full_name):
             frappe.log_error(f'Invalid ref format: {ref}', 'GitHub Push Webhook')
             return
         
-        # Get repository document
-        repo_filters = {'full_name': repo_full_name}
-        if not frappe.db.exists('Repository', repo_filters):
+        repo_name = frappe.db.get_value('Repository', {'full_name': repo_full_name}, 'name')
+        if not repo_name:
             frappe.log_error(f'Repository {repo_full_name} not found', 'GitHub Push Webhook')
             return
-            
-        repo_doc = frappe.get_doc('Repository', repo_filters)
         
-        # Update repository last sync time
-        repo_doc.last_synced = frappe.utils.now()
+        # Remember every pushed commit, so branch sync never has to fetch them
+        commit_store.store_commits([
+            commit_store.from_push(repo_full_name, c) for c in data.get('commits') or []
+        ])
         
-        # Update branch information if it exists in the branches table
-        branch_updated = False
-        if hasattr(repo_doc, 'branches_table') and repo_doc.branches_table:
-            for branch in repo_doc.branches_table:
-                if branch.branch_name == branch_name:
-                    branch.commit_sha = data.get('after', '')
-                    branch.last_updated = frappe.utils.now()
-                    branch_updated = True
-                    break
+        # Date of the new head: from the store, else GitHub (e.g. a push that
+        # only moved the branch to an existing commit), else now
+        head_sha = data.get('after', '')
+        head_date = commit_store.get_commits([head_sha]).get(head_sha, {}).get('author_date')
+        if not head_date and head_sha and head_sha != commit_store.NULL_SHA:
+            token = get_github_token(repo_full_name)
+            if token:
+                head_date = commit_store.get_commit_dates(repo_full_name, [head_sha], token).get(head_sha)
+        last_updated = convert_github_datetime(head_date) if head_date else frappe.utils.now()
         
-        # If branch doesn't exist in table, add it
-        if not branch_updated and hasattr(repo_doc, 'branches_table'):
-            repo_doc.append('branches_table', {
-                'branch_name': branch_name,
-                'commit_sha': data.get('after', ''),
-                'last_updated': frappe.utils.now()
-            })
+        # Update repository last sync time
+        frappe.db.set_value('Repository', repo_name, 'last_synced', frappe.utils.now())
         
-        repo_doc.flags.ignore_permissions = True
-        repo_doc.save()
+        # Update the pushed branch's row, or add it; the other rows are left alone
+        bulk_writer.reconcile_table(bulk_writer.BRANCH, repo_name, [{
+            'repo_full_name': repo_full_name,
+            'branch_name': branch_name,
+            'commit_sha': head_sha,
+            'last_updated': last_updated
+        }], delete_missing=False)
         frappe.db.commit()
         
     except Exception as e:
         frappe.log_error(f'Error handling push event: {frappe.get_traceback()}', 'GitHub Push Webhook')
+        if raise_errors:
+            raise
 
-def _handle_member_event(data, repo_full_name):
+def _handle_member_event(data, repo_full_name, raise_errors=False):
     """Handle GitHub member webhook events"""
     try:
         action = data.get('action')
@@ -333,47 +258,40 @@ def _handle_member_event(data, repo_full_name):
             frappe.log_error('No username in member data', 'GitHub Member Webhook')
             return
         
-        # Get repository document
-        repo_filters = {'full_name': repo_full_name}
-        if not frappe.db.exists('Repository', repo_filters):
+        repo_name = frappe.db.get_value('Repository', {'full_name': repo_full_name}, 'name')
+        if not repo_name:
             frappe.log_error(f'Repository {repo_full_name} not found', 'GitHub Member Webhook')
             return
-            
-        repo_doc = frappe.get_doc('Repository', repo_filters)
+        
+        member_filters = {
+            'parent': repo_name,
+            'parenttype': 'Repository',
+            'parentfield': 'members_table',
+            'github_username': username
+        }
         
         if action == 'added':
-            # Check if member already exists
-            existing_member = None
-            if hasattr(repo_doc, 'members_table') and repo_doc.members_table:
-                for mem in repo_doc.members_table:
-                    if mem.github_username == username:
-                        existing_member = mem
-                        break
-            
-            if not existing_member:
-                repo_doc.append('members_table', {
+            # Existing members keep their row (and role)
+            if not frappe.db.exists('Repository Member', member_filters):
+                bulk_writer.reconcile_table(bulk_writer.MEMBER, repo_name, [{
                     'repo_full_name': repo_full_name,
                     'github_username': username,
                     'github_id': str(member.get('id', '')),
                     'role': 'member'
-                })
+                }], delete_missing=False)
         
         elif action == 'removed':
             # Remove member from repository
-            if hasattr(repo_doc, 'members_table') and repo_doc.members_table:
-                for mem in repo_doc.members_table[:]:  # Create a copy to iterate over
-                    if mem.github_username == username:
-                        repo_doc.remove(mem)
-                        break
+            frappe.db.delete('Repository Member', member_filters)
         
-        repo_doc.flags.ignore_permissions = True
-        repo_doc.save()
         frappe.db.commit()
         
     except Exception as e:
         frappe.log_error(f'Error handling member event: {frappe.get_traceback()}', 'GitHub Member Webhook')
+        if raise_errors:
+            raise
 
-def _handle_repository_event(data, repo_full_name):
+def _handle_repository_event(data, repo_full_name, raise_errors=False):
     """Handle GitHub repository webhook events"""
     try:
         action = data.get('action')
@@ -411,4 +329,6 @@ def _handle_repository_event(data, repo_full_name):
             frappe.db.commit()
     
     except Exception as e:
-        frappe.log_error(f'Error handling repository event: {frappe.get_traceback()}', 'GitHub Repository Webhook')
\ No newline at end of file
+        frappe.log_error(f'Error handling repository event: {frappe.get_traceback()}', 'GitHub Repository Webhook')
+        if raise_errors:
+            raise
\ No newline at end of file